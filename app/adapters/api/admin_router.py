@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, List, Optional
+
+from ...core.answer_cache import get_answer_cache
+from ...core.chat_history_cache import get_chat_history_cache
+from ...core.embedding_provider import get_embedding_model
+from ...core.result_cache import get_result_cache
+from ...core.tracing import RingBufferExporter, get_tracer
+from ..db.telemetry_writer import get_telemetry_writer
+from ..llm.llm_factory import get_llm_registry
+from ..vector_store.message_vector_writer import get_message_vector_writer
+
+# Endpoint operasional (statistik cache, invalidasi, dsb.)
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+)
+
+@router.get("/answer-cache/stats", response_model=Dict[str, Any])
+async def answer_cache_stats():
+    """Statistik semantic answer cache (hit/miss, jumlah entry, eviction)."""
+    return get_answer_cache().stats()
+
+@router.post("/answer-cache/invalidate", response_model=Dict[str, Any])
+async def invalidate_answer_cache():
+    """Kosongkan semantic answer cache secara manual."""
+    cache = get_answer_cache()
+    cache.invalidate()
+    return cache.stats()
+
+@router.get("/llm-pool/stats", response_model=Dict[str, Any])
+async def llm_pool_stats():
+    """Statistik registry client LLM (reuse client, pool HTTP, konkurensi per provider)."""
+    return get_llm_registry().stats()
+
+@router.get("/vector-writer/stats", response_model=Dict[str, Any])
+async def vector_writer_stats():
+    """Statistik writer vektor chat (kedalaman antrian, drop, batch, gagal)."""
+    return get_message_vector_writer().stats()
+
+@router.get("/telemetry-writer/stats", response_model=Dict[str, Any])
+async def telemetry_writer_stats():
+    """Statistik writer telemetri (kedalaman antrian, dropped, baris tertulis per tabel)."""
+    return get_telemetry_writer().stats()
+
+@router.get("/embedding-cache/stats", response_model=Dict[str, Any])
+async def embedding_cache_stats():
+    """Statistik LRU embedding query (hit ratio, pemakaian memori)."""
+    return get_embedding_model().stats()
+
+@router.get("/result-cache/stats", response_model=Dict[str, Any])
+async def result_cache_stats():
+    """Statistik result set cache, termasuk hit/miss/invalidasi per tabel."""
+    return get_result_cache().stats()
+
+@router.get("/chat-history-cache/stats", response_model=Dict[str, Any])
+async def chat_history_cache_stats():
+    """Statistik cache history per room (room ter-cache, hit/miss, append write-through)."""
+    return get_chat_history_cache().stats()
+
+@router.post("/result-cache/invalidate", response_model=Dict[str, Any])
+async def invalidate_result_cache(table: Optional[str] = None):
+    """Invalidate entry result cache untuk satu tabel, atau semuanya jika `table` kosong."""
+    cache = get_result_cache()
+    removed = cache.invalidate_table(table) if table else cache.invalidate_all()
+    return {"table": table, "removed": removed, **cache.stats()}
+
+def _trace_buffer() -> RingBufferExporter:
+    buffer = get_tracer().ring_buffer()
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Exporter trace 'memory' tidak aktif (lihat TRACING_EXPORTERS).")
+    return buffer
+
+@router.get("/traces/slowest", response_model=List[Dict[str, Any]])
+async def slowest_traces(
+    limit: int = Query(20, ge=1, le=200),
+    include_background: bool = False,
+):
+    """Trace paling lambat di ring buffer, lengkap dengan span per tahap (LLM, RAG, SQL, serialisasi)."""
+    return [trace.to_dict() for trace in _trace_buffer().slowest(limit, include_background)]
+
+@router.get("/traces/{request_id}", response_model=Dict[str, Any])
+async def trace_by_request_id(request_id: str):
+    """Trace untuk satu request berdasarkan header X-Request-ID."""
+    trace = _trace_buffer().find(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {request_id} tidak ditemukan di ring buffer.")
+    return trace.to_dict()
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional, AsyncIterator
+import json
 
 from ...services.nl2sql_service import get_nl2sql_service, NL2SQLService
 from .dependencies import get_db, verify_token
+from .response_formats import negotiate_format, render_result
+from ..db.database import AsyncSessionLocal
 from ...core.memory_providers import get_window_memory # Impor provider memori
 from langchain.memory import ConversationBufferWindowMemory # Impor tipe memori
 from ...core.sql_chat_history import SQLChatMessageHistory
 from langchain.schema import get_buffer_string
+from app import config
+
+logger = logging.getLogger(__name__)
 
 # Definisikan router dengan prefix, tags, dan dependensi keamanan global
 router = APIRouter(
@@ -25,6 +34,16 @@ class NLQueryRequest(BaseModel):
     kode_unit: str
     display_name: str
     room_id: int
+    speculative: Optional[bool] = None # None = ikuti SPECULATIVE_CLASSIFICATION_ENABLED
+    debug: bool = False # True = sertakan field debug (token_usage per tahap) di respons
+
+# Field respons yang hanya dikirim jika request meminta debug
+_DEBUG_FIELDS = ("token_usage",)
+
+def _without_debug_fields(result: Dict[str, Any], debug: bool) -> Dict[str, Any]:
+    if debug:
+        return result
+    return {key: value for key, value in result.items() if key not in _DEBUG_FIELDS}
 
 @router.post("/sql-data-reasoning", response_model=Dict[str, Any])
 async def handle_nl_query(
@@ -33,8 +52,10 @@ async def handle_nl_query(
     nl2sql_service: NL2SQLService = Depends(get_nl2sql_service),
     db: AsyncSession = Depends(get_db),
     BackgroundTasks: BackgroundTasks = BackgroundTasks(),
+    format: Optional[str] = Query(None, description="json (default), columnar, atau msgpack"),
 ):
     try:
+        response_format = negotiate_format(format, request.headers.get("accept"))
         result = await nl2sql_service.execute_flow(
             nl_query=request_body.prompt,
             model_name=request_body.model,
@@ -45,8 +66,9 @@ async def handle_nl_query(
             endpoint_path=str(request.url.path),
             db_session=db,
             background_tasks=BackgroundTasks,
+            speculative=request_body.speculative,
         )
-        return result
+        return render_result(_without_debug_fields(result, request_body.debug), response_format)
     except ValueError as e:
         # Menangani error yang diharapkan (misal: pertanyaan tidak valid, query berbahaya)
         raise HTTPException(status_code=400, detail=str(e))
@@ -55,7 +77,7 @@ async def handle_nl_query(
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         # Menangkap semua error tak terduga lainnya untuk mencegah crash
-        print(f"An unexpected error occurred: {e}") # Log error untuk debug
+        logger.exception("An unexpected error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Terjadi kesalahan internal pada server.")
 
 @router.post("/sql-data", response_model=Dict[str, Any])
@@ -64,9 +86,11 @@ async def handle_simple_nl_query(
     request_body: NLQueryRequest,
     nl2sql_service: NL2SQLService = Depends(get_nl2sql_service),
     db: AsyncSession = Depends(get_db),
-    BackgroundTasks: BackgroundTasks = BackgroundTasks()
+    BackgroundTasks: BackgroundTasks = BackgroundTasks(),
+    format: Optional[str] = Query(None, description="json (default), columnar, atau msgpack"),
 ):
     try:
+        response_format = negotiate_format(format, request.headers.get("accept"))
         result = await nl2sql_service.generate_sql_and_data(
             nl_query=request_body.prompt,
             model_name=request_body.model,
@@ -77,14 +101,15 @@ async def handle_simple_nl_query(
             endpoint_path=str(request.url.path),
             db_session=db,
             background_tasks=BackgroundTasks,
+            speculative=request_body.speculative,
         )
-        return result
+        return render_result(_without_debug_fields(result, request_body.debug), response_format)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Terjadi kesalahan internal pada server."
 )
     
@@ -96,23 +121,22 @@ async def handle_nl_query_converstation(
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     nl2sql_service: NL2SQLService = Depends(get_nl2sql_service),
+    format: Optional[str] = Query(None, description="json (default), columnar, atau msgpack"),
 ):
     try:
+        response_format = negotiate_format(format, request.headers.get("accept"))
         room_id_from_body = request_body.room_id
 
         # Langkah 1: Buat backend history
         message_history = SQLChatMessageHistory(session=db, room_id=room_id_from_body)
 
-        # Langkah 2: Muat pesan terakhir (await karena .messages async)
-        # Ambil sejumlah pesan (misal 6 = 3 pasang)
-        k = 2
-        list_of_langchain_messages = await message_history.messages # Ambil history dari DB
-        
-        # Langkah 3: Format menjadi string (ambil K interaksi terakhir)
-        chat_history_string = get_buffer_string(list_of_langchain_messages[-k*2:]) # Format K terakhir
+        # Langkah 2: Muat jendela pesan terakhir (LIMIT di SQL, atau langsung dari cache per room)
+        list_of_langchain_messages = await message_history.get_recent_messages(config.CHAT_HISTORY_WINDOW_MESSAGES)
 
-        print("Chat History String:")
-        print(chat_history_string)
+        # Langkah 3: Format menjadi string
+        chat_history_string = get_buffer_string(list_of_langchain_messages)
+
+        logger.debug("Chat history string:\n%s", chat_history_string)
 
         # Langkah 4: Panggil service dengan data yang diperlukan
         result = await nl2sql_service.execute_flow_conversation(
@@ -125,10 +149,11 @@ async def handle_nl_query_converstation(
             background_tasks=background_tasks,
             # Teruskan string history & backend history
             chat_history_string=chat_history_string,
-            message_history_backend=message_history
+            message_history_backend=message_history,
+            speculative=request_body.speculative,
         )
 
-        return result
+        return render_result(_without_debug_fields(result, request_body.debug), response_format)
         
     except ValueError as e:
         # Menangani error yang diharapkan (misal: pertanyaan tidak valid, query berbahaya)
@@ -138,5 +163,90 @@ async def handle_nl_query_converstation(
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         # Menangkap semua error tak terduga lainnya untuk mencegah crash
-        print(f"An unexpected error occurred: {e}") # Log error untuk debug
+        logger.exception("An unexpected error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Terjadi kesalahan internal pada server.")
+
+# STREAMING (Server-Sent Events)
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format satu event SSE (`event:` + `data:` JSON)."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+async def _sse_stream(events: AsyncIterator[Dict[str, Any]], debug: bool = False) -> AsyncIterator[str]:
+    """Ubah event dari service menjadi SSE; error dikirim sebagai event `error`."""
+    try:
+        async for event in events:
+            yield _format_sse(event["event"], _without_debug_fields(event["data"], debug))
+    except ValueError as e:
+        yield _format_sse("error", {"status_code": 400, "detail": str(e)})
+    except RuntimeError as e:
+        yield _format_sse("error", {"status_code": 500, "detail": str(e)})
+    except Exception as e:
+        logger.exception("An unexpected error occurred: %s", e)
+        yield _format_sse("error", {"status_code": 500, "detail": "Terjadi kesalahan internal pada server."})
+
+def _sse_response(body: AsyncIterator[str], background_tasks: BackgroundTasks) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
+
+@router.post("/sql-data-reasoning/stream")
+async def handle_nl_query_stream(
+    request: Request,
+    request_body: NLQueryRequest,
+    nl2sql_service: NL2SQLService = Depends(get_nl2sql_service),
+):
+    background_tasks = BackgroundTasks()
+    endpoint_path = str(request.url.path)
+
+    async def body() -> AsyncIterator[str]:
+        # Sesi dibuka di dalam generator agar tetap hidup selama stream berjalan
+        async with AsyncSessionLocal() as db:
+            message_history = SQLChatMessageHistory(session=db, room_id=request_body.room_id)
+            events = nl2sql_service.stream_flow(
+                nl_query=request_body.prompt,
+                model_name=request_body.model,
+                room_id=request_body.room_id,
+                endpoint_path=endpoint_path,
+                db_session=db,
+                background_tasks=background_tasks,
+                message_history_backend=message_history,
+                speculative=request_body.speculative,
+            )
+            async for chunk in _sse_stream(events, debug=request_body.debug):
+                yield chunk
+
+    return _sse_response(body(), background_tasks)
+
+@router.post("/sql-data-reasoning-converstation/stream")
+async def handle_nl_query_converstation_stream(
+    request: Request,
+    request_body: NLQueryRequest,
+    nl2sql_service: NL2SQLService = Depends(get_nl2sql_service),
+):
+    background_tasks = BackgroundTasks()
+    endpoint_path = str(request.url.path)
+
+    async def body() -> AsyncIterator[str]:
+        async with AsyncSessionLocal() as db:
+            message_history = SQLChatMessageHistory(session=db, room_id=request_body.room_id)
+            list_of_langchain_messages = await message_history.get_recent_messages(config.CHAT_HISTORY_WINDOW_MESSAGES)
+            chat_history_string = get_buffer_string(list_of_langchain_messages)
+
+            events = nl2sql_service.stream_flow_conversation(
+                nl_query=request_body.prompt,
+                model_name=request_body.model,
+                room_id=request_body.room_id,
+                endpoint_path=endpoint_path,
+                db_session=db,
+                background_tasks=background_tasks,
+                chat_history_string=chat_history_string,
+                message_history_backend=message_history,
+                speculative=request_body.speculative,
+            )
+            async for chunk in _sse_stream(events, debug=request_body.debug):
+                yield chunk
+
+    return _sse_response(body(), background_tasks)
@@ -0,0 +1,125 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import msgpack
+import orjson
+from fastapi import Response
+
+from ...core.tracing import span
+
+# Format respons yang didukung endpoint NL-to-SQL
+FORMAT_JSON = "json"           # Default lama: data_raw berupa list of dict
+FORMAT_COLUMNAR = "columnar"   # Kolom sekali, baris sebagai array, di-encode dengan orjson
+FORMAT_MSGPACK = "msgpack"     # Payload kolumnar yang sama, di-encode biner dengan msgpack
+
+MEDIA_TYPE_COLUMNAR = "application/vnd.nl2sql.columnar+json"
+MEDIA_TYPE_MSGPACK = "application/msgpack"
+
+_ACCEPT_FORMATS = {
+    MEDIA_TYPE_COLUMNAR: FORMAT_COLUMNAR,
+    MEDIA_TYPE_MSGPACK: FORMAT_MSGPACK,
+    "application/x-msgpack": FORMAT_MSGPACK,
+}
+SUPPORTED_FORMATS = (FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_MSGPACK)
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+    """
+    Tentukan format respons: query parameter `format` lebih diutamakan,
+    lalu header `Accept`; selain itu tetap JSON lama.
+    """
+    if format_param:
+        response_format = format_param.strip().lower()
+        if response_format not in SUPPORTED_FORMATS:
+            raise ValueError(
+                f"Format respons '{format_param}' tidak didukung. Pilihan: {', '.join(SUPPORTED_FORMATS)}."
+            )
+        return response_format
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in _ACCEPT_FORMATS:
+            return _ACCEPT_FORMATS[media_type]
+    return FORMAT_JSON
+
+def _column_type(value: Any) -> str:
+    # bool harus dicek sebelum int karena bool adalah subclass int
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, Decimal):
+        return "decimal"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, time):
+        return "time"
+    if isinstance(value, timedelta):
+        return "duration"
+    if isinstance(value, (bytes, bytearray)):
+        return "binary"
+    return "string"
+
+def _decimal_to_number(value: Decimal) -> Any:
+    return int(value) if value == value.to_integral_value() else float(value)
+
+def to_columnar(rows: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Ubah list of dict menjadi `{"columns", "column_types", "rows"}`.
+
+    Tipe kolom diambil dari nilai non-null pertama. Kolom DECIMAL (mis. `Jumlah`,
+    `Realisasi`) dikonversi ke angka sekali di sini, sehingga encoder tidak perlu
+    fallback per sel.
+    """
+    if columns is None:
+        columns = list(rows[0].keys()) if rows else []
+
+    column_types = []
+    for column in columns:
+        sample = next((row[column] for row in rows if row.get(column) is not None), None)
+        column_types.append(_column_type(sample) if sample is not None else "null")
+
+    decimal_indexes = [i for i, column_type in enumerate(column_types) if column_type == "decimal"]
+    matrix = []
+    for row in rows:
+        values = [row.get(column) for column in columns]
+        for i in decimal_indexes:
+            if values[i] is not None:
+                values[i] = _decimal_to_number(values[i])
+        matrix.append(values)
+    return {"columns": columns, "column_types": column_types, "rows": matrix}
+
+def _default(value: Any) -> Any:
+    """Fallback encoder untuk tipe yang tidak ditangani langsung oleh orjson/msgpack."""
+    if isinstance(value, Decimal):
+        return _decimal_to_number(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytearray):
+        return bytes(value)
+    raise TypeError(f"Tipe {type(value).__name__} tidak dapat di-serialize")
+
+def render_result(result: Dict[str, Any], response_format: str) -> Any:
+    """
+    Bentuk akhir respons endpoint. JSON lama dikembalikan apa adanya (diproses
+    FastAPI seperti biasa); format kolumnar/msgpack langsung di-encode ke bytes.
+    """
+    if response_format == FORMAT_JSON:
+        return result
+
+    with span("response.serialize", format=response_format) as serialize_span:
+        payload = {key: value for key, value in result.items() if key not in ("data_raw", "columns")}
+        payload["data"] = to_columnar(result.get("data_raw") or [], result.get("columns"))
+        if response_format == FORMAT_MSGPACK:
+            content = msgpack.packb(payload, default=_default, use_bin_type=True)
+            media_type = MEDIA_TYPE_MSGPACK
+        else:
+            content = orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+            media_type = MEDIA_TYPE_COLUMNAR
+        serialize_span.set(bytes=len(content))
+    return Response(content=content, media_type=media_type)
@@ -1,16 +1,26 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, func
 from . import models, schemas
 from typing import List, Optional
 
 # --- Chat Messages ---
-async def create_chat_message(db: AsyncSession, message: schemas.ChatMessageCreate) -> models.ChatMessage:
+async def _persist(db: AsyncSession, instance, commit: bool):
+    """
+    `commit=True`: commit + refresh (perilaku lama, satu transaksi per tulis).
+    `commit=False`: hanya flush di transaksi yang sedang berjalan; ID autoincrement
+    dan default sisi Python (timestamp) sudah terisi tanpa SELECT tambahan.
+    """
+    db.add(instance)
+    if commit:
+        await db.commit()
+        await db.refresh(instance)
+    else:
+        await db.flush()
+    return instance
+
+async def create_chat_message(db: AsyncSession, message: schemas.ChatMessageCreate, commit: bool = True) -> models.ChatMessage:
     """Reusable function to INSERT a new chat message."""
-    db_message = models.ChatMessage(**message.dict())
-    db.add(db_message)
-    await db.commit()
-    await db.refresh(db_message)
-    return db_message
+    return await _persist(db, models.ChatMessage(**message.dict()), commit)
 
 async def get_chat_messages_by_room(db: AsyncSession, room_id: int, limit: int = 10) -> List[models.ChatMessage]:
     """Reusable function to SELECT chat messages for a room, newest first."""
@@ -24,14 +34,16 @@ async def get_chat_messages_by_room(db: AsyncSession, room_id: int, limit: int =
     messages = result.scalars().all()
     return list(reversed(messages))  # Kembalikan dalam urutan lama ke baru
 
+async def get_latest_message_id(db: AsyncSession, room_id: int) -> Optional[int]:
+    """SELECT message_id terbaru di room (probe murah untuk validasi cache history)."""
+    stmt = select(func.max(models.ChatMessage.message_id)).where(models.ChatMessage.room_id == room_id)
+    result = await db.execute(stmt)
+    return result.scalar()
+
 # --- LLM Runs ---
-async def create_llm_run(db: AsyncSession, run_data: schemas.LLMRunCreate) -> models.LLMRun:
+async def create_llm_run(db: AsyncSession, run_data: schemas.LLMRunCreate, commit: bool = True) -> models.LLMRun:
     """Reusable function to INSERT LLM run details."""
-    db_run = models.LLMRun(**run_data.dict())
-    db.add(db_run)
-    await db.commit()
-    await db.refresh(db_run)
-    return db_run
+    return await _persist(db, models.LLMRun(**run_data.dict()), commit)
 
 async def get_llm_run_by_message_id(db: AsyncSession, user_message_id: str) -> Optional[models.LLMRun]:
     """Reusable function to SELECT LLM run details based on user message."""
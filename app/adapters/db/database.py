@@ -3,7 +3,7 @@ from sqlalchemy.orm import declarative_base
 from ... import config
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
-SQLALCHEMY_DATABASE_URL = (
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL or (
     f"mysql+asyncmy://{config.DB_USER}:{config.DB_PASSWORD}@"
     f"{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
 )
@@ -57,6 +57,19 @@ class LLMRun(Base):
     latency_sql_generation_ms: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
     latency_sql_execution_ms: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
     latency_reasoning_ms: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    latency_overlap_ms: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    is_cache_hit: Mapped[Optional[bool]] = mapped_column(BOOLEAN, default=False, nullable=True)
+    reasoning_path: Mapped[Optional[str]] = mapped_column(String(20), nullable=True) # llm / template / cache / empty
+    estimated_rows_examined: Mapped[Optional[int]] = mapped_column(INT, nullable=True) # Perkiraan EXPLAIN cost guard
+    cost_guard_action: Mapped[Optional[str]] = mapped_column(String(20), nullable=True) # allow / reject / rewrite
+    # Token per tahap (prompt/completion); token_llm = total seluruh tahap
+    tokens_classification_prompt: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    tokens_classification_completion: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    tokens_sql_generation_prompt: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    tokens_sql_generation_completion: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    tokens_reasoning_prompt: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    tokens_reasoning_completion: Mapped[Optional[int]] = mapped_column(INT, nullable=True)
+    token_source: Mapped[Optional[str]] = mapped_column(String(20), nullable=True) # provider / estimate / mixed
     timestamp: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, default=datetime.utcnow, nullable=True)
 
     user_message: Mapped["ChatMessage"] = relationship(back_populates="llm_run")
\ No newline at end of file
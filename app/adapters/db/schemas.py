@@ -35,6 +35,18 @@ class LLMRunCreate(BaseModel):
     latency_sql_generation_ms: Optional[int] = None
     latency_sql_execution_ms: Optional[int] = None
     latency_reasoning_ms: Optional[int] = None
+    latency_overlap_ms: Optional[int] = None
+    is_cache_hit: Optional[bool] = False
+    reasoning_path: Optional[str] = None
+    estimated_rows_examined: Optional[int] = None
+    cost_guard_action: Optional[str] = None
+    tokens_classification_prompt: Optional[int] = None
+    tokens_classification_completion: Optional[int] = None
+    tokens_sql_generation_prompt: Optional[int] = None
+    tokens_sql_generation_completion: Optional[int] = None
+    tokens_reasoning_prompt: Optional[int] = None
+    tokens_reasoning_completion: Optional[int] = None
+    token_source: Optional[str] = None
 
 class LLMRunRead(LLMRunCreate):
     run_id: int
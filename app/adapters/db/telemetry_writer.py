@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+import app.config as config
+from . import models, schemas
+from .database import AsyncSessionLocal
+from app.core.tracing import background_trace
+
+logger = logging.getLogger(__name__)
+
+# Tabel yang boleh ditulis writer; urutan dict = urutan insert dalam satu batch
+_TABLES = {
+    "chat_messages": models.ChatMessage,
+    "llm_runs": models.LLMRun,
+}
+
+TelemetryRow = Tuple[str, Dict[str, Any]]
+
+class TelemetryWriter:
+    """
+    Writer telemetri SINGLETON per proses untuk `llm_runs` (dan `chat_messages`
+    yang ID-nya tidak dibutuhkan request).
+
+    Baris diantrikan ke antrian asyncio terbatas tanpa menunggu DB, lalu worker
+    menulisnya dengan bulk INSERT (executemany) memakai sesinya sendiri, sehingga
+    tidak pernah berebut koneksi dengan request. Batch dikirim saat ukurannya
+    mencapai `batch_size` atau setelah `flush_interval`. Antrian penuh berarti baris
+    dibuang dan dihitung sebagai `dropped`; kegagalan tulis dicoba ulang lalu
+    dihitung sebagai `failed`.
+    """
+    def __init__(
+        self,
+        max_queue_size: int = config.TELEMETRY_WRITER_MAX_QUEUE_SIZE,
+        batch_size: int = config.TELEMETRY_WRITER_BATCH_SIZE,
+        flush_interval: float = config.TELEMETRY_WRITER_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = config.TELEMETRY_WRITER_MAX_RETRIES,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written: Dict[str, int] = defaultdict(int)
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.max_depth = 0
+
+    def start(self) -> None:
+        """Mulai worker di event loop yang sedang berjalan (idempotent)."""
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run(), name="telemetry-writer")
+        logger.info("Telemetry writer started (batch=%d, queue=%d)", self.batch_size, self.max_queue_size)
+
+    def _enqueue(self, table: str, row: Dict[str, Any]) -> bool:
+        self.start()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait((table, row))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def enqueue_llm_run(self, run_data: schemas.LLMRunCreate) -> bool:
+        """Antrikan satu baris llm_runs tanpa memblokir request. False jika dibuang."""
+        return self._enqueue("llm_runs", run_data.dict())
+
+    def enqueue_chat_message(self, message: schemas.ChatMessageCreate) -> bool:
+        """Antrikan pesan yang ID-nya tidak dibutuhkan request (mis. pesan AI statis)."""
+        return self._enqueue("chat_messages", message.dict())
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch: List[TelemetryRow] = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            with background_trace("telemetry_writer.flush", rows=len(batch)):
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[TelemetryRow]) -> None:
+        rows_by_table: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for table, row in batch:
+            rows_by_table[table].append(row)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_factory() as session:
+                    for table, model in _TABLES.items():
+                        if rows_by_table.get(table):
+                            await session.execute(insert(model), rows_by_table[table])
+                    await session.commit()
+                for table, rows in rows_by_table.items():
+                    self.written[table] += len(rows)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    logger.error("Error writing %d telemetry rows: %s", len(batch), e)
+                    return
+                # Satu transaksi per batch, jadi batch yang gagal aman untuk diulang
+                self.retries += 1
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush sisa antrian lalu hentikan worker (dipanggil saat shutdown)."""
+        if self._worker is None or self._worker.done() or self._queue is None:
+            return
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.TimeoutError:
+            self._worker.cancel()
+            logger.warning("Telemetry writer stopped with %d rows unflushed", self._queue.qsize())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": dict(self.written),
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+        }
+
+@lru_cache(maxsize=1)
+def get_telemetry_writer() -> TelemetryWriter:
+    """Mengembalikan writer telemetri SINGLETON."""
+    return TelemetryWriter()
@@ -0,0 +1,117 @@
+import logging
+from typing import Callable, List, Optional
+
+from fastapi import BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import config
+from app.core.tracing import span
+from . import crud, models, schemas
+from .telemetry_writer import get_telemetry_writer
+
+logger = logging.getLogger(__name__)
+
+# Mode persistensi (PERSISTENCE_MODE)
+PERSISTENCE_PER_WRITE = "per_write"          # Perilaku lama: commit + refresh setiap INSERT
+PERSISTENCE_UNIT_OF_WORK = "unit_of_work"    # Flush per INSERT, satu commit di akhir request
+PERSISTENCE_MODES = (PERSISTENCE_PER_WRITE, PERSISTENCE_UNIT_OF_WORK)
+
+class UnitOfWork:
+    """
+    Penulisan pesan user, pesan AI, dan baris `llm_runs` untuk satu request.
+
+    Dalam mode `unit_of_work`, pesan user di-commit langsung dalam transaksi pendek
+    (ID-nya dibutuhkan sebagai FK). Tulisan berikutnya hanya ditambahkan ke sesi
+    tanpa flush, lalu di-flush dan di-commit sekali saat keluar dari blok `async with`
+    (termasuk ketika alur gagal, agar pesan error tetap tersimpan). Dengan begitu tidak
+    ada transaksi maupun koneksi pool yang tertahan selama panggilan LLM. Callback
+    `after_commit` (mis. antrean vektor Qdrant) baru dijalankan setelah data benar-benar
+    tersimpan. Mode `per_write` mempertahankan perilaku lama.
+    """
+    def __init__(self, session: AsyncSession, mode: str = config.PERSISTENCE_MODE):
+        if mode not in PERSISTENCE_MODES:
+            raise ValueError(f"PERSISTENCE_MODE tidak valid: {mode}. Pilihan: {', '.join(PERSISTENCE_MODES)}.")
+        self.session = session
+        self.mode = mode
+        self._after_commit: List[Callable[[], None]] = []
+        self._on_rollback: List[Callable[[], None]] = []
+
+    @property
+    def deferred(self) -> bool:
+        """True jika commit ditunda sampai akhir request."""
+        return self.mode == PERSISTENCE_UNIT_OF_WORK
+
+    async def add_user_message(self, message: schemas.ChatMessageCreate) -> models.ChatMessage:
+        """Simpan pesan user dan commit segera; ID terisi dari flush (tanpa refresh)."""
+        instance = await crud.create_chat_message(self.session, message, commit=not self.deferred)
+        if self.deferred:
+            with span("db.commit", stage="user_message"):
+                await self.session.commit()
+        return instance
+
+    async def add_chat_message(self, message: schemas.ChatMessageCreate) -> models.ChatMessage:
+        """Mode unit_of_work: hanya `session.add`; ID terisi saat commit di akhir request."""
+        if not self.deferred:
+            return await crud.create_chat_message(self.session, message)
+        instance = models.ChatMessage(**message.dict())
+        self.session.add(instance)
+        return instance
+
+    async def add_llm_run(
+        self,
+        run_data: schemas.LLMRunCreate,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> None:
+        """
+        Dengan telemetry writer, baris diantrikan setelah commit (FK ke pesan user
+        harus sudah terlihat oleh sesi writer). Tanpa writer: mode lama menulis di
+        background task (jika ada), unit of work ikut commit di akhir request.
+        """
+        if config.TELEMETRY_WRITER_ENABLED:
+            self.after_commit(lambda: get_telemetry_writer().enqueue_llm_run(run_data))
+            return
+        if not self.deferred and background_tasks is not None:
+            background_tasks.add_task(crud.create_llm_run, self.session, run_data)
+            return
+        if self.deferred:
+            self.session.add(models.LLMRun(**run_data.dict()))
+            return
+        await crud.create_llm_run(self.session, run_data)
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        if self.deferred:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    def on_rollback(self, callback: Callable[[], None]) -> None:
+        if self.deferred:
+            self._on_rollback.append(callback)
+
+    async def commit(self) -> None:
+        if self.deferred:
+            # Flush + commit tulisan yang ditunda dalam satu blok pendek
+            with span("db.commit"):
+                await self.session.commit()
+        callbacks, self._after_commit, self._on_rollback = self._after_commit, [], []
+        for callback in callbacks:
+            callback()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        callbacks, self._after_commit, self._on_rollback = self._on_rollback, [], []
+        for callback in callbacks:
+            callback()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        try:
+            await self.commit()
+        except Exception as commit_e:
+            logger.error("Gagal commit unit of work: %s", commit_e)
+            await self.rollback()
+            if exc is None:
+                raise RuntimeError(f"Gagal menyimpan data percakapan: {commit_e}")
+        return False
@@ -0,0 +1,296 @@
+import asyncio
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from app import config
+from app.core.token_counter import count_tokens
+
+# Model dengan prefix ini dilayani provider lokal (tanpa jaringan), mis. "local/fake"
+LOCAL_MODEL_PREFIX = "local/"
+
+STAGE_CLASSIFICATION = "classification"
+STAGE_SQL_GENERATION = "sql_generation"
+STAGE_REASONING = "reasoning"
+
+FAILURE_ERROR = "error"              # Lempar FakeLLMError (seperti error HTTP provider)
+FAILURE_TIMEOUT = "timeout"          # Tunggu lalu lempar asyncio.TimeoutError
+FAILURE_INVALID_SQL = "invalid_sql"  # Kembalikan SQL berbahaya agar validator menolak
+FAILURE_MODES = (FAILURE_ERROR, FAILURE_TIMEOUT, FAILURE_INVALID_SQL)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "normal", "lognormal", "uniform")
+
+_QUERY_PATTERN = re.compile(r'Pertanyaan Pengguna(?: Saat Ini| SAAT INI \(Fokus Utama\))?:\**[ \t]*\n?[ \t]*"?([^"\n]+)"?')
+_YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+_LIMIT_PATTERN = re.compile(r"\b(\d{1,3})\s+(?:unit|kegiatan|program|sasaran|data|teratas|terbesar|tertinggi)", re.IGNORECASE)
+
+_DOMAIN_KEYWORDS = (
+    "anggaran", "pagu", "realisasi", "sisa", "kegiatan", "unit", "program", "sasaran",
+    "dana", "prognosis", "akun", "coa", "drauk", "rkat", "belanja",
+)
+_FOLLOW_UP_KEYWORDS = ("tersebut", "yang tadi", "itu", "lanjut", "bagaimana dengan")
+
+class FakeLLMError(RuntimeError):
+    """Kegagalan yang disuntikkan oleh FakeChatModel."""
+
+def _clamp(value: float, upper: float) -> float:
+    return min(max(value, 0.0), upper)
+
+def _finite_float(value: str) -> float:
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Nilai parameter model lokal harus berhingga: {value}")
+    return number
+
+def detect_stage(prompt: str) -> str:
+    """Tebak tahap pipeline dari prompt (klasifikasi, generasi SQL, atau reasoning)."""
+    if "Kategori:" in prompt:
+        return STAGE_CLASSIFICATION
+    if "Query SQL" in prompt:
+        return STAGE_SQL_GENERATION
+    return STAGE_REASONING
+
+def extract_question(prompt: str) -> str:
+    """Pertanyaan pengguna terakhir di prompt (pola `Pertanyaan Pengguna ...:`)."""
+    matches = _QUERY_PATTERN.findall(prompt)
+    return matches[-1].strip() if matches else ""
+
+def rule_based_sql(question: str) -> str:
+    """SQL deterministik dari kata kunci pertanyaan, memakai kolom yang ada di YAML skema."""
+    text = question.lower()
+    if "prognosis" in text:
+        table, amount, remaining = "drauk_unit_prognosis", "Jumlah_Anggaran", "Sisa_Anggaran"
+    elif "sasaran" in text or "program strategis" in text:
+        table, amount, remaining = "drauk_unit_lengkap", "Jumlah", "Sisa"
+    else:
+        table, amount, remaining = "drauk_unit", "Jumlah", "Sisa"
+    metric = "Realisasi" if "realisasi" in text else remaining if "sisa" in text else amount
+
+    year = _YEAR_PATTERN.search(text)
+    where = f" WHERE Tahun_Anggaran = {year.group(1)}" if year else ""
+    limit_match = _LIMIT_PATTERN.search(text)
+    limit = int(limit_match.group(1)) if limit_match else 5
+
+    if any(word in text for word in ("terbesar", "tertinggi", "paling besar", "teratas")):
+        group = "Kegiatan_Unit" if "kegiatan" in text else "Nama_Unit"
+        return f"SELECT {group}, SUM({metric}) AS total FROM {table}{where} GROUP BY {group} ORDER BY total DESC LIMIT {limit};"
+    if any(word in text for word in ("terkecil", "terendah", "paling kecil")):
+        return f"SELECT Nama_Unit, SUM({metric}) AS total FROM {table}{where} GROUP BY Nama_Unit ORDER BY total ASC LIMIT {limit};"
+    if "per unit" in text or "setiap unit" in text:
+        return f"SELECT Nama_Unit, SUM({metric}) AS total FROM {table}{where} GROUP BY Nama_Unit;"
+    if any(word in text for word in ("total", "berapa", "jumlah")):
+        return f"SELECT SUM({metric}) AS total FROM {table}{where};"
+    return f"SELECT Nama_Unit, Kegiatan_Unit, {metric} FROM {table}{where} LIMIT 10;"
+
+def rule_based_classification(prompt: str, question: str) -> str:
+    text = question.lower()
+    if "lanjutan" in prompt and any(word in text for word in _FOLLOW_UP_KEYWORDS):
+        return "lanjutan"
+    return "data_perusahaan" if any(word in text for word in _DOMAIN_KEYWORDS) else "pengetahuan_umum"
+
+def rule_based_reasoning(question: str) -> str:
+    return (
+        f"Berdasarkan data hasil kueri untuk pertanyaan \"{question}\", nilai anggaran terbesar terkonsentrasi "
+        "pada beberapa unit kerja utama, sementara realisasi masih berada di bawah pagu sehingga masih "
+        "terdapat sisa anggaran yang dapat dioptimalkan pada periode berjalan."
+    )
+
+class FakeChatModel(BaseChatModel):
+    """
+    Provider LLM lokal yang deterministik untuk profiling, soak test, dan benchmark CI.
+
+    Jawaban diambil dari `scripted_responses` (regex → teks, urutan pertama yang cocok),
+    lalu `scripted_sql` (pertanyaan → SQL), lalu aturan berbasis kata kunci per tahap.
+    Latency mengikuti distribusi yang dapat diatur, `astream` mengirim token per kata,
+    `usage_metadata` dihitung dengan tokenizer lokal, dan kegagalan dapat disuntikkan
+    secara acak (`failure_rate`) atau terjadwal (`fail_next`).
+    """
+    model_name: str = "local/fake"
+    latency_ms: float = config.FAKE_LLM_LATENCY_MS
+    latency_jitter_ms: float = config.FAKE_LLM_LATENCY_JITTER_MS
+    latency_distribution: str = config.FAKE_LLM_LATENCY_DISTRIBUTION
+    stream_token_ms: float = config.FAKE_LLM_STREAM_TOKEN_MS
+    failure_rate: float = config.FAKE_LLM_FAILURE_RATE
+    failure_mode: str = config.FAKE_LLM_FAILURE_MODE
+    failure_stages: Tuple[str, ...] = ()
+    scripted_responses: List[Tuple[str, str]] = []
+    scripted_sql: Dict[str, str] = {}
+    seed: Optional[int] = config.FAKE_LLM_SEED
+
+    _rng: random.Random = PrivateAttr()
+    _scheduled_failures: List[str] = PrivateAttr(default_factory=list)
+    _calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Distribusi latency tidak valid: {self.latency_distribution}. Pilihan: {', '.join(LATENCY_DISTRIBUTIONS)}.")
+        if self.failure_mode not in FAILURE_MODES:
+            raise ValueError(f"Mode kegagalan tidak valid: {self.failure_mode}. Pilihan: {', '.join(FAILURE_MODES)}.")
+        # Nilai bisa berasal dari nama model di request: batasi agar satu request tidak menahan worker
+        self.latency_ms = _clamp(self.latency_ms, config.FAKE_LLM_MAX_LATENCY_MS)
+        self.latency_jitter_ms = _clamp(self.latency_jitter_ms, config.FAKE_LLM_MAX_LATENCY_MS)
+        self.stream_token_ms = _clamp(self.stream_token_ms, config.FAKE_LLM_MAX_STREAM_TOKEN_MS)
+        self.failure_rate = _clamp(self.failure_rate, 1.0)
+        self._rng = random.Random(self.seed)
+        self._scheduled_failures = []
+        self._calls = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency_ms": self.latency_ms, "seed": self.seed}
+
+    def fail_next(self, count: int = 1, mode: Optional[str] = None) -> None:
+        """Jadwalkan `count` panggilan berikutnya agar gagal dengan mode tertentu."""
+        self._scheduled_failures.extend([mode or self.failure_mode] * count)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jumlah panggilan per tahap dan sisa kegagalan terjadwal."""
+        return {"calls": dict(self._calls), "scheduled_failures": len(self._scheduled_failures)}
+
+    def sample_latency(self) -> float:
+        """Satu sampel latency (detik) dari distribusi yang dikonfigurasi."""
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        if self.latency_distribution == "fixed" or jitter <= 0:
+            value = mean
+        elif self.latency_distribution == "normal":
+            value = self._rng.gauss(mean, jitter)
+        elif self.latency_distribution == "uniform":
+            value = self._rng.uniform(mean - jitter, mean + jitter)
+        else:
+            # lognormal dengan mean & simpangan baku ≈ latency_ms & latency_jitter_ms (ekor panjang seperti API asli)
+            if mean > 0:
+                sigma2 = math.log(1 + (jitter / mean) ** 2)
+                value = self._rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+            else:
+                value = 0.0
+        return _clamp(value, config.FAKE_LLM_MAX_LATENCY_MS) / 1000
+
+    def _failure_for(self, stage: str) -> Optional[str]:
+        if self._scheduled_failures:
+            return self._scheduled_failures.pop(0)
+        if self.failure_rate > 0 and (not self.failure_stages or stage in self.failure_stages):
+            if self._rng.random() < self.failure_rate:
+                return self.failure_mode
+        return None
+
+    def respond(self, prompt: str) -> Tuple[str, str]:
+        """(tahap, teks jawaban) untuk sebuah prompt, tanpa latency."""
+        stage = detect_stage(prompt)
+        for pattern, response in self.scripted_responses:
+            if re.search(pattern, prompt):
+                return stage, response
+        question = extract_question(prompt)
+        if stage == STAGE_CLASSIFICATION:
+            return stage, rule_based_classification(prompt, question)
+        if stage == STAGE_SQL_GENERATION:
+            return stage, self.scripted_sql.get(question) or rule_based_sql(question)
+        return stage, rule_based_reasoning(question)
+
+    def _prepare(self, messages: List[BaseMessage]) -> Tuple[str, str, Optional[str], float]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        stage, content = self.respond(prompt)
+        self._calls[stage] = self._calls.get(stage, 0) + 1
+        failure = self._failure_for(stage)
+        if failure == FAILURE_INVALID_SQL:
+            # Hanya bermakna di tahap SQL; tahap lain dijawab normal
+            content = "DROP TABLE drauk_unit;" if stage == STAGE_SQL_GENERATION else content
+            failure = None
+        return prompt, content, failure, self.sample_latency()
+
+    def _raise_failure(self, failure: str, prompt: str) -> None:
+        if failure == FAILURE_TIMEOUT:
+            raise asyncio.TimeoutError(f"{self.model_name}: simulated timeout")
+        raise FakeLLMError(f"{self.model_name}: simulated provider error ({detect_stage(prompt)})")
+
+    def _usage(self, prompt: str, content: str) -> Dict[str, int]:
+        input_tokens, output_tokens = count_tokens(prompt, self.model_name), count_tokens(content, self.model_name)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _result(self, prompt: str, content: str) -> ChatResult:
+        message = AIMessage(content=content, usage_metadata=self._usage(prompt, content), response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt, content, failure, delay = self._prepare(messages)
+        time.sleep(delay)
+        if failure:
+            self._raise_failure(failure, prompt)
+        return self._result(prompt, content)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt, content, failure, delay = self._prepare(messages)
+        await asyncio.sleep(delay)
+        if failure:
+            self._raise_failure(failure, prompt)
+        return self._result(prompt, content)
+
+    def _chunks(self, content: str) -> List[str]:
+        words = content.split(" ")
+        return [word if index == len(words) - 1 else word + " " for index, word in enumerate(words)]
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt, content, failure, delay = self._prepare(messages)
+        # Latency = waktu hingga token pertama; token berikutnya tiap `stream_token_ms`
+        time.sleep(delay)
+        if failure:
+            self._raise_failure(failure, prompt)
+        chunks = self._chunks(content)
+        for index, text in enumerate(chunks):
+            if index:
+                time.sleep(self.stream_token_ms / 1000)
+            last = index == len(chunks) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=self._usage(prompt, content) if last else None))
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        prompt, content, failure, delay = self._prepare(messages)
+        await asyncio.sleep(delay)
+        if failure:
+            self._raise_failure(failure, prompt)
+        chunks = self._chunks(content)
+        for index, text in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self.stream_token_ms / 1000)
+            last = index == len(chunks) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=self._usage(prompt, content) if last else None))
+
+# Parameter yang boleh di-override lewat nama model, mis. "local/fake?latency_ms=50&failure_rate=0.1"
+_MODEL_NAME_PARAMS = {
+    "latency_ms": _finite_float,
+    "latency_jitter_ms": _finite_float,
+    "latency_distribution": str,
+    "stream_token_ms": _finite_float,
+    "failure_rate": _finite_float,
+    "failure_mode": str,
+    "failure_stages": lambda value: tuple(stage.strip() for stage in value.split(",") if stage.strip()),
+    "seed": int,
+}
+
+def is_local_model(model_name: str) -> bool:
+    return model_name.lower().startswith(LOCAL_MODEL_PREFIX)
+
+def get_fake_llm(model_name: str, **overrides: Any) -> FakeChatModel:
+    """
+    Mengembalikan FakeChatModel untuk nama model `local/...`. Parameter query pada
+    nama model (latency, distribusi, kegagalan, seed) meng-override default config,
+    dibatasi FAKE_LLM_MAX_LATENCY_MS / FAKE_LLM_MAX_STREAM_TOKEN_MS dan failure_rate <= 1.
+    """
+    _, _, query = model_name.partition("?")
+    params: Dict[str, Any] = {}
+    for key, value in parse_qsl(query):
+        if key not in _MODEL_NAME_PARAMS:
+            raise ValueError(f"Parameter model lokal tidak dikenal: {key}. Pilihan: {', '.join(_MODEL_NAME_PARAMS)}.")
+        params[key] = _MODEL_NAME_PARAMS[key](value)
+    return FakeChatModel(model_name=model_name, **{**params, **overrides})
@@ -1,18 +1,270 @@
+import asyncio
+import importlib.util
+import inspect
+import logging
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+import httpx
 from langchain_core.language_models import BaseLanguageModel
-from .gemini_adapter import get_gemini_llm
-from .openrouter_adapter import get_openrouter_llm
+
+from app import config
+from .fake_adapter import get_fake_llm, is_local_model
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_GEMINI = "Gemini"
+PROVIDER_OPENROUTER = "OpenRouter"
+PROVIDER_LOCAL = "Local"
+
+def get_provider_name(model_name: str) -> str:
+    """Nama provider yang dipakai untuk routing sebuah model."""
+    if is_local_model(model_name):
+        return PROVIDER_LOCAL
+    return PROVIDER_GEMINI if "gemini" in model_name.lower() else PROVIDER_OPENROUTER
+
+class LLMClientRegistry:
+    """
+    Registry client LLM berumur panjang.
+
+    Client dibuat sekali per (provider, model) lalu dipakai ulang lintas request,
+    sehingga koneksi TLS/keep-alive ke provider tidak dibangun ulang setiap kali.
+    Client OpenRouter berbagi satu `httpx.AsyncClient` dengan pool koneksi yang
+    dapat dikonfigurasi (HTTP/2 jika paket `h2` tersedia). Client Gemini mengelola
+    transport-nya sendiri; yang dipakai ulang adalah instance-nya. Model `local/...`
+    dilayani FakeChatModel tanpa jaringan (profiling dan benchmark) jika LOCAL_LLM_ENABLED,
+    dengan LRU terpisah (`max_local_clients`) agar tidak menggusur client provider asli.
+    Setiap provider juga memiliki batas konkurensi (semaphore).
+
+    Nama model datang dari request, jadi jumlah client dibatasi `max_clients` (LRU).
+    Client yang tergusur tetap terikat ke provider/semaphore-nya selama masih dipegang
+    request; transport-nya baru ditutup setelah objek client tidak direferensikan lagi.
+    """
+    def __init__(
+        self,
+        max_connections: int = config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = config.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = config.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        timeout: float = config.LLM_HTTP_TIMEOUT_SECONDS,
+        http2: bool = config.LLM_HTTP2_ENABLED,
+        provider_limits: Optional[Dict[str, int]] = None,
+        max_clients: int = config.LLM_CLIENT_CACHE_MAX_CLIENTS,
+        max_local_clients: int = config.LOCAL_LLM_MAX_CLIENTS,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.provider_limits = provider_limits or {
+            PROVIDER_OPENROUTER: config.LLM_MAX_CONCURRENCY_OPENROUTER,
+            PROVIDER_GEMINI: config.LLM_MAX_CONCURRENCY_GEMINI,
+            PROVIDER_LOCAL: config.LLM_MAX_CONCURRENCY_LOCAL,
+        }
+        self.max_clients = max_clients
+        self.max_local_clients = max_local_clients
+        self._clients: "OrderedDict[Tuple[str, str], BaseLanguageModel]" = OrderedDict()
+        self._local_clients: "OrderedDict[Tuple[str, str], BaseLanguageModel]" = OrderedDict()
+        # id(client) -> provider; dihapus oleh weakref.finalize saat client di-GC (id tidak dipakai ulang selama hidup)
+        self._client_providers: Dict[int, str] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {
+            provider: asyncio.Semaphore(limit) for provider, limit in self.provider_limits.items()
+        }
+        self._in_flight: Dict[str, int] = {provider: 0 for provider in self.provider_limits}
+        self._waiting: Dict[str, int] = {provider: 0 for provider in self.provider_limits}
+        self._acquired: Dict[str, int] = {provider: 0 for provider in self.provider_limits}
+        self.clients_created = 0
+        self.clients_reused = 0
+        self.clients_evicted = 0
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        """Pool HTTP async bersama untuk semua client berbasis OpenAI-compatible API."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.timeout),
+            )
+        return self._http_client
+
+    def _pool(self, provider: str) -> Tuple["OrderedDict[Tuple[str, str], BaseLanguageModel]", int]:
+        """LRU tempat client provider disimpan beserta kapasitasnya."""
+        if provider == PROVIDER_LOCAL:
+            return self._local_clients, self.max_local_clients
+        return self._clients, self.max_clients
+
+    def get(self, model_name: str) -> BaseLanguageModel:
+        provider = get_provider_name(model_name)
+        if provider == PROVIDER_LOCAL and not config.LOCAL_LLM_ENABLED:
+            raise ValueError(f"Model lokal '{model_name}' tidak diaktifkan (LOCAL_LLM_ENABLED=false).")
+        key = (provider, model_name)
+        clients, _ = self._pool(provider)
+        client = clients.get(key)
+        if client is not None:
+            clients.move_to_end(key)
+            self.clients_reused += 1
+            return client
+
+        if provider == PROVIDER_LOCAL:
+            logger.info("Routing to local fake LLM for model: %s", model_name)
+            client = get_fake_llm(model_name)
+        elif provider == PROVIDER_GEMINI:
+            logger.info("Routing to Gemini for model: %s", model_name)
+            # SDK provider diimpor saat dibutuhkan (deployment tanpa Gemini tidak perlu paketnya)
+            from .gemini_adapter import get_gemini_llm
+            client = get_gemini_llm(model_name)
+        else:
+            # Default ke OpenRouter untuk semua model lainnya
+            logger.info("Routing to OpenRouter for model: %s", model_name)
+            from .openrouter_adapter import get_openrouter_llm
+            client = get_openrouter_llm(model_name, http_async_client=self.http_async_client())
+
+        self._store(key, client, provider)
+        self.clients_created += 1
+        return client
+
+    def register(self, model_name: str, client: BaseLanguageModel, provider: Optional[str] = None) -> None:
+        """
+        Daftarkan client yang sudah dibuat untuk sebuah nama model (mis. LLM palsu untuk
+        benchmark). Provider tanpa batas konkurensi di `provider_limits` tidak dibatasi slot.
+        """
+        provider = provider or get_provider_name(model_name)
+        self._store((get_provider_name(model_name), model_name), client, provider)
+
+    def _store(self, key: Tuple[str, str], client: BaseLanguageModel, provider: str) -> None:
+        clients, max_clients = self._pool(key[0])
+        previous = clients.pop(key, None)
+        if previous is not None and previous is not client:
+            self._evict(previous)
+        clients[key] = client
+        if id(client) not in self._client_providers:
+            weakref.finalize(client, self._client_providers.pop, id(client), None)
+        self._client_providers[id(client)] = provider
+        while len(clients) > max_clients:
+            _, oldest = clients.popitem(last=False)
+            self.clients_evicted += 1
+            self._evict(oldest)
+
+    def _evict(self, client: BaseLanguageModel) -> None:
+        """
+        Jadwalkan penutupan transport client yang tergusur saat objeknya di-GC, sehingga
+        request yang masih memegang client (di antara tahap) tidak memakai transport tertutup.
+        """
+        transport = self._transport(client)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Tanpa event loop (mis. skrip sinkron): biarkan GC yang menutup transport-nya
+            return
+        if transport is not None:
+            weakref.finalize(client, self._close_when_collected, loop, transport)
+
+    def _transport(self, client: BaseLanguageModel) -> Optional[Any]:
+        """Objek transport milik client yang perlu ditutup; None untuk pool HTTP bersama."""
+        if self._http_client is not None and getattr(client, "http_async_client", None) is self._http_client:
+            return None
+        for owner in (getattr(client, "root_async_client", None), getattr(client, "async_client", None)):
+            if owner is not None and (hasattr(owner, "aclose") or hasattr(owner, "close")):
+                return owner
+        return None
+
+    def _close_when_collected(self, loop: asyncio.AbstractEventLoop, transport: Any) -> None:
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._spawn_close, transport)
+
+    def _spawn_close(self, transport: Any) -> None:
+        task = asyncio.get_running_loop().create_task(self._aclose_transport(transport))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _aclose_transport(self, transport: Any) -> None:
+        close = getattr(transport, "aclose", None) or getattr(transport, "close", None)
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning("Gagal menutup client LLM yang tergusur: %s", e)
+
+    @asynccontextmanager
+    async def slot(self, llm: BaseLanguageModel) -> AsyncIterator[None]:
+        """Batasi jumlah panggilan bersamaan per provider untuk client dari registry ini."""
+        provider = self._client_providers.get(id(llm))
+        semaphore = self._semaphores.get(provider) if provider else None
+        if semaphore is None:
+            yield
+            return
+
+        self._waiting[provider] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[provider] -= 1
+        self._in_flight[provider] += 1
+        self._acquired[provider] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[provider] -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        pool_stats: Dict[str, Any] = {"http2": self.http2, "max_connections": self.max_connections}
+        # httpx tidak mengekspos statistik pool secara publik; baca dari pool httpcore jika ada
+        pool = getattr(getattr(self._http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", None) or [])
+        pool_stats["connections"] = len(connections)
+        pool_stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+
+        return {
+            "clients": len(self._clients),
+            "local_clients": len(self._local_clients),
+            "clients_created": self.clients_created,
+            "clients_reused": self.clients_reused,
+            "clients_evicted": self.clients_evicted,
+            "max_clients": self.max_clients,
+            "http_pool": pool_stats,
+            "providers": {
+                provider: {
+                    "limit": limit,
+                    "in_flight": self._in_flight[provider],
+                    "waiting": self._waiting[provider],
+                    "acquired_total": self._acquired[provider],
+                }
+                for provider, limit in self.provider_limits.items()
+            },
+        }
+
+    async def aclose(self) -> None:
+        """Tutup client dan pool HTTP bersama (dipanggil saat aplikasi shutdown)."""
+        for client in [*self._clients.values(), *self._local_clients.values()]:
+            transport = self._transport(client)
+            if transport is not None:
+                await self._aclose_transport(transport)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._clients.clear()
+        self._local_clients.clear()
+
+@lru_cache(maxsize=1)
+def get_llm_registry() -> LLMClientRegistry:
+    """Mengembalikan registry client LLM SINGLETON."""
+    return LLMClientRegistry()
 
 def get_llm_adapter(model_name: str) -> BaseLanguageModel:
     """
     Factory function yang memilih dan mengembalikan adapter LLM yang sesuai
-    berdasarkan nama model.
+    berdasarkan nama model. Instance dipakai ulang lintas request lewat registry.
     """
-    model_lower = model_name.lower()
-
-    if "gemini" in model_lower:
-        print(f"✅ Routing to Gemini for model: {model_name}")
-        return get_gemini_llm(model_name)
-    else:
-        # Default ke OpenRouter untuk semua model lainnya
-        print(f"✅ Routing to OpenRouter for model: {model_name}")
-        return get_openrouter_llm(model_name)
\ No newline at end of file
+    return get_llm_registry().get(model_name)
@@ -1,20 +1,25 @@
+from typing import Optional
+
+import httpx
 from langchain_openai import ChatOpenAI
 from app import config
 from pydantic import SecretStr
 
-def get_openrouter_llm(model_name: str):
+def get_openrouter_llm(model_name: str, http_async_client: Optional[httpx.AsyncClient] = None):
     """
     Mengembalikan instance LLM yang terhubung ke OpenRouter
     menggunakan adapter ChatOpenAI yang universal.
+    `http_async_client` memungkinkan pool koneksi dibagi antar instance.
     """
     return ChatOpenAI(
         model=model_name,
         temperature=0.1,
         base_url="https://openrouter.ai/api/v1",
         api_key=SecretStr(config.OPENROUTER_API_KEY),
+        http_async_client=http_async_client,
         
         default_headers={
             "HTTP-Referer": "<YOUR_SITE_URL>", 
             "X-Title": "<YOUR_SITE_NAME>",
         }
-    )
\ No newline at end of file
+    )
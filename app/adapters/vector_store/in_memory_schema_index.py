@@ -0,0 +1,150 @@
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.schema_documents import documents_content_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_LOCK_FILE_NAME = "schema_index.lock"
+
+@contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """Lock eksklusif antar proses (worker) selama index dibangun dan dibersihkan."""
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class InMemorySchemaIndex:
+    """
+    Index vektor skema di dalam proses.
+
+    Vektor dokumen disimpan sebagai matriks float32 ternormalisasi yang contiguous,
+    dipersist ke file `.npy` yang namanya memuat hash isi dokumen + nama model,
+    lalu dibuka kembali dengan memory-map. Pencarian = satu dot product vektorisasi
+    (cosine similarity, sama seperti koleksi Qdrant hasil ingest). Pembangunan index
+    dijalankan di bawah file lock agar beberapa worker tidak saling menimpa.
+    """
+    def __init__(
+        self,
+        documents: Sequence[Document],
+        embeddings: Embeddings,
+        cache_dir: Path,
+        embedding_model_name: str,
+    ):
+        self.documents = list(documents)
+        content_hash = documents_content_hash(self.documents, embedding_model_name)
+        self.path = Path(cache_dir) / f"schema_{content_hash[:16]}.npy"
+        self.matrix = self._load_or_build(embeddings)
+
+    def _load(self) -> Optional[np.ndarray]:
+        if not self.path.exists():
+            return None
+        matrix = np.load(self.path, mmap_mode="r")
+        if matrix.shape[0] != len(self.documents):
+            return None
+        logger.info("Schema index loaded from %s (%d docs)", self.path, matrix.shape[0])
+        return matrix
+
+    def _load_or_build(self, embeddings: Embeddings) -> np.ndarray:
+        matrix = self._load()
+        if matrix is not None:
+            return matrix
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _file_lock(self.path.parent / _LOCK_FILE_NAME):
+            # Worker lain mungkin sudah membangun index yang sama selama kita menunggu lock
+            matrix = self._load()
+            if matrix is not None:
+                return matrix
+            self._write(self._build(embeddings))
+            self._remove_stale()
+        return np.load(self.path, mmap_mode="r")
+
+    def _build(self, embeddings: Embeddings) -> np.ndarray:
+        logger.info("Building schema index for %d docs", len(self.documents))
+        vectors = np.asarray(
+            embeddings.embed_documents([doc.page_content for doc in self.documents]), dtype=np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+    def _write(self, matrix: np.ndarray) -> None:
+        """Tulis atomik lewat file sementara bernama unik di direktori yang sama."""
+        with tempfile.NamedTemporaryFile(
+            dir=self.path.parent, prefix=f".{self.path.stem}.", suffix=".tmp", delete=False
+        ) as tmp_file:
+            try:
+                np.save(tmp_file, matrix)
+            except BaseException:
+                os.unlink(tmp_file.name)
+                raise
+        os.replace(tmp_file.name, self.path)
+
+    def _remove_stale(self) -> None:
+        """
+        Hapus index dengan hash lain yang lebih lama dari index saat ini. Index yang
+        lebih baru (worker dengan dokumen lebih baru) dibiarkan.
+        """
+        current_mtime = self.path.stat().st_mtime
+        for stale in self.path.parent.glob("schema_*.npy"):
+            if stale == self.path:
+                continue
+            try:
+                if stale.stat().st_mtime < current_mtime:
+                    stale.unlink()
+            except FileNotFoundError:
+                pass
+
+    def search(self, query_vector: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        """Kembalikan k dokumen teratas beserta skor cosine-nya."""
+        if not self.documents:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = self.matrix @ query
+
+        k = min(k, len(self.documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.documents[i], float(scores[i])) for i in top]
+
+class InMemorySchemaRetriever(BaseRetriever):
+    """Retriever LangChain di atas InMemorySchemaIndex (pengganti retriever Qdrant untuk skema)."""
+    index: InMemorySchemaIndex
+    embeddings: Embeddings
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.index.search(vector, self.k)]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        return [doc for doc, _ in self.index.search(vector, self.k)]
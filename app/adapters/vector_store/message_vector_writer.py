@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import models
+
+import app.config as config
+from app.adapters.db import schemas
+from app.core.embedding_provider import get_embedding_model
+from app.core.tracing import background_trace
+from .qdrant_adapter import get_async_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+# Namespace tetap agar point id deterministik dari message_id (retry = idempotent)
+_POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "nl2sql/chat_messages")
+
+def message_point_id(message_id: int) -> str:
+    """Point id Qdrant yang deterministik untuk sebuah message_id MySQL."""
+    return str(uuid.uuid5(_POINT_NAMESPACE, str(message_id)))
+
+class MessageVectorWriter:
+    """
+    Subsistem ingest vektor chat di background.
+
+    Pesan diantrikan (antrian terbatas), di-embed per batch dengan `embed_documents`,
+    lalu di-upsert sekaligus melalui satu AsyncQdrantClient bersama.
+    Batch dikirim saat ukurannya mencapai `batch_size` atau setelah `flush_interval`.
+    Jika antrian penuh, pesan dibuang dan dihitung sebagai `dropped`.
+    """
+    def __init__(
+        self,
+        collection_name: str = config.CHAT_HISTORY_COLLECTION,
+        max_queue_size: int = config.VECTOR_WRITER_MAX_QUEUE_SIZE,
+        batch_size: int = config.VECTOR_WRITER_BATCH_SIZE,
+        flush_interval: float = config.VECTOR_WRITER_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = config.VECTOR_WRITER_MAX_RETRIES,
+    ):
+        self.collection_name = collection_name
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.max_depth = 0
+
+    def start(self) -> None:
+        """Mulai worker di event loop yang sedang berjalan (idempotent)."""
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run(), name="message-vector-writer")
+        logger.info("Message vector writer started (batch=%d, queue=%d)", self.batch_size, self.max_queue_size)
+
+    def enqueue(self, message: schemas.ChatMessageRead) -> bool:
+        """Antrikan pesan tanpa memblokir request. Mengembalikan False jika dibuang."""
+        self.start()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch: List[schemas.ChatMessageRead] = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            with background_trace("message_vector_writer.flush", rows=len(batch)):
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[schemas.ChatMessageRead]) -> None:
+        # Embedding CPU-bound, jalankan di executor dalam satu forward pass. Pesan chat jarang
+        # berulang, jadi pakai model dasar agar LRU embedding tetap untuk teks kueri
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(
+                None, get_embedding_model().base.embed_documents, [message.message_text for message in batch]
+            )
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Error embedding %d chat messages: %s", len(batch), e)
+            return
+
+        points = [
+            models.PointStruct(
+                id=message_point_id(message.message_id),
+                vector=vector,
+                payload={
+                    "text": message.message_text,
+                    "sender": message.sender,
+                    "room_id": message.room_id,
+                    "timestamp": message.timestamp.isoformat(), # Simpan sebagai string ISO format
+                    "original_message_id": message.message_id # Simpan ID dari MySQL
+                },
+            )
+            for message, vector in zip(batch, vectors)
+        ]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await get_async_qdrant_client().upsert(
+                    collection_name=self.collection_name, points=points, wait=False
+                )
+                self.written += len(points)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(points)
+                    logger.error("Error upserting %d message vectors to Qdrant: %s", len(points), e)
+                    return
+                # Point id deterministik, jadi retry aman (idempotent)
+                self.retries += 1
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush sisa antrian lalu hentikan worker (dipanggil saat shutdown)."""
+        if self._worker is None or self._worker.done() or self._queue is None:
+            return
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.TimeoutError:
+            self._worker.cancel()
+            logger.warning("Message vector writer stopped with %d messages unflushed", self._queue.qsize())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+        }
+
+@lru_cache(maxsize=1)
+def get_message_vector_writer() -> MessageVectorWriter:
+    """Mengembalikan writer vektor chat SINGLETON."""
+    return MessageVectorWriter()
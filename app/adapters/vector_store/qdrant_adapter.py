@@ -1,9 +1,7 @@
-from qdrant_client import models, AsyncQdrantClient
+from qdrant_client import AsyncQdrantClient
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.embeddings import Embeddings
-import uuid
-from app.adapters.db import schemas
-import asyncio
+from functools import lru_cache
 import app.config as config
 
 def get_qdrant_retriever(
@@ -15,62 +13,30 @@ def get_qdrant_retriever(
     vector_store = QdrantVectorStore.from_existing_collection(
          embedding=embeddings,
          collection_name=collection_name,
-         host=qdrant_host,
+         host=None if config.QDRANT_LOCATION else qdrant_host,
+         location=config.QDRANT_LOCATION,
         #  api_key=qdrant_api_key,
          prefer_grpc=False
      )
     
     return vector_store.as_retriever()
 
-async def add_message_vector(
-    message: schemas.ChatMessageRead, # Terima objek pesan yang sudah disimpan (punya ID)
-    embeddings: Embeddings, # Terima instance embedding model
-    collection_name: str = "chat_history_collection"
-):
+@lru_cache(maxsize=1)
+def get_async_qdrant_client() -> AsyncQdrantClient:
     """
-    Membuat vektor dari teks pesan dan menyimpannya ke Qdrant.
+    AsyncQdrantClient SINGLETON yang dipakai bersama oleh writer vektor,
+    sehingga tidak ada koneksi baru per pesan.
     """
-    # 1. Buat Vektor dari Teks Pesan
-    # Gunakan run_in_executor karena embedding CPU-bound
-    loop = asyncio.get_running_loop()
-    vector = await loop.run_in_executor(
-        None,
-        embeddings.embed_query, # Fungsi embed_query cocok untuk satu teks
-        message.message_text
-    )
-
-    # 2. Siapkan Payload (Metadata)
-    payload = {
-        "text": message.message_text,
-        "sender": message.sender,
-        "room_id": message.room_id,
-        "timestamp": message.timestamp.isoformat(), # Simpan sebagai string ISO format
-        "original_message_id": message.message_id # Simpan ID dari MySQL
-    }
-
-    # 3. Siapkan Point untuk Qdrant
-    # Gunakan UUID baru untuk ID point Qdrant, atau bisa juga message_id jika unik
-    point_id = str(uuid.uuid4())
-    point = models.PointStruct(
-        id=point_id,
-        vector=vector,
-        payload=payload
-    )
-
-    # 4. Buat Koneksi Qdrant Client (bisa dioptimalkan dengan instance global)
-    # Untuk background task, mungkin lebih aman membuat koneksi baru tiap task
-    client = AsyncQdrantClient(
+    if config.QDRANT_LOCATION:
+        return AsyncQdrantClient(location=config.QDRANT_LOCATION)
+    return AsyncQdrantClient(
         host=config.QDRANT_HOST,
         # api_key=config.QDRANT_API_KEY,
         prefer_grpc=False
     )
 
-    try:
-        # ✅ Use await with the async client's upsert method
-        await client.upsert(collection_name=collection_name, points=[point], wait=False)
-        print(f"✅ Successfully upserted message vector {point_id} to Qdrant collection '{collection_name}'")
-    except Exception as e:
-        print(f"❌ Error upserting message vector to Qdrant: {e}")
-    finally:
-        # ✅ Use await with the async client's close coroutine
-        await client.close() # Use close() coroutine for the async client
\ No newline at end of file
+async def close_async_qdrant_client() -> None:
+    """Tutup client Qdrant bersama (dipanggil saat aplikasi shutdown)."""
+    if get_async_qdrant_client.cache_info().currsize:
+        await get_async_qdrant_client().close()
+        get_async_qdrant_client.cache_clear()
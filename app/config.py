@@ -1,7 +1,10 @@
 import os
+from pathlib import Path
 
 # VECTOR DATABASE
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+# Jika diisi (mis. ":memory:" untuk benchmark/offline), dipakai sebagai pengganti QDRANT_HOST
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION") or None
 # QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "my_documents")
 
@@ -22,8 +25,161 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_DATABASE", "mydatabase")
 DB_USER = os.getenv("DB_USERNAME", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+# URL SQLAlchemy lengkap (mis. sqlite+aiosqlite:///bench.db); jika kosong dibangun dari DB_* di atas
+DATABASE_URL = os.getenv("DATABASE_URL") or None
 
 # OPENROUTER
 BASE_URL_OPEN_ROUTER = os.getenv("BASE_URL_OPEN_ROUTER", "https://openrouter.ai/api/v1")
 OPENROUTER_APP_NAME = os.getenv("OPENROUTER_APP_NAME", "ChatBudgeting")
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your-openrouter-api-key")
\ No newline at end of file
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your-openrouter-api-key")
+
+# SCHEMA YAML (sumber RAG skema)
+SCHEMA_DATA_DIR = Path(os.getenv("SCHEMA_DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+
+# ANSWER CACHE (semantic cache di depan pipeline NL2SQL)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 512))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.97))
+ANSWER_CACHE_STORE_DATA = os.getenv("ANSWER_CACHE_STORE_DATA", "false").lower() == "true"
+# Interval pengecekan sidik jari file YAML skema (bukan di setiap lookup)
+ANSWER_CACHE_SCHEMA_CHECK_SECONDS = float(os.getenv("ANSWER_CACHE_SCHEMA_CHECK_SECONDS", 30))
+
+# SPECULATIVE EXECUTION (klasifikasi paralel dengan RAG + generasi SQL)
+SPECULATIVE_CLASSIFICATION_ENABLED = os.getenv("SPECULATIVE_CLASSIFICATION_ENABLED", "false").lower() == "true"
+
+# LLM CLIENT POOL (registry client LLM berumur panjang)
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+LLM_HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", 60))
+LLM_HTTP2_ENABLED = os.getenv("LLM_HTTP2_ENABLED", "true").lower() == "true"
+LLM_MAX_CONCURRENCY_OPENROUTER = int(os.getenv("LLM_MAX_CONCURRENCY_OPENROUTER", 32))
+LLM_MAX_CONCURRENCY_GEMINI = int(os.getenv("LLM_MAX_CONCURRENCY_GEMINI", 32))
+LLM_MAX_CONCURRENCY_LOCAL = int(os.getenv("LLM_MAX_CONCURRENCY_LOCAL", 64))
+# Jumlah client (provider, model) yang disimpan registry; yang paling lama tidak dipakai ditutup
+LLM_CLIENT_CACHE_MAX_CLIENTS = int(os.getenv("LLM_CLIENT_CACHE_MAX_CLIENTS", 32))
+
+# CHAT VECTOR WRITER (ingest vektor chat ke Qdrant secara batch)
+CHAT_HISTORY_COLLECTION = os.getenv("CHAT_HISTORY_COLLECTION", "chat_history_collection")
+VECTOR_WRITER_MAX_QUEUE_SIZE = int(os.getenv("VECTOR_WRITER_MAX_QUEUE_SIZE", 10000))
+VECTOR_WRITER_BATCH_SIZE = int(os.getenv("VECTOR_WRITER_BATCH_SIZE", 64))
+VECTOR_WRITER_FLUSH_INTERVAL_SECONDS = float(os.getenv("VECTOR_WRITER_FLUSH_INTERVAL_SECONDS", 0.5))
+VECTOR_WRITER_MAX_RETRIES = int(os.getenv("VECTOR_WRITER_MAX_RETRIES", 3))
+
+# SCHEMA RETRIEVER ("qdrant" atau "memory" untuk index skema in-process)
+SCHEMA_RETRIEVER_BACKEND = os.getenv("SCHEMA_RETRIEVER_BACKEND", "qdrant").lower()
+SCHEMA_RETRIEVER_K = int(os.getenv("SCHEMA_RETRIEVER_K", 4))
+SCHEMA_INDEX_DIR = Path(os.getenv("SCHEMA_INDEX_DIR", Path(__file__).resolve().parent.parent / ".cache" / "schema_index"))
+
+# EMBEDDING CACHE (LRU vektor query bersama untuk semua retriever)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 4096))
+
+# EMBEDDING MICRO-BATCHING (gabungkan embed query yang datang bersamaan)
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", 2))
+
+# RESULT SET CACHE (hasil SELECT per SQL kanonik, invalidasi per tabel)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", 8 * 1024 * 1024))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 6 * 3600))
+RESULT_CACHE_POLL_INTERVAL_SECONDS = float(os.getenv("RESULT_CACHE_POLL_INTERVAL_SECONDS", 60))
+
+# BATAS HASIL KUERI (eksekusi streaming dengan server-side cursor)
+SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", 1000))
+SQL_RESULT_MAX_BYTES = int(os.getenv("SQL_RESULT_MAX_BYTES", 4 * 1024 * 1024))
+SQL_RESULT_COUNT_LIMIT = int(os.getenv("SQL_RESULT_COUNT_LIMIT", 100000))
+SQL_RESULT_PARTITION_SIZE = int(os.getenv("SQL_RESULT_PARTITION_SIZE", 500))
+
+# RINGKASAN HASIL UNTUK REASONING (profil pandas dalam budget token)
+REASONING_SUMMARY_TOKEN_BUDGET = int(os.getenv("REASONING_SUMMARY_TOKEN_BUDGET", 700))
+REASONING_SUMMARY_SAMPLE_ROWS = int(os.getenv("REASONING_SUMMARY_SAMPLE_ROWS", 5))
+REASONING_SUMMARY_TOP_N = int(os.getenv("REASONING_SUMMARY_TOP_N", 5))
+REASONING_PRIMARY_METRICS = [m.strip() for m in os.getenv("REASONING_PRIMARY_METRICS", "Jumlah,Realisasi,Sisa").split(",") if m.strip()]
+
+# TEMPLATE JAWABAN (lewati LLM reasoning untuk hasil sederhana)
+ANSWER_TEMPLATES_ENABLED = os.getenv("ANSWER_TEMPLATES_ENABLED", "true").lower() == "true"
+ANSWER_TEMPLATE_MAX_ROWS = int(os.getenv("ANSWER_TEMPLATE_MAX_ROWS", 10))
+
+# COST GUARD (EXPLAIN sebelum eksekusi SQL hasil LLM: "off", "reject", atau "rewrite")
+COST_GUARD_MODE = os.getenv("COST_GUARD_MODE", "rewrite").lower()
+COST_GUARD_MAX_ROWS_EXAMINED = int(os.getenv("COST_GUARD_MAX_ROWS_EXAMINED", 1000000))
+COST_GUARD_MAX_UNINDEXED_ROWS = int(os.getenv("COST_GUARD_MAX_UNINDEXED_ROWS", 200000))
+# LIMIT terluar maksimum saat rewrite; +1 agar hasil yang terpotong tetap terdeteksi (sama dengan SQL_DEFAULT_LIMIT)
+COST_GUARD_REWRITE_LIMIT = int(os.getenv("COST_GUARD_REWRITE_LIMIT", SQL_RESULT_MAX_ROWS + 1))
+COST_GUARD_MAX_EXECUTION_MS = int(os.getenv("COST_GUARD_MAX_EXECUTION_MS", 5000))
+
+# VALIDATOR SQL (LIMIT otomatis di level terluar + cache hasil parse)
+# Satu baris di atas SQL_RESULT_MAX_ROWS agar executor tetap bisa mendeteksi hasil yang terpotong
+SQL_DEFAULT_LIMIT = int(os.getenv("SQL_DEFAULT_LIMIT", SQL_RESULT_MAX_ROWS + 1))
+SQL_VALIDATOR_CACHE_SIZE = int(os.getenv("SQL_VALIDATOR_CACHE_SIZE", 1024))
+
+# SCHEMA CATALOG
+# Cek tabel/kolom SQL hasil LLM terhadap spec di data/*.yml sebelum eksekusi
+SCHEMA_CATALOG_ENABLED = os.getenv("SCHEMA_CATALOG_ENABLED", "true").lower() == "true"
+
+# CHAT HISTORY
+# Jendela history untuk prompt percakapan (4 = 2 pasang tanya-jawab), dipush-down ke SQL LIMIT
+CHAT_HISTORY_WINDOW_MESSAGES = int(os.getenv("CHAT_HISTORY_WINDOW_MESSAGES", 4))
+# Cache write-through N pesan terakhir per room (LRU berdasarkan jumlah room)
+CHAT_HISTORY_CACHE_ENABLED = os.getenv("CHAT_HISTORY_CACHE_ENABLED", "true").lower() == "true"
+CHAT_HISTORY_CACHE_MAX_ROOMS = int(os.getenv("CHAT_HISTORY_CACHE_MAX_ROOMS", 2048))
+CHAT_HISTORY_CACHE_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_CACHE_MAX_MESSAGES", 20))
+# Cocokkan message_id terakhir room di DB sebelum memakai cache (wajib jika ada lebih dari satu worker);
+# false hanya aman untuk deployment satu worker
+CHAT_HISTORY_CACHE_VALIDATE = os.getenv("CHAT_HISTORY_CACHE_VALIDATE", "true").lower() == "true"
+
+# PERSISTENSI
+# per_write: commit + refresh setiap INSERT (perilaku lama)
+# unit_of_work: pesan user di-commit segera; pesan AI + llm_runs di-commit sekali di akhir request
+# (tidak ada transaksi yang terbuka selama panggilan LLM)
+PERSISTENCE_MODE = os.getenv("PERSISTENCE_MODE", "unit_of_work").lower()
+
+# TELEMETRY WRITER (bulk insert llm_runs/chat_messages di luar jalur request)
+TELEMETRY_WRITER_ENABLED = os.getenv("TELEMETRY_WRITER_ENABLED", "true").lower() == "true"
+TELEMETRY_WRITER_MAX_QUEUE_SIZE = int(os.getenv("TELEMETRY_WRITER_MAX_QUEUE_SIZE", 10000))
+TELEMETRY_WRITER_BATCH_SIZE = int(os.getenv("TELEMETRY_WRITER_BATCH_SIZE", 100))
+TELEMETRY_WRITER_FLUSH_INTERVAL_SECONDS = float(os.getenv("TELEMETRY_WRITER_FLUSH_INTERVAL_SECONDS", 1.0))
+TELEMETRY_WRITER_MAX_RETRIES = int(os.getenv("TELEMETRY_WRITER_MAX_RETRIES", 3))
+
+# METRICS (endpoint /metrics format teks Prometheus)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Batas jumlah kombinasi label per metrik; kelebihannya digabung ke seri "__other__"
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", 500))
+
+# TRACING (span perf_counter_ns per request, lihat /api/v1/admin/traces/slowest)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Daftar exporter dipisah koma: memory (ring buffer), jsonl (file JSON lines)
+TRACING_EXPORTERS = os.getenv("TRACING_EXPORTERS", "memory,jsonl")
+TRACING_RING_BUFFER_SIZE = int(os.getenv("TRACING_RING_BUFFER_SIZE", 500))
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "logs/traces.jsonl")
+TRACING_MAX_SPANS_PER_TRACE = int(os.getenv("TRACING_MAX_SPANS_PER_TRACE", 256))
+
+# LOGGING (QueueHandler: format + tulis stdout di thread terpisah dari event loop)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# json: satu record JSON per baris (dengan request_id); text: format baris biasa
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Baris bervolume tinggi (cache hit, latency per tahap) hanya ditulis 1 dari setiap N
+LOG_SAMPLE_EVERY_N = int(os.getenv("LOG_SAMPLE_EVERY_N", 10))
+
+# FAKE LLM LOKAL (model "local/...", mis. "local/fake?latency_ms=50&failure_rate=0.05")
+# Nama model datang dari request: provider lokal hanya untuk benchmark/CI, default nonaktif
+LOCAL_LLM_ENABLED = os.getenv("LOCAL_LLM_ENABLED", "false").lower() == "true"
+# Slot registry terpisah untuk client lokal agar tidak menggusur client provider asli
+LOCAL_LLM_MAX_CLIENTS = int(os.getenv("LOCAL_LLM_MAX_CLIENTS", 8))
+# Batas atas parameter yang bisa dipilih lewat nama model
+FAKE_LLM_MAX_LATENCY_MS = float(os.getenv("FAKE_LLM_MAX_LATENCY_MS", 10000))
+FAKE_LLM_MAX_STREAM_TOKEN_MS = float(os.getenv("FAKE_LLM_MAX_STREAM_TOKEN_MS", 200))
+# Distribusi latency: fixed, normal, lognormal, uniform (mean/jitter dalam ms)
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 400))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", 100))
+FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "normal")
+# Jeda antar token saat streaming (setelah latency token pertama)
+FAKE_LLM_STREAM_TOKEN_MS = float(os.getenv("FAKE_LLM_STREAM_TOKEN_MS", 15))
+# Kegagalan acak: error (exception provider), timeout, invalid_sql (SQL ditolak validator)
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", 0.0))
+FAKE_LLM_FAILURE_MODE = os.getenv("FAKE_LLM_FAILURE_MODE", "error")
+# Seed RNG latency/kegagalan agar run dapat diulang; kosong = acak
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import config
+from .embedding_provider import get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Kata tanya/penghubung yang tidak membedakan isi jawaban; kata lain dianggap entitas
+_STOPWORDS = frozenset(
+    """
+    ada adakah adalah agar akan anda apa apakah atau bagaimana banyak beberapa berapa berapakah
+    beri berikan bisa buat cari coba dalam dan dari dengan di itu ini jelaskan ke kah kami
+    kita mana mohon nya oleh pada saja saya sebutkan secara semua siapa tampilkan tentang
+    tersebut tolong tunjukkan untuk yaitu yang
+    """.split()
+)
+
+# Cakupan entry: endpoint dengan reasoning dan endpoint SQL + data tidak saling menimpa
+ANSWER_SCOPE_REASONING = "reasoning"
+ANSWER_SCOPE_DATA = "data"
+
+def normalize_question(question: str) -> str:
+    """Normalisasi pertanyaan: huruf kecil, tanpa tanda baca, spasi tunggal."""
+    text = _NON_WORD.sub(" ", question.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+def extract_entities(question: str) -> Tuple[str, ...]:
+    """
+    Token yang harus sama persis agar pertanyaan mirip boleh berbagi jawaban: semua kata
+    pertanyaan ternormalisasi selain kata tanya/penghubung. Tidak bergantung pada huruf
+    kapital, jadi "dinas pendidikan" dan "dinas kesehatan" tetap dibedakan.
+    """
+    return tuple(sorted({word for word in normalize_question(question).split() if word not in _STOPWORDS}))
+
+def schema_fingerprint(schema_dir: Path = config.SCHEMA_DATA_DIR) -> str:
+    """
+    Sidik jari murah dari file YAML skema (nama, ukuran, mtime).
+    Berubah setiap kali salah satu file di `data/` diubah.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(schema_dir.glob("*.yml")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+@dataclass
+class CacheKey:
+    """Kunci cache: cakupan endpoint, pertanyaan ternormalisasi, angka, entitas, dan embedding-nya."""
+    normalized: str
+    numbers: Tuple[str, ...]
+    vector: np.ndarray
+    entities: Tuple[str, ...] = ()
+    scope: str = ANSWER_SCOPE_REASONING
+
+    @property
+    def entry_id(self) -> str:
+        return f"{self.scope}:{self.normalized}"
+
+    def compatible_with(self, other: "CacheKey") -> bool:
+        """Syarat pencocokan semantik: cakupan, angka, dan entitas sama persis."""
+        return self.scope == other.scope and self.numbers == other.numbers and self.entities == other.entities
+
+@dataclass
+class CachedAnswer:
+    sql: str
+    dynamic_context: str
+    data_raw: Optional[List[Dict[str, Any]]] = None
+    data_fingerprint: Optional[str] = None
+    reasoning: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+def fingerprint_data(data_raw: List[Dict[str, Any]]) -> str:
+    """Hash hasil kueri untuk mendeteksi apakah data berubah sejak reasoning disimpan."""
+    return hashlib.sha1(repr(data_raw).encode()).hexdigest()
+
+class SemanticAnswerCache:
+    """
+    Cache jawaban NL2SQL dengan kunci pertanyaan ternormalisasi + embedding.
+
+    Pertanyaan yang identik setelah normalisasi langsung cocok; pertanyaan mirip
+    cocok jika cosine similarity >= threshold DAN angka serta token entitasnya sama
+    persis (supaya "pagu 2024" tidak memakai jawaban "pagu 2023", dan "dinas pendidikan"
+    tidak memakai jawaban "dinas kesehatan"). Entry dipisah per cakupan endpoint.
+    Entry kedaluwarsa berdasarkan TTL, dibuang secara LRU, dan seluruh cache
+    dikosongkan saat file skema di `data/` berubah (dicek per `schema_check_seconds`).
+    """
+    def __init__(
+        self,
+        max_entries: int = config.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = config.ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        store_data: bool = config.ANSWER_CACHE_STORE_DATA,
+        schema_check_seconds: float = config.ANSWER_CACHE_SCHEMA_CHECK_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.store_data = store_data
+        self._entries: "OrderedDict[str, Tuple[CacheKey, CachedAnswer]]" = OrderedDict()
+        self.schema_check_seconds = schema_check_seconds
+        self._schema_fingerprint = schema_fingerprint()
+        self._schema_checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def build_key(self, question: str, scope: str = ANSWER_SCOPE_REASONING) -> CacheKey:
+        """
+        Bangun kunci cache; embedding dihitung di executor karena CPU-bound. Teks yang
+        di-embed sama dengan query retriever skema, jadi vektornya dipakai ulang dari LRU embedding.
+        """
+        normalized = normalize_question(question)
+        vector = await get_embedding_model().aembed_query(question)
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        if norm > 0:
+            array = array / norm
+        return CacheKey(
+            normalized=normalized,
+            numbers=tuple(_NUMBER.findall(normalized)),
+            vector=array,
+            entities=extract_entities(question),
+            scope=scope,
+        )
+
+    def _check_schema(self) -> None:
+        now = time.monotonic()
+        if now - self._schema_checked_at < self.schema_check_seconds:
+            return
+        self._schema_checked_at = now
+        current = schema_fingerprint()
+        if current != self._schema_fingerprint:
+            logger.info("Schema YAML berubah, mengosongkan answer cache")
+            self.invalidate()
+            self._schema_fingerprint = current
+
+    def _is_expired(self, answer: CachedAnswer) -> bool:
+        return time.monotonic() - answer.created_at > self.ttl_seconds
+
+    def get(self, key: CacheKey) -> Optional[CachedAnswer]:
+        self._check_schema()
+
+        match_id = key.entry_id if key.entry_id in self._entries else None
+        if match_id is None:
+            best_score = self.similarity_threshold
+            for entry_id, (entry_key, _) in self._entries.items():
+                if not entry_key.compatible_with(key):
+                    continue
+                score = float(np.dot(entry_key.vector, key.vector))
+                if score >= best_score:
+                    best_score, match_id = score, entry_id
+
+        if match_id is not None:
+            _, answer = self._entries[match_id]
+            if self._is_expired(answer):
+                del self._entries[match_id]
+            else:
+                self._entries.move_to_end(match_id)
+                self.hits += 1
+                return answer
+
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        key: CacheKey,
+        sql: str,
+        dynamic_context: str,
+        data_raw: List[Dict[str, Any]],
+        reasoning: Optional[str] = None,
+    ) -> None:
+        """Simpan SQL yang sudah tervalidasi (dan opsional data + reasoning)."""
+        answer = CachedAnswer(
+            sql=sql,
+            dynamic_context=dynamic_context,
+            data_raw=data_raw if self.store_data else None,
+            data_fingerprint=fingerprint_data(data_raw) if reasoning is not None else None,
+            reasoning=reasoning,
+        )
+        self._entries[key.entry_id] = (key, answer)
+        self._entries.move_to_end(key.entry_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "similarity_threshold": self.similarity_threshold,
+            "store_data": self.store_data,
+        }
+
+@lru_cache(maxsize=1)
+def get_answer_cache() -> SemanticAnswerCache:
+    """Mengembalikan answer cache SINGLETON untuk seluruh proses."""
+    logger.info("Creating Semantic Answer Cache")
+    return SemanticAnswerCache()
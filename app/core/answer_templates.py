@@ -0,0 +1,200 @@
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, FrozenSet, List, Optional
+
+from app import config
+from .db_executor import QueryResult
+from .schema_catalog import get_schema_catalog
+from .security.sql_validator import SQL_KEYWORDS
+
+# Jalur yang dipakai untuk menghasilkan reasoning (dicatat di llm_runs.reasoning_path)
+REASONING_PATH_LLM = "llm"
+REASONING_PATH_TEMPLATE = "template"
+REASONING_PATH_CACHE = "cache"
+REASONING_PATH_EMPTY = "empty"
+
+# Nama kolom/alias yang tidak pernah berformat Rupiah walaupun sumbernya kolom uang
+_NON_CURRENCY_KEYWORDS = ("persen", "percent", "pct", "rasio", "ratio", "proporsi", "capaian", "count")
+
+# Satu item SELECT berupa agregat kolom: `SUM(Jumlah) AS total_pagu`, `MAX(t.Realisasi)`
+_AGGREGATE_ITEM = re.compile(
+    r"""(?:\bSELECT\b|,)\s*(?:DISTINCT\s+)?
+    (?P<expr>(?:SUM|MIN|MAX|AVG)\s*\(\s*(?:DISTINCT\s+)?(?:`?\w+`?\.)?`?(?P<source>\w+)`?\s*\))
+    (?:\s+(?:AS\s+)?(?:`(?P<bq>[^`]+)`|'(?P<sq>[^']+)'|"(?P<dq>[^"]+)"|(?P<alias>\w+)))?
+    (?=\s*(?:,|\bFROM\b|$))""",
+    re.IGNORECASE | re.VERBOSE,
+)
+# Nama kolom hasil tanpa alias berupa agregat sederhana: `SUM(Jumlah)`, `COUNT(*)`, `AVG(t.Volume_1)`
+_AGGREGATE_COLUMN = re.compile(
+    r"^(?P<func>COUNT|SUM|MIN|MAX|AVG)\s*\(\s*(?P<distinct>DISTINCT\s+)?(?:`?\w+`?\.)?(?P<source>\*|1|`?\w+`?)\s*\)$",
+    re.IGNORECASE,
+)
+_AGGREGATE_LABELS = {"SUM": "total", "AVG": "rata-rata", "MIN": "nilai minimum", "MAX": "nilai maksimum"}
+_MAX_SINGLE_ROW_COLUMNS = 6
+
+def _group_thousands(digits: str) -> str:
+    return f"{int(digits):,}".replace(",", ".")
+
+def format_number(value: Any) -> str:
+    """Format angka gaya Indonesia: pemisah ribuan titik, desimal koma (maks. 2 digit)."""
+    number = Decimal(str(value))
+    sign = "-" if number < 0 else ""
+    quantized = abs(number).quantize(Decimal("0.01"))
+    integer, _, fraction = f"{quantized:f}".partition(".")
+    fraction = fraction.rstrip("0")
+    return f"{sign}{_group_thousands(integer)}" + (f",{fraction}" if fraction else "")
+
+def format_rupiah(value: Any) -> str:
+    """Contoh: 1234567.5 -> 'Rp1.234.567,50'."""
+    number = Decimal(str(value))
+    sign = "-" if number < 0 else ""
+    integer, _, fraction = f"{abs(number).quantize(Decimal('0.01')):f}".partition(".")
+    suffix = "" if fraction == "00" else f",{fraction}"
+    return f"{sign}Rp{_group_thousands(integer)}{suffix}"
+
+def _humanize(column: str) -> Optional[str]:
+    """
+    Label kolom untuk kalimat jawaban. Agregat tanpa alias diterjemahkan (`COUNT(*)` ->
+    "jumlah data", `SUM(Jumlah)` -> "total jumlah"); ekspresi lain tanpa alias -> None.
+    """
+    match = _AGGREGATE_COLUMN.match(column.strip())
+    if match is not None:
+        source = match.group("source").strip("`").replace("_", " ").lower()
+        func = match.group("func").upper()
+        if func == "COUNT":
+            if source in ("*", "1"):
+                return "jumlah data"
+            return f"jumlah {source} unik" if match.group("distinct") else f"jumlah {source}"
+        return f"{_AGGREGATE_LABELS[func]} {source}"
+    if "(" in column:
+        return None
+    return column.replace("_", " ").strip().lower()
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+def money_result_columns(sql: Optional[str]) -> FrozenSet[str]:
+    """
+    Nama kolom hasil (casefold) yang berasal dari agregat kolom uang di SQL,
+    mis. `SUM(Jumlah) AS total_pagu` -> {"total_pagu"}; tanpa alias, nama kolomnya ekspresi itu sendiri.
+    """
+    if not sql:
+        return frozenset()
+    catalog = get_schema_catalog()
+    names = set()
+    for match in _AGGREGATE_ITEM.finditer(sql):
+        if not catalog.is_money_column(match.group("source")):
+            continue
+        alias = match.group("bq") or match.group("sq") or match.group("dq") or match.group("alias")
+        if alias is not None and alias.upper() in SQL_KEYWORDS:
+            alias = None
+        names.add((alias or match.group("expr")).casefold())
+    return frozenset(names)
+
+def _is_currency(column: str, value: Any, money: FrozenSet[str]) -> bool:
+    # Hanya kolom uang dari skema (langsung atau lewat agregat); selain itu angka biasa
+    if not isinstance(value, (Decimal, float)):
+        return False
+    name = column.casefold()
+    if any(keyword in name for keyword in _NON_CURRENCY_KEYWORDS):
+        return False
+    return name in money or get_schema_catalog().is_money_column(name)
+
+def _format_value(column: str, value: Any, money: FrozenSet[str] = frozenset()) -> str:
+    if value is None:
+        return "tidak tercatat"
+    if _is_currency(column, value, money):
+        return format_rupiah(value)
+    if _is_number(value):
+        # Kolom tahun tidak boleh diberi pemisah ribuan
+        return str(value) if column.casefold().startswith("tahun") else format_number(value)
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d-%m-%Y")
+    return str(value).strip()
+
+def _join(parts: List[str]) -> str:
+    if len(parts) <= 2:
+        return " dan ".join(parts)
+    return ", ".join(parts[:-1]) + ", dan " + parts[-1]
+
+def _scalar_answer(column: str, value: Any, money: FrozenSet[str]) -> str:
+    label = _humanize(column)
+    if value is None:
+        return f"Berdasarkan data yang tersedia, tidak ada nilai {label} yang tercatat untuk kriteria tersebut."
+    if _is_currency(column, value, money):
+        return f"Berdasarkan data yang tersedia, {label} tercatat sebesar {format_rupiah(value)}."
+    if _is_number(value):
+        return f"Berdasarkan data yang tersedia, {label} tercatat sebanyak {_format_value(column, value)}."
+    return f"Berdasarkan data yang tersedia, {label} adalah {_format_value(column, value)}."
+
+def _single_row_answer(row: dict, money: FrozenSet[str]) -> str:
+    parts = [f"{_humanize(column)} {_format_value(column, value, money)}" for column, value in row.items()]
+    return f"Berdasarkan data yang tersedia, diperoleh satu hasil dengan {_join(parts)}."
+
+def _ranked_answer(label_column: str, metric_column: str, rows: List[dict], money: FrozenSet[str]) -> str:
+    metric = _humanize(metric_column)
+    entity = _humanize(label_column)
+    values = [row[metric_column] for row in rows]
+    items = [f"{row[label_column]} ({_format_value(metric_column, row[metric_column], money)})" for row in rows]
+
+    if values == sorted(values, reverse=True):
+        text = (
+            f"Berdasarkan data yang tersedia, terdapat {len(rows)} {entity} dalam hasil. "
+            f"{rows[0][label_column]} memiliki {metric} tertinggi sebesar "
+            f"{_format_value(metric_column, values[0], money)}, diikuti oleh {_join(items[1:])}."
+        )
+    elif values == sorted(values):
+        text = (
+            f"Berdasarkan data yang tersedia, terdapat {len(rows)} {entity} dalam hasil. "
+            f"{rows[0][label_column]} memiliki {metric} terendah sebesar "
+            f"{_format_value(metric_column, values[0], money)}, diikuti oleh {_join(items[1:])}."
+        )
+    else:
+        text = f"Berdasarkan data yang tersedia, rincian {metric} per {entity} adalah {_join(items)}."
+
+    total = sum(Decimal(str(value)) for value in values)
+    # Jaga tipe asli: SUM Decimal tetap Decimal, hitungan int tetap bilangan bulat
+    total_value = total if isinstance(values[0], (Decimal, float)) else int(total)
+    return f"{text} Jika dijumlahkan, nilai keseluruhannya mencapai {_format_value(metric_column, total_value, money)}."
+
+def _is_label_column(column: str, rows: List[dict]) -> bool:
+    """Kolom label: teks tanpa nilai kosong (kolom tahun numerik juga boleh)."""
+    values = [row[column] for row in rows]
+    if any(value is None for value in values):
+        return False
+    return column.casefold().startswith("tahun") or not any(_is_number(value) for value in values)
+
+def render_template_answer(
+    query_result: QueryResult,
+    max_rows: int = config.ANSWER_TEMPLATE_MAX_ROWS,
+    sql: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Jawaban deterministik untuk bentuk hasil sederhana, tanpa panggilan LLM:
+    satu nilai skalar, satu baris, atau daftar berperingkat kecil (label + angka).
+    `sql` dipakai untuk mengenali alias agregat kolom uang (format Rupiah).
+    Mengembalikan None jika hasil terlalu kompleks sehingga perlu REASONING_PROMPT,
+    termasuk kolom ekspresi tanpa alias yang tidak bisa dijadikan label kalimat.
+    """
+    rows = query_result.rows
+    if not rows or query_result.truncated:
+        return None
+    columns = query_result.columns or list(rows[0].keys())
+    if any(_humanize(column) is None for column in columns):
+        return None
+    money = money_result_columns(sql)
+
+    if len(rows) == 1:
+        row = rows[0]
+        if len(columns) == 1:
+            return _scalar_answer(columns[0], row[columns[0]], money)
+        if len(columns) <= _MAX_SINGLE_ROW_COLUMNS:
+            return _single_row_answer(row, money)
+        return None
+
+    if len(rows) <= max_rows and len(columns) == 2:
+        label_column, metric_column = columns
+        if _is_label_column(label_column, rows) and all(_is_number(row[metric_column]) for row in rows):
+            return _ranked_answer(label_column, metric_column, rows, money)
+    return None
@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from app import config
+
+def _message_id(message: BaseMessage) -> Optional[int]:
+    return message.additional_kwargs.get("message_id")
+
+@dataclass
+class _RoomHistory:
+    messages: Deque[BaseMessage]
+    # True jika deque berisi SELURUH pesan room (room baru/pendek), sehingga jendela
+    # yang lebih besar dari isi deque tetap bisa dijawab tanpa SELECT
+    complete: bool = False
+    # message_id pesan terakhir di deque, dicocokkan dengan DB oleh `get`
+    latest_id: Optional[int] = None
+
+class ChatHistoryCache:
+    """
+    Cache write-through N pesan terakhir per `room_id`, dibatasi jumlah room (LRU).
+
+    Diisi saat history dimuat dari DB dan diperbarui oleh `add_message`, sehingga
+    giliran berurutan di room yang sama cukup memakai cache. Cache bersifat per
+    proses: jika `get` diberi `latest_message_id` dari DB dan nilainya berbeda dari
+    pesan terakhir di cache (room ditulis worker lain), entri room dibuang dan
+    history dimuat ulang.
+    """
+    def __init__(
+        self,
+        max_rooms: int = config.CHAT_HISTORY_CACHE_MAX_ROOMS,
+        max_messages: int = config.CHAT_HISTORY_CACHE_MAX_MESSAGES,
+    ):
+        self.max_rooms = max_rooms
+        self.max_messages = max_messages
+        self._rooms: "OrderedDict[int, _RoomHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def get(self, room_id: int, limit: int, latest_message_id: Optional[int] = None) -> Optional[List[BaseMessage]]:
+        """
+        `limit` pesan terakhir (lama ke baru), atau None jika cache tidak bisa menjawab.
+        `latest_message_id` (message_id terbaru room di DB) membuang entri yang basi.
+        """
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is not None and latest_message_id is not None and room.latest_id != latest_message_id:
+                del self._rooms[room_id]
+                self.stale += 1
+                room = None
+            if room is None or (len(room.messages) < limit and not room.complete):
+                self.misses += 1
+                return None
+            self._rooms.move_to_end(room_id)
+            self.hits += 1
+            messages = list(room.messages)
+        return messages[-limit:] if limit > 0 else []
+
+    def put(self, room_id: int, messages: List[BaseMessage], complete: bool):
+        """Simpan hasil SELECT history; `complete` jika DB mengembalikan kurang dari limit."""
+        with self._lock:
+            room = _RoomHistory(
+                messages=deque(messages[-self.max_messages:], maxlen=self.max_messages),
+                complete=complete and len(messages) <= self.max_messages,
+                latest_id=_message_id(messages[-1]) if messages else None,
+            )
+            self._rooms[room_id] = room
+            self._rooms.move_to_end(room_id)
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+                self.evictions += 1
+
+    def append(self, room_id: int, message: BaseMessage):
+        """
+        Write-through setelah pesan tersimpan di DB. Room yang belum di-cache diabaikan,
+        begitu juga pesan yang sudah ikut termuat dari DB (message_id tidak lebih baru).
+        """
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return
+            message_id = _message_id(message)
+            if message_id is None:
+                # Tanpa ID urutan tidak bisa divalidasi; muat ulang dari DB berikutnya
+                del self._rooms[room_id]
+                return
+            if room.latest_id is not None and message_id <= room.latest_id:
+                return
+            room.latest_id = message_id
+            if len(room.messages) == room.messages.maxlen:
+                # Pesan tertua tergusur; cache tidak lagi memuat seluruh room
+                room.complete = False
+            room.messages.append(message)
+            self._rooms.move_to_end(room_id)
+            self.appends += 1
+
+    def invalidate(self, room_id: int):
+        with self._lock:
+            self._rooms.pop(room_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "max_rooms": self.max_rooms,
+                "max_messages": self.max_messages,
+                "hits": self.hits,
+                "misses": self.misses,
+                "appends": self.appends,
+                "evictions": self.evictions,
+                "stale": self.stale,
+            }
+
+@lru_cache(maxsize=1)
+def get_chat_history_cache() -> ChatHistoryCache:
+    """Mengembalikan cache history chat SINGLETON (dibagi semua request di proses ini)."""
+    return ChatHistoryCache()
@@ -0,0 +1,222 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app import config
+from .security.sql_validator import outer_select_end
+
+logger = logging.getLogger(__name__)
+
+# Aksi guard yang dicatat di llm_runs.cost_guard_action
+COST_GUARD_ALLOW = "allow"
+COST_GUARD_REJECT = "reject"
+COST_GUARD_REWRITE = "rewrite"
+
+COST_GUARD_MODES = ("off", COST_GUARD_REJECT, COST_GUARD_REWRITE)
+
+# LIMIT terluar di akhir kueri: `LIMIT n`, `LIMIT offset, n`, atau `LIMIT n OFFSET m`
+_TRAILING_LIMIT = re.compile(
+    r"\blimit\s+(?:(?P<offset>\d+)\s*,\s*)?(?P<count>\d+)(?P<tail>\s+offset\s+\d+)?\s*$", re.IGNORECASE
+)
+_SQLITE_PLAN_TABLE = re.compile(r"^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\w+)", re.IGNORECASE)
+_MYSQL_INDEXED_ACCESS = {"system", "const", "eq_ref", "ref", "ref_or_null", "range", "index_merge", "unique_subquery", "index_subquery", "fulltext"}
+
+@dataclass
+class QueryCostEstimate:
+    """Perkiraan biaya kueri dari EXPLAIN."""
+    rows_examined: int
+    uses_index: bool
+    full_scan_tables: List[str] = field(default_factory=list)
+    plan: List[Dict[str, Any]] = field(default_factory=list)
+
+class QueryCostExceededError(ValueError):
+    """Kueri ditolak karena perkiraan biayanya melewati batas (dipetakan ke HTTP 400)."""
+    def __init__(self, estimate: QueryCostEstimate, limit: int):
+        self.estimate = estimate
+        self.limit = limit
+        super().__init__(
+            f"Kueri terlalu berat untuk dieksekusi (perkiraan {estimate.rows_examined} baris diperiksa, "
+            f"batas {limit}). Persempit pertanyaan, misalnya dengan menyebut unit atau tahun anggaran."
+        )
+
+class ExplainSource(Protocol):
+    """Sumber EXPLAIN yang bisa diganti (MySQL, SQLite, atau stub untuk pengujian)."""
+    async def explain(self, connection: AsyncConnection, sql: str) -> QueryCostEstimate:
+        ...
+
+class MySQLExplainSource:
+    """
+    `EXPLAIN` MySQL/MariaDB. Perkiraan baris dalam satu SELECT (join nested-loop)
+    dikalikan, hasil antar SELECT (subquery/UNION) dijumlahkan.
+    """
+    async def explain(self, connection: AsyncConnection, sql: str) -> QueryCostEstimate:
+        result = await connection.execute(text(f"EXPLAIN {sql}"))
+        plan = [dict(row._mapping) for row in result]
+
+        per_select: Dict[Any, int] = {}
+        uses_index = True
+        full_scans = []
+        for step in plan:
+            if step.get("table") is None:
+                continue
+            # Perkiraan konservatif: perkalian `rows` setiap tabel dalam join yang sama
+            select_id = step.get("id")
+            per_select[select_id] = per_select.get(select_id, 1) * max(1, int(step.get("rows") or 1))
+            access_type = (step.get("type") or "").lower()
+            if access_type == "all":
+                full_scans.append(str(step["table"]))
+            if access_type not in _MYSQL_INDEXED_ACCESS:
+                uses_index = False
+        return QueryCostEstimate(
+            rows_examined=sum(per_select.values()),
+            uses_index=uses_index,
+            full_scan_tables=full_scans,
+            plan=plan,
+        )
+
+class SQLiteExplainSource:
+    """
+    `EXPLAIN QUERY PLAN` SQLite. SQLite tidak memberi perkiraan baris, jadi tabel
+    yang di-SCAN dihitung dengan COUNT(*) (cukup murah untuk DB lokal/pengujian).
+    """
+    async def explain(self, connection: AsyncConnection, sql: str) -> QueryCostEstimate:
+        result = await connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        plan = [dict(row._mapping) for row in result]
+
+        rows_examined = 0
+        uses_index = True
+        full_scans = []
+        for step in plan:
+            match = _SQLITE_PLAN_TABLE.match(str(step.get("detail", "")))
+            if match is None:
+                continue
+            operation, table = match.group(1).upper(), match.group(2)
+            if operation == "SCAN" and "USING" not in str(step["detail"]).upper():
+                uses_index = False
+                full_scans.append(table)
+                count = await connection.execute(text(f'SELECT COUNT(*) FROM "{table}"'))
+                rows_examined += int(count.scalar() or 0)
+            else:
+                rows_examined += 1
+        return QueryCostEstimate(
+            rows_examined=rows_examined,
+            uses_index=uses_index,
+            full_scan_tables=full_scans,
+            plan=plan,
+        )
+
+class StaticExplainSource:
+    """Stub EXPLAIN yang selalu mengembalikan perkiraan tetap (untuk pengujian/benchmark)."""
+    def __init__(self, estimate: QueryCostEstimate):
+        self.estimate = estimate
+
+    async def explain(self, connection: AsyncConnection, sql: str) -> QueryCostEstimate:
+        return self.estimate
+
+def explain_source_for(dialect_name: str) -> Optional[ExplainSource]:
+    """Pilih sumber EXPLAIN sesuai dialect engine; None berarti guard dilewati."""
+    if dialect_name in ("mysql", "mariadb"):
+        return MySQLExplainSource()
+    if dialect_name == "sqlite":
+        return SQLiteExplainSource()
+    return None
+
+@dataclass
+class CostGuardDecision:
+    action: str
+    sql: str
+    estimate: Optional[QueryCostEstimate] = None
+    limit: Optional[int] = None  # LIMIT yang dipasang/diperketat guard (hasil yang mencapainya terpotong)
+
+def clamp_limit(sql: str, limit: int) -> Tuple[str, Optional[int]]:
+    """
+    Pastikan LIMIT terluar tidak melebihi `limit`. Validator sudah menambahkan LIMIT
+    otomatis, jadi biasanya hanya LIMIT eksplisit yang terlalu besar yang diperketat.
+    Mengembalikan (SQL, limit yang dipasang guard atau None jika SQL tidak diubah).
+    """
+    sql = sql.strip().rstrip(";").strip()
+    match = _TRAILING_LIMIT.search(sql)
+    if match is None:
+        return f"{sql} LIMIT {limit}", limit
+    if int(match.group("count")) <= limit:
+        return sql, None
+    offset = f"{match.group('offset')}, " if match.group("offset") else ""
+    return f"{sql[:match.start()]}LIMIT {offset}{limit}{match.group('tail') or ''}", limit
+
+def add_max_execution_time(sql: str, max_execution_ms: int) -> str:
+    """Sisipkan optimizer hint MySQL `MAX_EXECUTION_TIME` setelah SELECT blok kueri utama (juga untuk WITH)."""
+    position = outer_select_end(sql)
+    if position is None:
+        return sql
+    return f"{sql[:position]} /*+ MAX_EXECUTION_TIME({max_execution_ms}) */{sql[position:]}"
+
+class QueryCostGuard:
+    """
+    Guard sebelum eksekusi: jalankan EXPLAIN, lalu izinkan, tolak
+    (`QueryCostExceededError`), atau tulis ulang kueri (perketat LIMIT terluar +
+    MAX_EXECUTION_TIME) jika perkiraan baris yang diperiksa melewati batas.
+    """
+    def __init__(
+        self,
+        mode: str = config.COST_GUARD_MODE,
+        max_rows_examined: int = config.COST_GUARD_MAX_ROWS_EXAMINED,
+        max_unindexed_rows: int = config.COST_GUARD_MAX_UNINDEXED_ROWS,
+        rewrite_limit: int = config.COST_GUARD_REWRITE_LIMIT,
+        max_execution_ms: int = config.COST_GUARD_MAX_EXECUTION_MS,
+        explain_source: Optional[ExplainSource] = None,
+    ):
+        if mode not in COST_GUARD_MODES:
+            raise ValueError(f"COST_GUARD_MODE tidak valid: {mode}. Pilihan: {', '.join(COST_GUARD_MODES)}.")
+        self.mode = mode
+        self.max_rows_examined = max_rows_examined
+        self.max_unindexed_rows = max_unindexed_rows
+        self.rewrite_limit = rewrite_limit
+        self.max_execution_ms = max_execution_ms
+        self.explain_source = explain_source
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _limit_for(self, estimate: QueryCostEstimate) -> Optional[int]:
+        """Batas yang dilanggar, atau None jika kueri masih wajar."""
+        if estimate.rows_examined > self.max_rows_examined:
+            return self.max_rows_examined
+        if not estimate.uses_index and estimate.rows_examined > self.max_unindexed_rows:
+            return self.max_unindexed_rows
+        return None
+
+    async def check(self, connection: AsyncConnection, sql: str) -> CostGuardDecision:
+        if not self.enabled:
+            return CostGuardDecision(action=COST_GUARD_ALLOW, sql=sql)
+        dialect_name = connection.dialect.name
+        source = self.explain_source or explain_source_for(dialect_name)
+        if source is None:
+            return CostGuardDecision(action=COST_GUARD_ALLOW, sql=sql)
+
+        estimate = await source.explain(connection, sql)
+        limit = self._limit_for(estimate)
+        if limit is None:
+            return CostGuardDecision(action=COST_GUARD_ALLOW, sql=sql, estimate=estimate)
+
+        logger.warning(
+            "Cost guard: ~%s baris diperiksa (index=%s, full scan=%s)",
+            estimate.rows_examined, "ya" if estimate.uses_index else "tidak", estimate.full_scan_tables,
+        )
+        if self.mode == COST_GUARD_REJECT:
+            raise QueryCostExceededError(estimate, limit)
+
+        rewritten, clamped = clamp_limit(sql, self.rewrite_limit)
+        if dialect_name in ("mysql", "mariadb"):
+            rewritten = add_max_execution_time(rewritten, self.max_execution_ms)
+        return CostGuardDecision(action=COST_GUARD_REWRITE, sql=rewritten, estimate=estimate, limit=clamped)
+
+@lru_cache(maxsize=1)
+def get_cost_guard() -> QueryCostGuard:
+    """Mengembalikan cost guard SINGLETON dengan konfigurasi dari env."""
+    return QueryCostGuard()
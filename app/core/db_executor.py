@@ -1,11 +1,122 @@
-from typing import List, Dict, Any
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Dict, Any, Optional
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from .. import config
 from ..adapters.db.database import engine # Import engine async kita
+from .result_cache import get_result_cache, estimate_row_bytes
+from .cost_guard import QueryCostGuard, get_cost_guard, COST_GUARD_REWRITE
+from .metrics import DB_POOL_WAIT
+from .security.sql_validator import injected_limit
 
-async def execute_select_query(query: str, db_engine: AsyncEngine = engine) -> List[Dict[str, Any]]:
-    print(f"Mengeksekusi query: {query}")
+logger = logging.getLogger(__name__)
+
+@dataclass
+class QueryResult:
+    """
+    Hasil eksekusi SELECT yang dibatasi.
+
+    `rows` hanya berisi baris yang muat di batas baris/byte; `row_count` adalah
+    total baris yang dihitung dari cursor (berhenti di batas hitung, lihat
+    `row_count_exact`).
+    """
+    rows: List[Dict[str, Any]]
+    columns: List[str]
+    row_count: int
+    truncated: bool = False
+    row_count_exact: bool = True
+    estimated_rows_examined: Optional[int] = None
+    cost_guard_action: Optional[str] = None
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "QueryResult":
+        """Bungkus hasil lengkap yang sudah ada di memori (mis. dari cache)."""
+        return cls(rows=rows, columns=list(rows[0].keys()) if rows else [], row_count=len(rows))
+
+@asynccontextmanager
+async def _connect(db_engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
+    """`db_engine.connect()` yang mencatat waktu tunggu checkout koneksi dari pool."""
+    start = time.perf_counter()
     async with db_engine.connect() as connection:
-        result_proxy = await connection.execute(text(query))
-        # Konversi hasil menjadi format List[Dict] yang ringan dan universal
-        return [dict(row._mapping) for row in result_proxy]
\ No newline at end of file
+        DB_POOL_WAIT.observe((time.perf_counter() - start) * 1000)
+        yield connection
+
+async def execute_select_query_stream(
+    query: str,
+    max_rows: int = config.SQL_RESULT_MAX_ROWS,
+    max_bytes: int = config.SQL_RESULT_MAX_BYTES,
+    count_limit: int = config.SQL_RESULT_COUNT_LIMIT,
+    db_engine: AsyncEngine = engine,
+    use_cache: bool = config.RESULT_CACHE_ENABLED,
+    cost_guard: Optional[QueryCostGuard] = None,
+) -> QueryResult:
+    """
+    Eksekusi SELECT lewat server-side cursor (`stream()`) tanpa memuat seluruh hasil.
+
+    Baris diambil per partisi; hanya baris pertama sampai `max_rows`/`max_bytes` yang
+    disimpan, sisanya hanya dihitung sampai `count_limit` agar jumlah total baris
+    tetap bisa dilaporkan. Hasil yang mencapai LIMIT otomatis validator juga dianggap
+    terpotong (jumlah baris tidak pasti). Hasil yang tidak terpotong ikut disimpan ke result cache.
+
+    Sebelum eksekusi, cost guard menjalankan EXPLAIN dan bisa menolak kueri
+    (`QueryCostExceededError`) atau menulis ulangnya dengan LIMIT/MAX_EXECUTION_TIME.
+    """
+    use_cache = use_cache and db_engine is engine
+    if use_cache:
+        cached_rows = get_result_cache().get(query)
+        if cached_rows is not None:
+            logger.debug("Result cache hit: %s", query, extra={"sampled": True})
+            return QueryResult.from_rows(cached_rows)
+        table_versions = get_result_cache().table_versions(query)
+
+    logger.debug("Mengeksekusi query (stream): %s", query)
+    rows: List[Dict[str, Any]] = []
+    row_count = 0
+    size_bytes = 0
+    truncated = False
+    row_count_exact = True
+    async with _connect(db_engine) as connection:
+        decision = await (cost_guard or get_cost_guard()).check(connection, query)
+        result = await connection.stream(text(decision.sql))
+        columns = list(result.keys())
+        try:
+            async for partition in result.partitions(config.SQL_RESULT_PARTITION_SIZE):
+                for row in partition:
+                    row_count += 1
+                    if truncated:
+                        continue
+                    row_dict = dict(row._mapping)
+                    row_bytes = estimate_row_bytes(row_dict)
+                    if len(rows) >= max_rows or size_bytes + row_bytes > max_bytes:
+                        truncated = True
+                        continue
+                    rows.append(row_dict)
+                    size_bytes += row_bytes
+                if row_count >= count_limit:
+                    row_count_exact = False
+                    break
+        finally:
+            await result.close()
+
+    # LIMIT otomatis (validator) atau LIMIT dari cost guard tercapai: baris berikutnya tidak pernah dibaca
+    auto_limit = decision.limit if decision.limit is not None else injected_limit(query)
+    if auto_limit is not None and row_count >= auto_limit:
+        truncated, row_count_exact = True, False
+
+    if truncated:
+        logger.info("Hasil kueri dipotong: %d dari %d%s baris", len(rows), row_count, "" if row_count_exact else "+")
+    elif use_cache and decision.action != COST_GUARD_REWRITE:
+        # Hasil kueri yang ditulis ulang (ber-LIMIT) tidak mewakili SQL aslinya
+        get_result_cache().put(query, rows, versions=table_versions)
+    return QueryResult(
+        rows=rows,
+        columns=columns,
+        row_count=row_count,
+        truncated=truncated,
+        row_count_exact=row_count_exact,
+        estimated_rows_examined=decision.estimate.rows_examined if decision.estimate else None,
+        cost_guard_action=decision.action if decision.estimate else None,
+    )
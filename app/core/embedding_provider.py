@@ -1,15 +1,235 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from app import config
 
+logger = logging.getLogger(__name__)
+
+def normalize_embedding_key(text: str) -> str:
+    """Kunci cache: spasi dirapikan dan huruf kecil (model embedding yang dipakai uncased)."""
+    return " ".join(text.split()).casefold()
+
+class EmbeddingBatcher:
+    """
+    Menggabungkan panggilan embed yang datang bersamaan menjadi satu forward pass.
+
+    Setiap `submit` masuk ke antrean; thread dispatcher mengumpulkan teks selama
+    paling lama `max_wait_seconds` (atau sampai `max_batch_size`), lalu menjalankan
+    `embed_documents` satu kali di executor khusus yang ukurannya dibatasi.
+    Dispatcher baru mengambil batch berikutnya jika ada worker yang kosong, sehingga
+    saat beban tinggi antrean otomatis terkumpul menjadi batch yang lebih besar.
+    """
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = config.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_seconds: float = config.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+        max_workers: int = config.EMBEDDING_EXECUTOR_WORKERS,
+    ):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.max_workers = max_workers
+        self._queue: "queue.SimpleQueue[Tuple[str, Future]]" = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding")
+        self._free_workers = threading.Semaphore(max_workers)
+        self._dispatcher: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self) -> None:
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop, name="embedding-dispatcher", daemon=True
+                )
+                self._dispatcher.start()
+
+    def submit(self, text: str) -> "Future[List[float]]":
+        """Antrekan satu teks; hasilnya dikirim lewat Future (bisa di-await via asyncio.wrap_future)."""
+        self._ensure_started()
+        future: "Future[List[float]]" = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            self._free_workers.acquire()
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Ambil yang sudah menunggu tanpa blok, sisanya tunggu sampai deadline
+                    item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        try:
+            pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                return
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(pending)
+                self.largest_batch = max(self.largest_batch, len(pending))
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _ in pending])
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                return
+            for (_, future), vector in zip(pending, vectors):
+                future.set_result(vector)
+        finally:
+            self._free_workers.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+            "max_workers": self.max_workers,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper LRU di atas model embedding bersama.
+
+    Vektor disimpan ringkas sebagai array float32 dengan kunci teks ternormalisasi.
+    Berlaku transparan untuk `embed_query` maupun `embed_documents`; hanya teks yang
+    belum ada di cache yang diteruskan ke model (dalam satu batch).
+    Aman dipakai dari beberapa thread executor sekaligus. Jika `batcher` diberikan,
+    cache miss pada query digabung dengan query lain yang sedang berjalan.
+    """
+    def __init__(
+        self,
+        base: Embeddings,
+        max_entries: int = config.EMBEDDING_CACHE_MAX_ENTRIES,
+        batcher: Optional[EmbeddingBatcher] = None,
+    ):
+        self.base = base
+        self.batcher = batcher
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        array = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes + len(key)
+            self._cache[key] = array
+            self._bytes += array.nbytes + len(key)
+            while len(self._cache) > self.max_entries:
+                evicted_key, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted.nbytes + len(evicted_key)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_embedding_key(text)
+        cached = self._get(key)
+        if cached is not None:
+            return cached.tolist()
+        if self.batcher is not None:
+            vector = self.batcher.submit(text).result()
+        else:
+            vector = self.base.embed_query(text)
+        self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = normalize_embedding_key(text)
+            cached = self._get(key)
+            if cached is not None:
+                results[i] = cached.tolist()
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            # Satu forward pass untuk semua teks unik yang belum ada di cache
+            keys = list(missing)
+            vectors = self.base.embed_documents([texts[missing[key][0]] for key in keys])
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector)
+                for i in missing[key]:
+                    results[i] = vector
+        return results  # type: ignore[return-value]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Cache hit dilayani langsung tanpa lompatan ke executor
+        key = normalize_embedding_key(text)
+        cached = self._get(key)
+        if cached is not None:
+            return cached.tolist()
+        if self.batcher is not None:
+            vector = await asyncio.wrap_future(self.batcher.submit(text))
+        else:
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(None, self.base.embed_query, text)
+        self._put(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_bytes": self._bytes,
+                "batcher": self.batcher.stats() if self.batcher is not None else None,
+            }
+
 @lru_cache(maxsize=1)
-def get_embedding_model() -> HuggingFaceEmbeddings:
-    print(f"✅ Loading embedding model: {config.EMBEDDING_MODEL_NAME}...")
+def get_embedding_model() -> CachedEmbeddings:
+    logger.info("Loading embedding model: %s", config.EMBEDDING_MODEL_NAME)
+    # Diimpor saat model dimuat (sentence-transformers/torch berat dan tidak perlu untuk modul lain)
+    from langchain_huggingface import HuggingFaceEmbeddings
 
     embeddings = HuggingFaceEmbeddings(
         model_name=config.EMBEDDING_MODEL_NAME,
         model_kwargs={'device': 'cpu'}
     )
     
-    print("✅ Embedding model loaded into memory.")
-    return embeddings
\ No newline at end of file
+    logger.info("Embedding model loaded into memory")
+    return CachedEmbeddings(embeddings, batcher=EmbeddingBatcher(embeddings))
@@ -0,0 +1,110 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import orjson
+
+from app import config
+from .tracing import current_request_id
+
+# Atribut bawaan LogRecord; atribut lain (dari `extra=`) ikut ditulis sebagai field JSON
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sampled"}
+
+class RequestIdFilter(logging.Filter):
+    """
+    Tempelkan request id dari trace aktif. Dipasang di QueueHandler (thread pemanggil),
+    karena ContextVar tidak terlihat lagi di thread listener.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Sampling untuk baris bervolume tinggi: record dengan `extra={"sampled": True}`
+    hanya diteruskan 1 dari setiap N per template pesan. WARNING ke atas tidak disampling.
+    """
+    def __init__(self, every_n: int = config.LOG_SAMPLE_EVERY_N):
+        super().__init__()
+        self.every_n = max(1, every_n)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every_n == 1 or not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        key = f"{record.name}:{record.msg}"
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        if count % self.every_n:
+            return False
+        record.sample_rate = self.every_n
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Satu record per baris JSON (ts, level, logger, msg, request_id, field `extra`)."""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(payload, default=str).decode()
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Jangan format di thread pemanggil (default QueueHandler memanggil self.format);
+        # cukup bekukan argumen agar objek yang berubah setelahnya tidak memengaruhi log
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = config.LOG_LEVEL, log_format: str = config.LOG_FORMAT) -> None:
+    """
+    Pasang logging non-blocking untuk paket `app` (idempotent): pemanggil hanya
+    memasukkan record ke antrian; format + tulis stdout dilakukan thread QueueListener.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = _PreformattedQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(RequestIdFilter())
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level.upper())
+    app_logger.handlers[:] = [queue_handler]
+    app_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Flush record yang tersisa di antrian lalu hentikan thread listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,3 +1,4 @@
+import logging
 from langchain.memory import (
     ConversationBufferWindowMemory,
     VectorStoreRetrieverMemory,
@@ -16,12 +17,14 @@ from .retriever_provider import get_chat_history_retriever # Retriever Qdrant hi
 from ..adapters.llm.llm_factory import get_llm_adapter
 from app import config # Impor config jika perlu nama model default
 
+logger = logging.getLogger(__name__)
+
 # --- 1. Provider untuk Window Memory (MySQL Backend) ---
 def get_window_memory(db_session: AsyncSession, room_id: int, k: int = 2) -> ConversationBufferWindowMemory:
     """
     Membuat instance ConversationBufferWindowMemory dengan backend SQLChatMessageHistory.
     """
-    print(f"Creating Window Memory (k={k}) for room_id {room_id}")
+    logger.debug("Creating Window Memory (k=%d) for room_id %s", k, room_id)
     message_history = SQLChatMessageHistory(session=db_session, room_id=room_id)
     memory = ConversationBufferWindowMemory(
         chat_memory=message_history,
@@ -80,7 +83,7 @@ def get_summary_buffer_memory(
     """
     Membuat instance ConversationSummaryBufferMemory dengan backend SQLChatMessageHistory.
     """
-    print(f"Creating Summary Buffer Memory for room_id {room_id}")
+    logger.debug("Creating Summary Buffer Memory for room_id %s", room_id)
     # Panggi LLM untuk melakukan summarization pada percakapan sebelumnya
     llm_instance = get_llm_adapter(model_name)
     message_history = SQLChatMessageHistory(session=db_session, room_id=room_id)
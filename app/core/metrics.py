@@ -0,0 +1,232 @@
+import logging
+import math
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Batas bucket latency (ms): dari hit cache (<5 ms) sampai panggilan LLM yang lambat
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Nilai label pengganti saat jumlah seri melewati batas (mencegah label liar memakan memori)
+OVERFLOW_LABEL = "__other__"
+
+LabelValues = Tuple[str, ...]
+GaugeSample = Tuple[LabelValues, float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], max_series: int):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.max_series = max_series
+
+    def _key(self, series: dict, label_values: Sequence[str]) -> LabelValues:
+        key = tuple(str(value) for value in label_values)
+        if key not in series and len(series) >= self.max_series:
+            return (OVERFLOW_LABEL,) * len(self.label_names)
+        return key
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Histogram(_Metric):
+    """
+    Histogram bucket tetap: memori per seri hanya len(buckets)+1 counter, sum, dan count.
+    `observe` cukup bisect + beberapa penjumlahan (tanpa lock; di bawah GIL ketelitian
+    counter cukup untuk observabilitas, bukan untuk akuntansi).
+    """
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_MS,
+        max_series: int = config.METRICS_MAX_SERIES,
+    ):
+        super().__init__(name, documentation, label_names, max_series)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        key = self._key(self._series, label_values)
+        series = self._series.get(key)
+        if series is None:
+            # [count per bucket..., +Inf, sum, count]
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 3))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {int(series[-1])}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        max_series: int = config.METRICS_MAX_SERIES,
+    ):
+        super().__init__(name, documentation, label_names, max_series)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        key = self._key(self._values, label_values)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class CallbackGauge(_Metric):
+    """Gauge yang nilainya dibaca saat scrape (kedalaman antrian, hit ratio cache, pool DB)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], collect: Callable[[], Iterable[GaugeSample]]):
+        super().__init__(name, documentation, label_names, max_series=0)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            logger.warning("Gagal membaca gauge %s: %s", self.name, e)
+            return lines
+        for key, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    """Registry metrik in-process dengan output format teks Prometheus."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))  # type: ignore[return-value]
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str], collect: Callable[[], Iterable[GaugeSample]]) -> CallbackGauge:
+        return self._register(CallbackGauge(name, documentation, label_names, collect))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+@lru_cache(maxsize=1)
+def get_metrics_registry() -> MetricsRegistry:
+    """Mengembalikan registry metrik SINGLETON."""
+    return MetricsRegistry()
+
+# === Metrik bawaan aplikasi ===
+_registry = get_metrics_registry()
+
+STAGE_LATENCY = _registry.histogram(
+    "nl2sql_stage_latency_ms",
+    "Latency per tahap pipeline NL2SQL (classification, rag, sql_generation, sql_execution, reasoning, total).",
+    ("stage", "endpoint", "model"),
+)
+HTTP_REQUEST_LATENCY = _registry.histogram(
+    "nl2sql_http_request_latency_ms",
+    "Latency request HTTP per path dan status.",
+    ("method", "path", "status"),
+)
+DB_POOL_WAIT = _registry.histogram(
+    "nl2sql_db_pool_wait_ms",
+    "Waktu menunggu koneksi dari pool SQLAlchemy sebelum eksekusi SQL.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000, 5000),
+)
+REQUESTS = _registry.counter(
+    "nl2sql_pipeline_requests_total",
+    "Jumlah alur NL2SQL yang selesai per endpoint, model, dan jalur reasoning.",
+    ("endpoint", "model", "reasoning_path"),
+)
+
+def observe_stage_latencies(endpoint: str, model: str, latencies: Dict[str, Optional[int]]) -> None:
+    """Catat semua latency tahap yang diukur `_measure_time` untuk satu alur."""
+    for stage, value in latencies.items():
+        if value is not None:
+            STAGE_LATENCY.observe(value, stage, endpoint, model)
+
+def register_runtime_gauges() -> None:
+    """Gauge antrian, hit ratio cache, dan pool DB (dibaca dari singleton saat scrape)."""
+    from app.adapters.db.database import engine
+    from app.adapters.db.telemetry_writer import get_telemetry_writer
+    from app.adapters.vector_store.message_vector_writer import get_message_vector_writer
+    from .answer_cache import get_answer_cache
+    from .chat_history_cache import get_chat_history_cache
+    from .embedding_provider import get_embedding_model
+    from .result_cache import get_result_cache
+
+    def queue_depths() -> Iterable[GaugeSample]:
+        yield ("message_vector_writer",), get_message_vector_writer().stats()["queue_depth"]
+        yield ("telemetry_writer",), get_telemetry_writer().stats()["queue_depth"]
+        batcher = get_embedding_model().stats().get("batcher")
+        if batcher:
+            yield ("embedding_batcher",), batcher["queued"]
+
+    def ratio(hits: int, misses: int) -> float:
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def cache_hit_ratios() -> Iterable[GaugeSample]:
+        if config.ANSWER_CACHE_ENABLED:
+            yield ("answer_cache",), get_answer_cache().stats()["hit_ratio"]
+        yield ("embedding_cache",), get_embedding_model().stats()["hit_ratio"]
+        tables = get_result_cache().stats()["tables"].values()
+        yield ("result_cache",), ratio(sum(t["hits"] for t in tables), sum(t["misses"] for t in tables))
+        history = get_chat_history_cache().stats()
+        yield ("chat_history_cache",), ratio(history["hits"], history["misses"])
+
+    def db_pool() -> Iterable[GaugeSample]:
+        pool = engine.sync_engine.pool
+        yield ("checked_out",), pool.checkedout()
+        yield ("idle",), pool.checkedin()
+        yield ("overflow",), pool.overflow()
+
+    _registry.gauge("nl2sql_queue_depth", "Kedalaman antrian background.", ("queue",), queue_depths)
+    _registry.gauge("nl2sql_cache_hit_ratio", "Hit ratio kumulatif per cache.", ("cache",), cache_hit_ratios)
+    _registry.gauge("nl2sql_db_pool_connections", "Status koneksi pool SQLAlchemy.", ("state",), db_pool)
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import config
+from ..adapters.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Literal string ('..' / "..") dan identifier backtick dibiarkan apa adanya,
+# sisanya (keyword, identifier biasa) di-casefold dan spasinya dirapikan.
+_SQL_TOKEN = re.compile(
+    r"""(?P<literal>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)|(?P<space>\s+)|(?P<other>[^'"`\s]+)""",
+    re.DOTALL,
+)
+_TABLE_REFERENCE = re.compile(r"\b(?:from|join)\s+((?:`[^`]+`|\w+)(?:\s*\.\s*(?:`[^`]+`|\w+))?)")
+# Fungsi yang hasilnya berubah antar eksekusi walau datanya sama (dicek pada SQL kanonik, di luar literal)
+_NONDETERMINISTIC = re.compile(
+    r"\b(?:now|sysdate|curdate|curtime|current_date|current_time|current_timestamp|localtime|localtimestamp"
+    r"|utc_date|utc_time|utc_timestamp|unix_timestamp|rand|uuid|uuid_short|connection_id|last_insert_id|found_rows)\b"
+)
+# Versi tabel yang belum pernah diprobe poller. UPDATE_TIME NULL (InnoDB setelah restart,
+# MariaDB) berarti perubahan tidak bisa dideteksi: hasil dari tabel itu tidak di-cache.
+_UNKNOWN_VERSION = object()
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Bentuk kanonik SQL untuk kunci cache: spasi tunggal, huruf kecil di luar
+    literal/identifier ber-backtick, tanpa titik koma di akhir.
+    """
+    parts: List[str] = []
+    pending_space = False
+    for match in _SQL_TOKEN.finditer(sql.strip().rstrip(";").strip()):
+        if match.lastgroup == "space":
+            pending_space = True
+            continue
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+        token = match.group()
+        parts.append(token if match.lastgroup == "literal" else token.casefold())
+    return "".join(parts)
+
+def is_deterministic(canonical_sql: str) -> bool:
+    """False jika SQL memanggil fungsi waktu/acak (NOW(), CURDATE(), RAND(), ...)."""
+    code = " ".join(match.group() for match in _SQL_TOKEN.finditer(canonical_sql) if match.lastgroup == "other")
+    return _NONDETERMINISTIC.search(code) is None
+
+def extract_tables(canonical_sql: str) -> Set[str]:
+    """Nama tabel (tanpa skema, huruf kecil) yang muncul setelah FROM/JOIN."""
+    tables = set()
+    for reference in _TABLE_REFERENCE.findall(canonical_sql):
+        name = reference.split(".")[-1].strip().strip("`")
+        tables.add(name.casefold())
+    return tables
+
+def estimate_row_bytes(row: Dict[str, Any]) -> int:
+    """Perkiraan memori satu baris (dict + nilai-nilainya, tanpa kunci kolom)."""
+    return sys.getsizeof(row) + 8 + sum(sys.getsizeof(value) for value in row.values())
+
+def estimate_rows_bytes(rows: Iterable[Dict[str, Any]]) -> int:
+    """Perkiraan kasar memori yang dipakai list of dict hasil kueri."""
+    total = sys.getsizeof([])
+    for index, row in enumerate(rows):
+        if index == 0:
+            # Kunci kolom adalah objek string yang sama untuk setiap baris, cukup dihitung sekali
+            total += sum(sys.getsizeof(key) for key in row)
+        total += estimate_row_bytes(row)
+    return total
+
+@dataclass
+class _ResultEntry:
+    rows: List[Dict[str, Any]]
+    tables: Set[str]
+    size_bytes: int
+    versions: Dict[str, Any] = field(default_factory=dict)  # versi tabel saat hasil dibaca
+    created_at: float = field(default_factory=time.monotonic)
+
+class ResultSetCache:
+    """
+    Cache hasil SELECT dengan kunci SQL kanonik.
+
+    Dibatasi total memori (bukan jumlah entry) dan TTL; entry terlama dibuang
+    secara LRU. Invalidasi dilakukan per tabel: setiap entry dicatat di index
+    tabel yang dibacanya, sehingga perubahan `drauk_unit` hanya membuang entry
+    yang membaca `drauk_unit`. Setiap entry menyimpan versi tabel (UPDATE_TIME)
+    yang terakhir diketahui sebelum kueri dieksekusi; poller membuang entry yang
+    versinya berbeda dari versi terkini; tabel dengan versi NULL tidak di-cache sama
+    sekali. SQL non-deterministik (NOW(), RAND(), ...) tidak di-cache. Statistik hit/miss dicatat per tabel.
+    """
+    def __init__(
+        self,
+        max_bytes: int = config.RESULT_CACHE_MAX_BYTES,
+        ttl_seconds: float = config.RESULT_CACHE_TTL_SECONDS,
+        max_entry_bytes: int = config.RESULT_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, _ResultEntry]" = OrderedDict()
+        self._table_index: Dict[str, Set[str]] = {}
+        self._table_stats: Dict[str, Dict[str, int]] = {}
+        self._versions: Dict[str, Any] = {}
+        self._bytes = 0
+        self.evictions = 0
+        self.oversized = 0
+        self.nondeterministic = 0
+        self.unversioned = 0
+
+    def _stats_for(self, table: str) -> Dict[str, int]:
+        return self._table_stats.setdefault(table, {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size_bytes
+        for table in entry.tables:
+            keys = self._table_index.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._table_index[table]
+
+    def get(self, sql: str) -> Optional[List[Dict[str, Any]]]:
+        key = canonicalize_sql(sql)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            entry = None
+
+        tables = entry.tables if entry is not None else extract_tables(key)
+        for table in tables:
+            self._stats_for(table)["hits" if entry is not None else "misses"] += 1
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        # Salinan list agar pemanggil tidak mengubah isi cache secara tidak sengaja
+        return list(entry.rows)
+
+    def table_versions(self, sql: str) -> Dict[str, Any]:
+        """Versi terakhir yang diketahui untuk tabel yang dibaca `sql` (ambil sebelum eksekusi)."""
+        return {
+            table: self._versions[table]
+            for table in extract_tables(canonicalize_sql(sql))
+            if table in self._versions
+        }
+
+    def put(self, sql: str, rows: List[Dict[str, Any]], versions: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Simpan hasil kueri beserta versi tabel dari `table_versions()` sebelum eksekusi
+        (default: versi saat ini). Mengembalikan False jika hasil tidak di-cache
+        (terlalu besar, SQL non-deterministik, atau tabel tanpa versi/UPDATE_TIME NULL).
+        """
+        key = canonicalize_sql(sql)
+        if not is_deterministic(key):
+            self.nondeterministic += 1
+            return False
+        size_bytes = estimate_rows_bytes(rows)
+        if size_bytes > self.max_entry_bytes:
+            self.oversized += 1
+            return False
+
+        if versions is None:
+            versions = self.table_versions(sql)
+        if any(version is None for version in versions.values()):
+            self.unversioned += 1
+            return False
+        if key in self._entries:
+            self._remove(key)
+        entry = _ResultEntry(rows=list(rows), tables=extract_tables(key), size_bytes=size_bytes, versions=dict(versions))
+        self._entries[key] = entry
+        self._bytes += size_bytes
+        for table in entry.tables:
+            self._table_index.setdefault(table, set()).add(key)
+
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def invalidate_table(self, table: str) -> int:
+        """Buang semua entry yang membaca `table`. Mengembalikan jumlah entry yang dibuang."""
+        table = table.casefold()
+        keys = list(self._table_index.get(table, ()))
+        for key in keys:
+            self._remove(key)
+        self._stats_for(table)["invalidations"] += 1
+        return len(keys)
+
+    def apply_versions(self, current: Dict[str, Any]) -> List[str]:
+        """
+        Catat versi tabel terkini dan buang entry yang disimpan dengan versi lain
+        (termasuk versi yang belum diketahui saat disimpan, dan semua entry tabel yang
+        versinya kini NULL). Mengembalikan tabel yang entry-nya dibuang.
+        """
+        changed = []
+        for table, version in current.items():
+            self._versions[table] = version
+            stale = [
+                key for key in self._table_index.get(table, ())
+                if self._entries[key].versions.get(table, _UNKNOWN_VERSION) != version
+            ]
+            for key in stale:
+                self._remove(key)
+            if stale:
+                self._stats_for(table)["invalidations"] += 1
+                changed.append(table)
+        return changed
+
+    def known_tables(self) -> List[str]:
+        """Tabel yang versinya pernah diprobe."""
+        return list(self._versions)
+
+    def invalidate_all(self) -> int:
+        removed = len(self._entries)
+        for table in list(self._table_index):
+            self._stats_for(table)["invalidations"] += 1
+        self._entries.clear()
+        self._table_index.clear()
+        self._bytes = 0
+        return removed
+
+    def cached_tables(self) -> List[str]:
+        return list(self._table_index)
+
+    def stats(self) -> Dict[str, Any]:
+        tables = {}
+        for table, counters in self._table_stats.items():
+            lookups = counters["hits"] + counters["misses"]
+            tables[table] = {
+                **counters,
+                "entries": len(self._table_index.get(table, ())),
+                "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+        return {
+            "enabled": config.RESULT_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "memory_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+            "nondeterministic": self.nondeterministic,
+            "unversioned": self.unversioned,
+            "tables": tables,
+        }
+
+class TableVersionPoller:
+    """
+    Probe perubahan tabel yang murah: membaca `information_schema.TABLES.UPDATE_TIME`
+    untuk tabel yang sedang punya entry di cache (dan tabel yang versinya sudah
+    dikenal), lalu membuang entry yang disimpan dengan versi tabel berbeda.
+
+    MySQL 8 meng-cache statistik information_schema selama `information_schema_stats_expiry`
+    (default 86400 detik), jadi koneksi probe men-set variabel itu ke 0 terlebih dahulu.
+    Server yang tidak mengenalnya (MariaDB, MySQL < 8) tidak meng-cache UPDATE_TIME.
+    """
+    _DISABLE_STATS_CACHE = text("SET SESSION information_schema_stats_expiry = 0")
+    _QUERY = text(
+        "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :tables"
+    ).bindparams(bindparam("tables", expanding=True))
+
+    def __init__(
+        self,
+        cache: ResultSetCache,
+        db_engine: AsyncEngine,
+        interval_seconds: float = config.RESULT_CACHE_POLL_INTERVAL_SECONDS,
+    ):
+        self.cache = cache
+        self.db_engine = db_engine
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.errors = 0
+        self._stats_expiry_supported = True
+
+    def start(self) -> None:
+        """Mulai polling di event loop yang sedang berjalan (idempotent, 0 = nonaktif)."""
+        if self.interval_seconds <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="result-cache-poller")
+        logger.info("Result cache poller started (interval=%ss)", self.interval_seconds)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.poll_once()
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Gagal mengecek versi tabel untuk result cache: %s", e)
+
+    async def poll_once(self) -> List[str]:
+        """Satu kali probe; mengembalikan daftar tabel yang di-invalidate."""
+        tables = sorted(set(self.cache.cached_tables()) | set(self.cache.known_tables()))
+        if not tables:
+            return []
+        async with self.db_engine.connect() as connection:
+            await self._disable_stats_cache(connection)
+            result = await connection.execute(self._QUERY, {"tables": tables})
+            current = {row.TABLE_NAME.casefold(): row.UPDATE_TIME for row in result}
+        self.polls += 1
+
+        changed = self.cache.apply_versions(current)
+        if changed:
+            logger.info("Tabel berubah, result cache di-invalidate: %s", ", ".join(changed))
+        return changed
+
+    async def _disable_stats_cache(self, connection) -> None:
+        dialect = getattr(connection, "dialect", None)
+        if not self._stats_expiry_supported or getattr(dialect, "name", None) != "mysql":
+            return
+        if getattr(dialect, "is_mariadb", False):
+            self._stats_expiry_supported = False
+            return
+        try:
+            await connection.execute(self._DISABLE_STATS_CACHE)
+        except Exception as e:
+            self._stats_expiry_supported = False
+            logger.info("information_schema_stats_expiry tidak didukung server, dilewati: %s", e)
+
+@lru_cache(maxsize=1)
+def get_result_cache() -> ResultSetCache:
+    """Mengembalikan result cache SINGLETON untuk seluruh proses."""
+    logger.info("Creating Result Set Cache")
+    return ResultSetCache()
+
+@lru_cache(maxsize=1)
+def get_table_version_poller() -> TableVersionPoller:
+    """Poller versi tabel SINGLETON yang terikat ke engine utama."""
+    return TableVersionPoller(get_result_cache(), engine)
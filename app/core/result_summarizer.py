@@ -0,0 +1,132 @@
+from decimal import Decimal
+from typing import List, Optional
+
+import pandas as pd
+
+from app import config
+from .db_executor import QueryResult
+from .token_counter import count_tokens
+
+# Kolom numerik yang sebenarnya dimensi (tahun, kode), bukan metrik untuk dijumlahkan
+_DIMENSION_PREFIXES = ("tahun", "kode", "id_")
+_DIMENSION_SUFFIXES = ("_id", "_kode")
+_MAX_GROUPS = 50
+
+def _format_number(value: float) -> str:
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+
+def _to_frame(query_result: QueryResult) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(query_result.rows, columns=query_result.columns or None)
+    # Kolom DECIMAL dari MySQL terbaca sebagai object; ubah ke float agar bisa divektorisasi
+    for column in df.columns[df.dtypes == object]:
+        sample = df[column].dropna()
+        if not sample.empty and isinstance(sample.iloc[0], Decimal):
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+def _is_dimension(column: str) -> bool:
+    name = column.casefold()
+    return name.startswith(_DIMENSION_PREFIXES) or name.endswith(_DIMENSION_SUFFIXES)
+
+def _metric_columns(df: pd.DataFrame) -> List[str]:
+    numeric = [c for c in df.select_dtypes(include="number").columns if not _is_dimension(str(c))]
+    preferred = [c for c in config.REASONING_PRIMARY_METRICS if c in numeric]
+    return preferred + [c for c in numeric if c not in preferred]
+
+def _group_column(df: pd.DataFrame, metrics: List[str]) -> Optional[str]:
+    for column in df.columns:
+        if column in metrics or pd.api.types.is_numeric_dtype(df[column]) and not _is_dimension(str(column)):
+            continue
+        unique = df[column].nunique(dropna=True)
+        if 1 < unique <= _MAX_GROUPS:
+            return column
+    return None
+
+def _describe_columns(df: pd.DataFrame, metrics: List[str]) -> str:
+    parts = []
+    for column in df.columns:
+        if column in metrics:
+            parts.append(f"{column} (angka)")
+        else:
+            parts.append(f"{column} (teks/kategori, {df[column].nunique(dropna=True)} unik)")
+    return "Kolom: " + ", ".join(parts)
+
+def _describe_metrics(df: pd.DataFrame, metrics: List[str]) -> str:
+    # Satu panggilan agg untuk semua kolom metrik sekaligus
+    stats = df[metrics].agg(["sum", "min", "max", "mean"])
+    lines = ["Statistik:"]
+    for column in metrics:
+        s = stats[column]
+        lines.append(
+            f"- {column}: total={_format_number(s['sum'])}, min={_format_number(s['min'])}, "
+            f"maks={_format_number(s['max'])}, rata-rata={_format_number(s['mean'])}"
+        )
+    return "\n".join(lines)
+
+def _group_shares(df: pd.DataFrame, group_column: str, metric: str, top_n: int) -> str:
+    totals = df.groupby(group_column, dropna=False)[metric].sum().sort_values(ascending=False)
+    grand_total = totals.sum()
+    if not grand_total:
+        return ""
+    shares = [
+        f"{group}: {_format_number(value)} ({value / grand_total:.1%})"
+        for group, value in totals.head(top_n).items()
+    ]
+    remaining = len(totals) - top_n
+    suffix = f"; {remaining} kelompok lainnya" if remaining > 0 else ""
+    return f"Porsi {metric} per {group_column}: " + "; ".join(shares) + suffix
+
+def _csv(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False, float_format="%.2f").strip()
+
+def summarize_result(
+    query_result: QueryResult,
+    token_budget: int = config.REASONING_SUMMARY_TOKEN_BUDGET,
+    sample_rows: int = config.REASONING_SUMMARY_SAMPLE_ROWS,
+    top_n: int = config.REASONING_SUMMARY_TOP_N,
+) -> str:
+    """
+    Ringkasan hasil kueri untuk prompt reasoning.
+
+    Hasil kecil yang muat di `token_budget` dikirim utuh sebagai CSV (kolom
+    sekali, tanpa key berulang). Hasil besar diringkas dengan pandas: jumlah
+    baris, tipe kolom, total/min/maks, top-N berdasarkan metrik utama, porsi per
+    kelompok, dan beberapa baris contoh — ditambahkan berurutan selama masih
+    dalam budget.
+    """
+    if not query_result.rows:
+        return "Tidak ada data."
+
+    df = _to_frame(query_result)
+    total_rows = f"{query_result.row_count}{'' if query_result.row_count_exact else '+'}"
+    header = f"Jumlah baris: {total_rows}"
+    if query_result.truncated:
+        header += f" (yang dianalisis: {len(df)} baris pertama)"
+
+    full_table = f"{header}\n{_csv(df)}"
+    if not query_result.truncated and count_tokens(full_table) <= token_budget:
+        return full_table
+
+    metrics = _metric_columns(df)
+    sections = [header, _describe_columns(df, metrics)]
+    if metrics:
+        main_metric = metrics[0]
+        sections.append(_describe_metrics(df, metrics))
+        sections.append(f"Top {top_n} berdasarkan {main_metric}:\n{_csv(df.nlargest(top_n, main_metric))}")
+        group_column = _group_column(df, metrics)
+        if group_column is not None:
+            sections.append(_group_shares(df, group_column, main_metric, top_n))
+    sections.append(f"Contoh baris:\n{_csv(df.head(sample_rows))}")
+
+    summary: List[str] = []
+    used = 0
+    for section in filter(None, sections):
+        cost = count_tokens(section) + 1
+        if used + cost > token_budget:
+            if not summary:
+                # Header saja sudah melebihi budget: potong agar tetap ada konteks minimum
+                summary.append(section[: token_budget * 4])
+            continue
+        summary.append(section)
+        used += cost
+    return "\n".join(summary)
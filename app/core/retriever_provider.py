@@ -1,17 +1,33 @@
+import logging
 from functools import lru_cache
 from app import config
 
 from .embedding_provider import get_embedding_model
+from .schema_documents import load_schema_documents
 from ..adapters.vector_store.qdrant_adapter import get_qdrant_retriever
+from ..adapters.vector_store.in_memory_schema_index import InMemorySchemaIndex, InMemorySchemaRetriever
+
+logger = logging.getLogger(__name__)
 
 @lru_cache(maxsize=1)
 def get_schema_retriever():
     """
     Membuat dan mengembalikan retriever SINGLETON untuk koleksi skema.
+    Backend dipilih lewat SCHEMA_RETRIEVER_BACKEND ("qdrant" atau "memory").
     """
-    print("✅ Creating Schema Retriever...")
+    logger.info("Creating Schema Retriever (backend=%s)", config.SCHEMA_RETRIEVER_BACKEND)
 
     shared_embeddings = get_embedding_model()
+
+    if config.SCHEMA_RETRIEVER_BACKEND == "memory":
+        # Index in-process dari dokumen yang sama dengan scripts/ingest_all_schemas.py
+        index = InMemorySchemaIndex(
+            documents=load_schema_documents(),
+            embeddings=shared_embeddings.base, # Build index tanpa mengisi LRU query
+            cache_dir=config.SCHEMA_INDEX_DIR,
+            embedding_model_name=config.EMBEDDING_MODEL_NAME,
+        )
+        return InMemorySchemaRetriever(index=index, embeddings=shared_embeddings, k=config.SCHEMA_RETRIEVER_K)
     
     return get_qdrant_retriever(
         qdrant_host=config.QDRANT_HOST,
@@ -23,7 +39,7 @@ def get_schema_retriever():
 @lru_cache(maxsize=1)
 def get_document_retriever():
     """Membuat retriever SINGLETON untuk koleksi dokumen umum."""
-    print(f"✅ Creating Document Retriever for '{config.COLLECTION_NAME}'...")
+    logger.info("Creating Document Retriever for '%s'", config.COLLECTION_NAME)
     shared_embeddings = get_embedding_model()
     return get_qdrant_retriever(
         qdrant_host=config.QDRANT_HOST,
@@ -37,12 +53,12 @@ def get_chat_history_retriever():
     """
     Membuat retriever SINGLETON untuk koleksi riwayat chat di Qdrant.
     """
-    print(f"✅ Creating Chat History Retriever for 'chat_history_collection'...")
+    logger.info("Creating Chat History Retriever for '%s'", config.CHAT_HISTORY_COLLECTION)
     shared_embeddings = get_embedding_model()
     return get_qdrant_retriever(
         qdrant_host=config.QDRANT_HOST,
         # qdrant_api_key=config.QDRANT_API_KEY,
         # Pastikan nama koleksi ini sesuai dengan yang Anda buat
-        collection_name="chat_history_collection",
+        collection_name=config.CHAT_HISTORY_COLLECTION,
         embeddings=shared_embeddings
     )
\ No newline at end of file
@@ -0,0 +1,117 @@
+import logging
+from dataclasses import dataclass, field
+from difflib import get_close_matches
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from app import config
+from .schema_documents import SCHEMA_FILES, load_yaml
+from .security.sql_validator import SQLValidationResult, rewrite_identifiers
+
+logger = logging.getLogger(__name__)
+
+class SchemaCatalogError(ValueError):
+    """Kueri merujuk tabel/kolom yang tidak ada di katalog skema (dipetakan ke HTTP 400)."""
+    def __init__(self, message: str, unknown: Optional[List[str]] = None):
+        self.unknown = unknown or []
+        super().__init__(message)
+
+@dataclass
+class SchemaCatalog:
+    """
+    Katalog kolom in-memory dari `spec.<tabel>.columns` di `data/*.yml`.
+    Kunci pencarian memakai casefold, nilainya ejaan kanonik dari YAML.
+    `money_columns` berisi kolom bernilai uang (casefold) untuk format Rupiah.
+    """
+    tables: Dict[str, str] = field(default_factory=dict)
+    columns: Dict[str, Dict[str, Set[str]]] = field(default_factory=dict)
+    money_columns: Set[str] = field(default_factory=set)
+
+    def add_table(self, table_name: str, column_names: List[str], money_columns: Iterable[str] = ()):
+        self.tables[table_name.casefold()] = table_name
+        table_columns = self.columns.setdefault(table_name, {})
+        for column_name in column_names:
+            table_columns.setdefault(column_name.casefold(), set()).add(column_name)
+        self.money_columns.update(name.casefold() for name in money_columns)
+
+    def is_money_column(self, name: str) -> bool:
+        return name.casefold() in self.money_columns
+
+    def _resolve_table(self, name: str) -> str:
+        canonical = self.tables.get(name.casefold())
+        if canonical is None:
+            suggestion = get_close_matches(name.casefold(), list(self.tables), n=1)
+            hint = f" Mungkin maksud Anda: {self.tables[suggestion[0]]}." if suggestion else ""
+            raise SchemaCatalogError(f"Tabel '{name}' tidak ada di skema.{hint}", unknown=[name])
+        return canonical
+
+    def _resolve_column(self, name: str, tables: List[str]) -> str:
+        spellings: Set[str] = set()
+        for table in tables:
+            spellings |= self.columns.get(table, {}).get(name.casefold(), set())
+        if len(spellings) == 1:
+            return next(iter(spellings))
+
+        table_list = ", ".join(tables)
+        if spellings:
+            raise SchemaCatalogError(
+                f"Kolom '{name}' ambigu di tabel {table_list}: {', '.join(sorted(spellings))}.",
+                unknown=[name],
+            )
+        candidates = {key: spelling for table in tables for key, names in self.columns.get(table, {}).items() for spelling in names}
+        suggestion = get_close_matches(name.casefold(), list(candidates), n=1)
+        hint = f" Mungkin maksud Anda: {candidates[suggestion[0]]}." if suggestion else ""
+        raise SchemaCatalogError(f"Kolom '{name}' tidak ada di tabel {table_list}.{hint}", unknown=[name])
+
+    def check(self, validation: SQLValidationResult) -> str:
+        """
+        Periksa tabel dan kolom hasil `validate_sql` terhadap katalog. Nama yang
+        cocok tanpa memperhatikan huruf besar/kecil ditulis ulang ke ejaan kanonik;
+        nama yang tidak dikenal atau ambigu memicu `SchemaCatalogError` sebelum
+        koneksi DB diambil. Mengembalikan SQL yang siap dieksekusi.
+        """
+        if not validation.tables:
+            return validation.sql
+
+        replacements: Dict[str, str] = {}
+        tables = []
+        for name in validation.tables:
+            canonical = self._resolve_table(name)
+            tables.append(canonical)
+            if canonical != name:
+                replacements[name] = canonical
+
+        # Tabel tanpa daftar kolom di YAML tidak bisa diperiksa kolomnya
+        if all(self.columns.get(table) for table in tables):
+            for name in validation.columns:
+                canonical = self._resolve_column(name, tables)
+                if canonical != name:
+                    replacements[name] = canonical
+
+        if replacements:
+            logger.info("Nama identifier dinormalkan: %s", replacements)
+        return rewrite_identifiers(validation.sql, replacements)
+
+def load_schema_catalog(schema_dir: Path = config.SCHEMA_DATA_DIR) -> SchemaCatalog:
+    """Bangun katalog dari file YAML skema yang sama dengan yang di-ingest ke retriever."""
+    catalog = SchemaCatalog()
+    for file_name in SCHEMA_FILES:
+        data = load_yaml(schema_dir / file_name) or {}
+        for table_name, table_info in (data.get("spec") or {}).items():
+            columns = (table_info or {}).get("columns", [])
+            # Semua kolom DECIMAL di skema DRAUK adalah nominal Rupiah (Jumlah, Realisasi, Sisa, Harga_Satuan, ...)
+            money = [column["name"] for column in columns if str(column.get("data_type", "")).lower().startswith("decimal")]
+            catalog.add_table(table_name, [column["name"] for column in columns], money)
+        for table in data.get("tables") or []:
+            # main_schema.yml hanya mendaftar nama tabel, tanpa kolom
+            if table["name"].casefold() not in catalog.tables:
+                catalog.add_table(table["name"], [])
+    return catalog
+
+@lru_cache(maxsize=1)
+def get_schema_catalog() -> SchemaCatalog:
+    """Mengembalikan katalog skema SINGLETON (dibaca sekali dari SCHEMA_DATA_DIR)."""
+    catalog = load_schema_catalog()
+    logger.info("Katalog skema dimuat: %d tabel", len(catalog.tables))
+    return catalog
@@ -0,0 +1,111 @@
+import hashlib
+from pathlib import Path
+from typing import List
+
+import yaml
+from langchain_core.documents import Document
+
+from app import config
+
+# Urutan file YAML skema yang di-ingest (sama untuk Qdrant maupun index in-memory)
+SCHEMA_FILES = [
+    "drauk_unit_schema.yml",
+    "drauk_unit_lengkap_schema.yml",
+    "drauk_unit_prognosis_schema.yml",
+    "main_schema.yml",
+]
+
+def load_yaml(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def create_documents_from_table_yaml(table_name: str, data: dict, source_file: str):
+    """Membuat Document LangChain dari schema YAML tabel."""
+    docs = []
+    table_info = data.get("spec", {}).get(table_name, {})
+    if not table_info:
+        return docs
+
+    # Informasi kolom
+    for column in table_info.get("columns", []):
+        content = (
+            f"Tabel '{table_name}' memiliki kolom '{column['name']}'. "
+            f"Deskripsi: {column.get('description', 'Tidak ada deskripsi')}. "
+            f"Tipe data: {column.get('data_type', 'Unknown')}. "
+            f"Sinonim: {', '.join(column.get('synonyms', [])) if column.get('synonyms') else 'Tidak ada'}."
+        )
+        doc = Document(
+            page_content=content,
+            metadata={
+                "source_file": source_file,
+                "table": table_name,
+                "column": column["name"],
+                "data_type": column.get("data_type"),
+                "synonyms": column.get("synonyms", []),
+                "category": "column_definition",
+            },
+        )
+        docs.append(doc)
+
+    # Informasi umum tabel
+    if table_info.get("description"):
+        docs.append(
+            Document(
+                page_content=(
+                    f"Tabel '{table_name}' berfungsi sebagai: {table_info['description']}. "
+                    f"Aturan bisnis: {', '.join(table_info.get('business_rules', [])) if table_info.get('business_rules') else 'Tidak ada aturan bisnis'}."
+                ),
+                metadata={
+                    "source_file": source_file,
+                    "table": table_name,
+                    "category": "table_description",
+                },
+            )
+        )
+    return docs
+
+def create_documents_from_main_schema(data: dict, source_file: str):
+    """Membuat Document dari file main_schema.yml."""
+    docs = []
+    for tbl in data.get("tables", []):
+        content = (
+            f"Tabel '{tbl['name']}' dijelaskan sebagai '{tbl.get('description', '')}'. "
+            f"File schema: {tbl.get('file', '')}. "
+            f"Key fields: {', '.join(tbl.get('key_fields', []))}. "
+            f"Tipe data tabel: {tbl.get('type', 'Unknown')}. "
+            f"Skor penting: {tbl.get('importance_score', 0)}."
+        )
+        docs.append(
+            Document(
+                page_content=content,
+                metadata={
+                    "source_file": source_file,
+                    "table": tbl["name"],
+                    "category": "table_summary",
+                },
+            )
+        )
+    return docs
+
+def load_schema_documents(schema_dir: Path = config.SCHEMA_DATA_DIR) -> List[Document]:
+    """Bangun seluruh dokumen skema dari file YAML di `schema_dir`."""
+    all_docs: List[Document] = []
+    for file_name in SCHEMA_FILES:
+        path = schema_dir / file_name
+        data = load_yaml(path)
+
+        if "spec" in data:  # file schema tabel
+            for tbl_name in data["spec"].keys():
+                all_docs.extend(create_documents_from_table_yaml(tbl_name, data, path.name))
+
+        elif "tables" in data:  # main_schema.yml
+            all_docs.extend(create_documents_from_main_schema(data, path.name))
+    return all_docs
+
+def documents_content_hash(docs: List[Document], embedding_model_name: str) -> str:
+    """Hash isi dokumen + nama model embedding; berubah jika vektor perlu dibangun ulang."""
+    digest = hashlib.sha256(embedding_model_name.encode())
+    for doc in docs:
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode())
+    return digest.hexdigest()
@@ -1,7 +1,12 @@
-import sqlparse
-from sqlparse.sql import Identifier
-from sqlparse.tokens import Keyword, DML
+import logging
 import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from app import config
+
+logger = logging.getLogger(__name__)
 
 BLACKLISTED_FUNCTIONS = {
     'SLEEP',
@@ -9,7 +14,7 @@ BLACKLISTED_FUNCTIONS = {
     'LOAD_FILE',
     'SYS_EVAL',
     'SYS_EXEC',
-    'SYS_GET', 
+    'SYS_GET',
     'EXECUTE',
 }
 
@@ -22,44 +27,302 @@ BLACKLISTED_KEYWORDS = {
     'EXECUTE',
 }
 
+# Kata kunci yang boleh muncul di SELECT dan bukan nama kolom
+SQL_KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'XOR', 'IN', 'IS', 'NULL', 'LIKE', 'RLIKE', 'REGEXP',
+    'BETWEEN', 'AS', 'ON', 'USING', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS', 'FULL', 'NATURAL',
+    'STRAIGHT_JOIN', 'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'ASC', 'DESC', 'DISTINCT',
+    'DISTINCTROW', 'ALL', 'ANY', 'SOME', 'UNION', 'EXCEPT', 'INTERSECT', 'CASE', 'WHEN', 'THEN', 'ELSE',
+    'END', 'EXISTS', 'WITH', 'RECURSIVE', 'TRUE', 'FALSE', 'UNKNOWN', 'INTERVAL', 'DIV', 'MOD',
+    'SEPARATOR', 'ROLLUP', 'OVER', 'PARTITION', 'WINDOW', 'ROWS', 'RANGE', 'UNBOUNDED', 'PRECEDING',
+    'FOLLOWING', 'CURRENT', 'ROW', 'ESCAPE', 'BINARY', 'COLLATE', 'MICROSECOND', 'SECOND', 'MINUTE',
+    'HOUR', 'DAY', 'WEEK', 'MONTH', 'QUARTER', 'YEAR', 'SIGNED', 'UNSIGNED', 'CHAR', 'DECIMAL',
+    'INTEGER', 'INT', 'DATE', 'DATETIME', 'TIME', 'HIGH_PRIORITY', 'SQL_CALC_FOUND_ROWS',
+    'SQL_NO_CACHE', 'LATERAL', 'FETCH', 'FIRST', 'NEXT', 'ONLY', 'CURRENT_DATE', 'CURRENT_TIME',
+    'CURRENT_TIMESTAMP', 'LEADING', 'TRAILING', 'BOTH',
+}
+
+# Setelah kata kunci ini (di luar JOIN ... USING (...)) yang menyusul nama charset/collation, bukan kolom
+_CHARSET_CONTEXT = {'USING', 'COLLATE'}
+
+# Kata kunci yang mengakhiri daftar tabel setelah FROM
+_FROM_LIST_TERMINATORS = {
+    'WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT', 'ON', 'USING', 'WINDOW',
+    'JOIN', 'INNER', 'LEFT', 'RIGHT', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN', 'FULL',
+}
+
+_CODE_FENCE = re.compile(r"```(?:sql)?\s*\n?(.*?)\n?```", re.DOTALL | re.IGNORECASE)
+
+# Satu regex untuk seluruh tokenisasi (satu kali lewat string SQL)
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--(?:[ \t\r\n]|\Z)[^\n]*|\#[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    |(?P<quoted>`(?:[^`]|``)*`)
+    |(?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<space>\s+)
+    |(?P<op><=>|<>|!=|<=|>=|:=|\|\||&&|[-+*/%=<>!~^&|(),.;@?:])
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+@dataclass(frozen=True)
+class SQLValidationResult:
+    """Hasil validasi satu kali parse: status aman, alasan, dan metadata kueri."""
+    is_safe: bool
+    reason: Optional[str] = None
+    sql: str = ""
+    tables: Tuple[str, ...] = ()
+    columns: Tuple[str, ...] = ()
+    aliases: Dict[str, str] = field(default_factory=dict)
+    limit_injected: bool = False
+
+def _unsafe(reason: str, sql: str = "") -> SQLValidationResult:
+    return SQLValidationResult(is_safe=False, reason=reason, sql=sql)
+
+def _identifier(kind: str, text: str) -> str:
+    return text[1:-1].replace("``", "`") if kind == "quoted" else text
+
 def sanitize_sql_output(sql_string: str) -> str:
     """Membersihkan output LLM dari format Markdown code block."""
-    match = re.search(r"```sql\n(.*?)\n```", sql_string, re.DOTALL)
+    match = _CODE_FENCE.search(sql_string)
     if match:
         return match.group(1).strip()
     return sql_string.strip()
 
+@lru_cache(maxsize=config.SQL_VALIDATOR_CACHE_SIZE)
+def validate_sql(raw_sql: str, default_limit: Optional[int] = config.SQL_DEFAULT_LIMIT) -> SQLValidationResult:
+    """
+    Validasi + normalisasi SQL hasil LLM dalam satu kali tokenisasi.
+
+    - Membersihkan code fence Markdown, komentar, dan titik koma penutup.
+    - Hanya satu statement SELECT/WITH; kata kunci dan fungsi berbahaya ditolak,
+      begitu juga komentar eksekusi MySQL (`/*! ... */`) dan literal yang tidak tertutup.
+    - Mengumpulkan tabel (setelah FROM/JOIN), alias tabel, dan kandidat kolom.
+    - Menambahkan `LIMIT default_limit` jika tidak ada LIMIT di level terluar
+      (lihat `injected_limit`; executor menandai hasil yang mencapai batas ini terpotong).
+
+    Hasil di-cache per teks SQL (lru_cache), sehingga kueri berulang tidak di-parse ulang.
+    """
+    sql = sanitize_sql_output(raw_sql)
+    pieces: List[str] = []
+    need_space = False
+
+    depth = 0
+    derived_stack: List[bool] = []          # True jika kurung ini adalah subquery di posisi tabel
+    statement_ended = False
+    has_outer_limit = False
+    first_keyword: Optional[str] = None
+    in_with_header = False                  # di antara WITH dan SELECT utama (definisi CTE)
+
+    tables: List[str] = []
+    aliases: Dict[str, str] = {}
+    columns: List[str] = []
+    column_aliases: Set[str] = set()
+    cte_names: Set[str] = set()
+
+    prev_text = ""                          # token signifikan sebelumnya (kata kunci dalam huruf besar)
+    prev_is_operand = False                 # token sebelumnya identifier/literal/')' (alias implisit mungkin menyusul)
+    prev_was_table = False
+    pending: Optional[Tuple[str, str]] = None  # identifier yang belum jelas: kolom, fungsi, atau qualifier
+    expect_table = False                    # identifier berikutnya adalah nama tabel
+    alias_for: Optional[str] = None         # tabel yang boleh diikuti alias
+    from_list_depth: Optional[int] = None   # depth daftar tabel FROM yang sedang aktif
+    query_depths: Set[int] = {0}            # depth kurung yang berisi blok SELECT (FROM di sana = daftar tabel)
+    after_dot = False
+
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "space":
+            need_space = True
+            continue
+        if kind == "comment":
+            if text.startswith("/*!"):
+                return _unsafe("Komentar eksekusi MySQL (/*! ... */) tidak diizinkan.")
+            if text.startswith("/*") and (len(text) < 4 or not text.endswith("*/")):
+                return _unsafe("Komentar blok tidak ditutup.")
+            need_space = True
+            continue
+        if kind == "other":
+            if text in "'\"`":
+                return _unsafe("Literal string atau identifier tidak ditutup.")
+            return _unsafe(f"Karakter tidak dikenal '{text}'.")
+        if statement_ended:
+            return _unsafe("Terdeteksi lebih dari satu statement SQL.")
+        if text == ";":
+            statement_ended = True
+            continue
+
+        upper = text.upper() if kind == "word" else ""
+        if first_keyword is None:
+            first_keyword = upper
+            if upper not in ("SELECT", "WITH"):
+                return _unsafe(f"Tipe statement bukan SELECT, melainkan {upper or text}.")
+            in_with_header = upper == "WITH"
+        if upper in BLACKLISTED_KEYWORDS:
+            return _unsafe(f"Terdeteksi kata kunci berbahaya '{upper}'.")
+
+        # Identifier tertunda: diikuti '(' berarti fungsi, diikuti '.' berarti qualifier, selain itu kolom
+        if pending is not None:
+            pending_kind, pending_text = pending
+            if text == "(":
+                # Nama fungsi ber-backtick (`SLEEP`(5)) juga dicek
+                function_name = _identifier(pending_kind, pending_text).upper()
+                if function_name in BLACKLISTED_FUNCTIONS:
+                    return _unsafe(f"Terdeteksi pemanggilan fungsi berbahaya '{function_name}'.")
+            elif text != ".":
+                columns.append(_identifier(pending_kind, pending_text))
+            pending = None
+
+        if kind == "quoted" or (kind == "word" and upper not in SQL_KEYWORDS):
+            name = _identifier(kind, text)
+            if prev_text in _CHARSET_CONTEXT:
+                # `CONVERT(x USING utf8mb4)`, `nama COLLATE utf8mb4_bin`
+                pass
+            elif expect_table:
+                tables.append(name)
+                alias_for, expect_table = name, False
+            elif alias_for is not None:
+                aliases[name], alias_for = alias_for, None
+            elif in_with_header and depth == 0 and prev_text in ("WITH", "RECURSIVE", ","):
+                cte_names.add(name)
+            elif prev_text == "AS" or (prev_is_operand and not after_dot):
+                # alias kolom, eksplisit (`SUM(x) AS total`) maupun implisit (`SUM(x) total`)
+                column_aliases.add(name)
+            elif after_dot:
+                columns.append(name)
+            else:
+                pending = (kind, text)
+        elif kind == "string" and prev_text == "AS" and alias_for is None:
+            # alias kolom berupa literal string: `SUM(Jumlah) AS 'Total Pagu'`
+            column_aliases.add(text[1:-1].replace(text[0] * 2, text[0]))
+        elif text == "." and prev_was_table:
+            # `schema.tabel`: yang barusan dicatat adalah schema, tabel sebenarnya menyusul
+            tables.pop()
+            alias_for, expect_table = None, True
+        elif upper != "AS":
+            alias_for = None
+
+        if text == "(":
+            derived_stack.append(expect_table)
+            depth += 1
+            expect_table = False
+        elif text == ")":
+            query_depths.discard(depth)
+            depth -= 1
+            if depth < 0:
+                return _unsafe("Kurung tutup tanpa pasangan.")
+            if derived_stack.pop():
+                alias_for = "(subquery)"
+            if from_list_depth is not None and depth < from_list_depth:
+                from_list_depth = None
+        elif upper == "FROM" and depth in query_depths:
+            # FROM di dalam fungsi (`EXTRACT(YEAR FROM tgl)`, `TRIM(... FROM x)`) bukan daftar tabel
+            expect_table, from_list_depth = True, depth
+        elif upper == "JOIN":
+            expect_table = True
+        elif upper == "SELECT":
+            query_depths.add(depth)
+            if depth == 0:
+                in_with_header = False
+        elif upper == "LIMIT" and depth == 0:
+            has_outer_limit = True
+        elif text == "," and from_list_depth == depth:
+            expect_table = True
+        if upper in _FROM_LIST_TERMINATORS and from_list_depth == depth:
+            from_list_depth = None
+
+        after_dot = text == "."
+        prev_was_table = bool(tables) and alias_for == tables[-1] and kind in ("word", "quoted") and upper not in SQL_KEYWORDS
+        prev_is_operand = kind in ("quoted", "number", "string") or text == ")" or upper == "END" or (
+            kind == "word" and upper not in SQL_KEYWORDS
+        )
+        prev_text = upper or text
+        # `1--1` bukan komentar di MySQL, tapi dialek lain membacanya sebagai komentar
+        if pieces and (need_space or (text == "-" and pieces[-1] == "-")):
+            pieces.append(" ")
+        need_space = False
+        pieces.append(text)
+
+    if pending is not None:
+        columns.append(_identifier(*pending))
+    if first_keyword is None:
+        return _unsafe("Kueri kosong.")
+    if depth != 0:
+        return _unsafe("Jumlah kurung buka dan tutup tidak seimbang.")
+
+    normalized = "".join(pieces)
+    limit_injected = False
+    if not has_outer_limit and default_limit:
+        normalized = f"{normalized} LIMIT {default_limit}"
+        limit_injected = True
+
+    table_names = tuple(dict.fromkeys(t for t in tables if t not in cte_names))
+    excluded = {name.casefold() for name in (*aliases, *tables, *column_aliases, *cte_names)}
+    column_names = tuple(dict.fromkeys(c for c in columns if c.casefold() not in excluded))
+    return SQLValidationResult(
+        is_safe=True,
+        sql=normalized,
+        tables=table_names,
+        columns=column_names,
+        aliases=aliases,
+        limit_injected=limit_injected,
+    )
+
+def outer_select_end(sql: str) -> Optional[int]:
+    """
+    Posisi tepat setelah kata kunci SELECT pertama di level terluar (blok kueri utama).
+    Untuk `WITH cte AS (SELECT ...) SELECT ...`, SELECT di dalam definisi CTE dilewati.
+    """
+    depth = 0
+    for match in _TOKEN.finditer(sql):
+        text = match.group()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and match.lastgroup == "word" and text.upper() == "SELECT":
+            return match.end()
+    return None
+
+def injected_limit(sql: str, default_limit: Optional[int] = config.SQL_DEFAULT_LIMIT) -> Optional[int]:
+    """
+    LIMIT otomatis dari `validate_sql` jika SQL berakhiran ` LIMIT default_limit`, selain itu None.
+    Hasil yang mencapai batas ini belum tentu lengkap (jumlah baris sebenarnya tidak diketahui).
+    """
+    if default_limit and sql.endswith(f" LIMIT {default_limit}"):
+        return default_limit
+    return None
+
+def rewrite_identifiers(sql: str, replacements: Dict[str, str]) -> str:
+    """
+    Ganti identifier (kata atau `backtick`) sesuai `replacements` tanpa menyentuh
+    literal string maupun komentar. Dipakai untuk menormalkan nama kolom/tabel ke ejaan kanonik.
+    """
+    if not replacements:
+        return sql
+    pieces: List[str] = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("word", "quoted"):
+            name = _identifier(kind, text)
+            if name in replacements:
+                text = f"`{replacements[name]}`" if kind == "quoted" else replacements[name]
+        pieces.append(text)
+    return "".join(pieces)
+
 def is_safe_select_query(query: str) -> bool:
     """
     Memvalidasi sebuah string query SQL untuk memastikan itu adalah
     query SELECT tunggal yang aman dan tidak mengandung fungsi/klausa berbahaya.
     """
-    parsed = sqlparse.parse(query)
-    if not parsed or len(parsed) == 0:
-        return False
-
-    if len(parsed) > 1:
-        print("Validasi Gagal: Terdeteksi lebih dari satu statement SQL.")
-        return False
-        
-    statement = parsed[0]
-    
-    if statement.get_type() != 'SELECT':
-        print(f"Validasi Gagal: Tipe statement bukan SELECT, melainkan {statement.get_type()}.")
+    result = validate_sql(query, default_limit=None)
+    if not result.is_safe:
+        logger.info("Validasi gagal: %s", result.reason)
         return False
-        
-    for token in statement.flatten():
-        if token.ttype is Keyword and token.normalized in BLACKLISTED_KEYWORDS:
-            print(f"Validasi Gagal: Terdeteksi kata kunci berbahaya '{token.normalized}'.")
-            return False
-
-        if isinstance(token, Identifier):
-            is_function_call = any(isinstance(sub_token, sqlparse.sql.Parenthesis) for sub_token in token.tokens)
-            if is_function_call:
-                function_name = token.get_name()
-                if function_name and function_name.upper() in BLACKLISTED_FUNCTIONS:
-                    print(f"Validasi Gagal: Terdeteksi pemanggilan fungsi berbahaya '{function_name.upper()}'.")
-                    return False
-    
-    print("Validasi query SELECT berhasil.")
+    logger.debug("Validasi query SELECT berhasil")
     return True
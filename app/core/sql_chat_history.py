@@ -1,11 +1,28 @@
+import logging
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage, messages_from_dict, message_to_dict
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import json
 
 # Import CRUD, Skema, dan Model Anda
 from ..adapters.db import crud, schemas, models
+from ..adapters.db.unit_of_work import UnitOfWork
+from .chat_history_cache import get_chat_history_cache
+from .token_counter import count_tokens
+from app import config
+
+logger = logging.getLogger(__name__)
+
+def _to_langchain_message(msg_orm: models.ChatMessage) -> BaseMessage:
+    """Konversi langsung baris ChatMessage ke pesan LangChain (tanpa from_orm + messages_from_dict)."""
+    message_class = HumanMessage if msg_orm.sender == 'user' else AIMessage
+    return message_class(
+        content=msg_orm.message_text,
+        additional_kwargs={
+            "message_id": msg_orm.message_id,
+            "timestamp": msg_orm.timestamp.isoformat() if msg_orm.timestamp else None,
+        },
+    )
 
 class SQLChatMessageHistory(BaseChatMessageHistory):
     """
@@ -16,34 +33,41 @@ class SQLChatMessageHistory(BaseChatMessageHistory):
         self.session = session
         self.room_id = room_id
         self._latest_user_message_id: Optional[int] = None 
+        self._unit_of_work: Optional[UnitOfWork] = None
+
+    def use_unit_of_work(self, unit_of_work: UnitOfWork) -> None:
+        """Tulis pesan lewat unit of work request (pesan user di-commit segera, sisanya ditunda)."""
+        self._unit_of_work = unit_of_work
+        if config.CHAT_HISTORY_CACHE_ENABLED:
+            # Pesan yang sudah masuk cache harus dibuang jika transaksi gagal di-commit
+            unit_of_work.on_rollback(lambda: get_chat_history_cache().invalidate(self.room_id))
 
     @property
     async def messages(self) -> List[BaseMessage]:
         """Ambil pesan dari DB dan konversi ke format LangChain."""
+        return await self.get_recent_messages(50)
+
+    async def get_recent_messages(self, limit: int) -> List[BaseMessage]:
+        """
+        Ambil `limit` pesan terakhir (lama ke baru). Jendela dipush-down ke SQL
+        (ORDER BY ... LIMIT), dan hasilnya dilayani dari cache per room bila tersedia
+        (divalidasi dengan message_id terbaru room, lihat CHAT_HISTORY_CACHE_VALIDATE).
+        """
+        cache = get_chat_history_cache() if config.CHAT_HISTORY_CACHE_ENABLED else None
+        if cache is not None:
+            latest_id = (
+                await crud.get_latest_message_id(self.session, self.room_id) if config.CHAT_HISTORY_CACHE_VALIDATE else None
+            )
+            cached = cache.get(self.room_id, limit, latest_message_id=latest_id)
+            if cached is not None:
+                return cached
 
         db_messages_orm: List[models.ChatMessage] = await crud.get_chat_messages_by_room(
-            self.session, self.room_id, limit=50
+            self.session, self.room_id, limit=limit
         )
-
-        items = []
-        for msg_orm in db_messages_orm:
-            try:
-                msg_schema = schemas.ChatMessageRead.from_orm(msg_orm)
-                item = {
-                    "type": "human" if msg_schema.sender == 'user' else "ai",
-                    "data": {
-                        "content": msg_schema.message_text,
-                        "additional_kwargs": {
-                            "message_id": msg_schema.message_id,
-                            "timestamp": msg_schema.timestamp.isoformat() if msg_schema.timestamp else None
-                        },
-                    },
-                }
-                items.append(item)
-            except Exception as e:
-                print(f"Error converting message {msg_orm.message_id} to dict: {e}")
-
-        retrieved_messages = messages_from_dict(items)
+        retrieved_messages = [_to_langchain_message(msg_orm) for msg_orm in db_messages_orm]
+        if cache is not None:
+            cache.put(self.room_id, retrieved_messages, complete=len(db_messages_orm) < limit)
         return retrieved_messages
 
     async def add_message(self, message: BaseMessage) -> Optional[models.ChatMessage]:
@@ -58,26 +82,39 @@ class SQLChatMessageHistory(BaseChatMessageHistory):
             room_id=self.room_id,
             sender=sender,
             message_text=str(message.content),
+            token_user=count_tokens(str(message.content)) if sender == 'user' else None,
             in_reply_to_message_id=reply_to_id
         )
 
         saved_message: Optional[models.ChatMessage] = None
 
         try:
-            saved_message = await crud.create_chat_message(self.session, message_to_save)
+            if self._unit_of_work is None:
+                saved_message = await crud.create_chat_message(self.session, message_to_save)
+            elif sender == 'user':
+                saved_message = await self._unit_of_work.add_user_message(message_to_save)
+            else:
+                saved_message = await self._unit_of_work.add_chat_message(message_to_save)
 
             if sender == 'user' and saved_message:
                 self._latest_user_message_id = saved_message.message_id
+            if saved_message and config.CHAT_HISTORY_CACHE_ENABLED:
+                # Pesan AI baru punya ID setelah commit unit of work
+                append = lambda: get_chat_history_cache().append(self.room_id, _to_langchain_message(saved_message))
+                if self._unit_of_work is not None:
+                    self._unit_of_work.after_commit(append)
+                else:
+                    append()
 
         except Exception as e:
-            print(f"Error saving message in SQLChatMessageHistory: {e}")
+            logger.error("Error saving message in SQLChatMessageHistory: %s", e)
 
         return saved_message
 
     async def clear(self) -> None:
         """Hapus semua pesan untuk room ini."""
-        print(f"Clearing history for room_id {self.room_id}...")
+        logger.info("Clearing history for room_id %s", self.room_id)
         # Implementasi penghapusan jika diperlukan (hati-hati!)
         # await self.session.execute(delete(models.ChatMessage).where(models.ChatMessage.room_id == self.room_id))
         # await self.session.commit()
-        print(f"Clear history function called for room_id {self.room_id}.")
\ No newline at end of file
+        logger.info("Clear history function called for room_id %s", self.room_id)
\ No newline at end of file
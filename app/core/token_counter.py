@@ -0,0 +1,148 @@
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Tahap pipeline yang memanggil LLM (urutan = urutan kolom tokens_* di llm_runs)
+TOKEN_STAGES = ("classification", "sql_generation", "reasoning")
+
+TOKEN_SOURCE_PROVIDER = "provider"   # usage metadata dari provider LLM
+TOKEN_SOURCE_ESTIMATE = "estimate"   # hitungan tokenizer lokal
+TOKEN_SOURCE_MIXED = "mixed"
+
+_FALLBACK_ENCODING = "cl100k_base"
+
+@lru_cache(maxsize=32)
+def _encoding_for(model_name: Optional[str]):
+    """
+    Encoding tiktoken untuk model; model non-OpenAI memakai cl100k_base sebagai perkiraan.
+    None jika file BPE tidak bisa dimuat (mis. server tanpa akses internet). Kegagalan
+    ikut di-cache agar unduhan tidak dicoba ulang di setiap panggilan.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name.split("/")[-1]) if model_name else tiktoken.get_encoding(_FALLBACK_ENCODING)
+        except KeyError:
+            return tiktoken.get_encoding(_FALLBACK_ENCODING)
+    except Exception as e:
+        logger.warning("Tokenizer tiktoken tidak tersedia untuk %s, memakai perkiraan karakter: %s", model_name or _FALLBACK_ENCODING, e)
+        return None
+
+def warm_tokenizer() -> bool:
+    """Muat encoding default saat startup; False jika hanya perkiraan karakter yang tersedia."""
+    return _encoding_for(None) is not None
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Hitung token secara lokal; jika tokenizer tidak tersedia pakai perkiraan ±4 karakter/token."""
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+@dataclass
+class TokenUsage:
+    prompt_tokens: int
+    completion_tokens: int
+    source: str
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+def _provider_usage(response: Any) -> Optional[TokenUsage]:
+    """Ambil usage dari `usage_metadata` LangChain, atau `token_usage` gaya OpenAI di response_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("input_tokens") is not None:
+        return TokenUsage(int(usage["input_tokens"]), int(usage.get("output_tokens") or 0), TOKEN_SOURCE_PROVIDER)
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        return TokenUsage(
+            int(token_usage["prompt_tokens"]), int(token_usage.get("completion_tokens") or 0), TOKEN_SOURCE_PROVIDER
+        )
+    return None
+
+def usage_from_response(
+    response: Any,
+    prompt: str,
+    completion: Optional[str] = None,
+    model_name: Optional[str] = None,
+) -> TokenUsage:
+    """Usage dari provider jika ada; selain itu hitung prompt & completion dengan tokenizer lokal."""
+    usage = _provider_usage(response) if response is not None else None
+    if usage is not None:
+        return usage
+    if completion is None:
+        completion = str(getattr(response, "content", "") or "")
+    return TokenUsage(count_tokens(prompt, model_name), count_tokens(completion, model_name), TOKEN_SOURCE_ESTIMATE)
+
+class TokenLedger:
+    """Akumulasi usage per tahap untuk satu request (klasifikasi, generasi SQL, reasoning)."""
+    def __init__(self):
+        self.stages: Dict[str, TokenUsage] = {}
+
+    def record(self, stage: str, usage: TokenUsage) -> None:
+        previous = self.stages.get(stage)
+        if previous is not None:
+            # Tahap yang sama dipanggil lebih dari sekali (retry): jumlahkan
+            source = previous.source if previous.source == usage.source else TOKEN_SOURCE_MIXED
+            usage = TokenUsage(
+                previous.prompt_tokens + usage.prompt_tokens,
+                previous.completion_tokens + usage.completion_tokens,
+                source,
+            )
+        self.stages[stage] = usage
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        return sum(usage.total_tokens for usage in self.stages.values()) if self.stages else None
+
+    @property
+    def source(self) -> Optional[str]:
+        sources = {usage.source for usage in self.stages.values()}
+        if not sources:
+            return None
+        return sources.pop() if len(sources) == 1 else TOKEN_SOURCE_MIXED
+
+    def as_columns(self) -> Dict[str, Any]:
+        """Field LLMRunCreate: tokens_<tahap>_prompt/completion, token_llm, token_source."""
+        columns: Dict[str, Any] = {}
+        for stage in TOKEN_STAGES:
+            usage = self.stages.get(stage)
+            columns[f"tokens_{stage}_prompt"] = usage.prompt_tokens if usage else None
+            columns[f"tokens_{stage}_completion"] = usage.completion_tokens if usage else None
+        columns["token_llm"] = self.total_tokens
+        columns["token_source"] = self.source
+        return columns
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Ringkasan untuk respons debug."""
+        return {
+            "stages": {
+                stage: {"prompt": usage.prompt_tokens, "completion": usage.completion_tokens, "source": usage.source}
+                for stage, usage in self.stages.items()
+            },
+            "total": self.total_tokens,
+        }
+
+# Ledger request yang sedang berjalan; task spekulatif mewarisi context yang sama
+_current_ledger: ContextVar[Optional[TokenLedger]] = ContextVar("token_ledger", default=None)
+
+def start_token_ledger() -> TokenLedger:
+    ledger = TokenLedger()
+    _current_ledger.set(ledger)
+    return ledger
+
+def current_token_ledger() -> Optional[TokenLedger]:
+    return _current_ledger.get()
+
+def record_token_usage(stage: str, usage: TokenUsage) -> None:
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record(stage, usage)
@@ -0,0 +1,285 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Protocol
+
+import orjson
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+def elapsed_ms(start_ns: int) -> int:
+    """Latency integer (ms) sejak `time.perf_counter_ns()` tertentu, untuk kolom latency_*_ms."""
+    return (time.perf_counter_ns() - start_ns) // 1_000_000
+
+class Span:
+    """Satu tahap yang diukur dengan `perf_counter_ns` (monotonic, resolusi nanodetik)."""
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[int], span_id: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.end_ns: Optional[int] = None
+        self.start_ns = time.perf_counter_ns()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+            if error is not None:
+                self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ns(self) -> int:
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    @property
+    def duration_ms(self) -> int:
+        return self.duration_ns // 1_000_000
+
+    def to_dict(self, trace_start_ns: int) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start_ns - trace_start_ns) / 1e6, 3),
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class Trace:
+    """Kumpulan span untuk satu request (atau satu pekerjaan background) dengan `request_id`."""
+    def __init__(self, name: str, request_id: str, background: bool = False, **attributes: Any):
+        self.request_id = request_id
+        self.background = background
+        self.wall_time = time.time()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._next_id = 0
+        self.root = self.new_span(name, None, attributes)
+
+    def new_span(self, name: str, parent_id: Optional[int], attributes: Dict[str, Any]) -> Span:
+        self._next_id += 1
+        span = Span(name, parent_id, self._next_id, attributes)
+        if len(self.spans) < config.TRACING_MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+        return span
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ns / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        start_ns = self.root.start_ns
+        return {
+            "request_id": self.request_id,
+            "name": self.root.name,
+            "background": self.background,
+            "timestamp": self.wall_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "error": self.root.error,
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict(start_ns) for span in self.spans],
+        }
+
+class TraceExporter(Protocol):
+    def export(self, trace: Trace) -> None: ...
+
+class RingBufferExporter:
+    """Menyimpan N trace terakhir di memori untuk endpoint debug."""
+    def __init__(self, max_traces: int = config.TRACING_RING_BUFFER_SIZE):
+        self._traces: deque = deque(maxlen=max_traces)
+
+    def export(self, trace: Trace) -> None:
+        self._traces.append(trace)
+
+    def recent(self, limit: int = 20) -> List[Trace]:
+        return list(self._traces)[-limit:][::-1]
+
+    def slowest(self, limit: int = 20, include_background: bool = False) -> List[Trace]:
+        traces = (t for t in list(self._traces) if include_background or not t.background)
+        return heapq.nlargest(limit, traces, key=lambda t: t.root.duration_ns)
+
+    def find(self, request_id: str) -> Optional[Trace]:
+        return next((t for t in reversed(list(self._traces)) if t.request_id == request_id), None)
+
+class JsonLinesExporter:
+    """
+    Menulis satu trace per baris JSON ke file. Penulisan dilakukan thread daemon
+    agar I/O file tidak memblokir event loop; antrian penuh berarti trace dibuang.
+    """
+    def __init__(self, path: str = config.TRACING_JSONL_PATH, max_queue_size: int = 1000):
+        self.path = Path(path)
+        self.dropped = 0
+        self._queue: "queue.Queue[bytes]" = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-jsonl-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(orjson.dumps(trace.to_dict(), default=str) + b"\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            lines = [self._queue.get()]
+            while not self._queue.empty() and len(lines) < 256:
+                lines.append(self._queue.get_nowait())
+            try:
+                with self.path.open("ab") as f:
+                    f.writelines(lines)
+            except OSError as e:
+                self.dropped += len(lines)
+                logger.warning("Gagal menulis trace ke %s: %s", self.path, e)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Tracer in-process. Trace dimulai oleh middleware (satu per request HTTP) atau
+    oleh worker background; span di dalamnya otomatis bersarang lewat ContextVar,
+    termasuk di task asyncio yang dibuat dari request (context ikut tersalin).
+    """
+    def __init__(self, exporters: List[TraceExporter]):
+        self.exporters = exporters
+
+    def start_trace(self, name: str, request_id: Optional[str] = None, background: bool = False, **attributes: Any) -> Trace:
+        trace = Trace(name, request_id or new_request_id(), background, **attributes)
+        _current_trace.set(trace)
+        _current_span.set(trace.root)
+        return trace
+
+    def finish(self, trace: Trace, error: Optional[BaseException] = None) -> None:
+        if trace.root.end_ns is not None:
+            return
+        trace.root.end(error)
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.warning("Gagal mengekspor trace %s: %s", trace.request_id, e)
+
+    @contextmanager
+    def trace(self, name: str, background: bool = False, **attributes: Any) -> Iterator[Trace]:
+        """Trace mandiri untuk pekerjaan di luar request (mis. flush writer background)."""
+        trace_token = _current_trace.set(None)
+        span_token = _current_span.set(None)
+        trace = self.start_trace(name, background=background, **attributes)
+        try:
+            yield trace
+        except BaseException as e:
+            self.finish(trace, e)
+            raise
+        else:
+            self.finish(trace)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    async def wrap_body(self, trace: Trace, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Akhiri trace setelah body (termasuk SSE) selesai dikirim, bukan saat header dikirim."""
+        # Span dibuat manual (tanpa ContextVar): generator bisa dilanjutkan dari context lain
+        send_span = trace.new_span("response.send", trace.root.span_id, {})
+        error: Optional[BaseException] = None
+        size = 0
+        try:
+            async for chunk in body:
+                size += len(chunk)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            send_span.set(bytes=size)
+            send_span.end(error)
+            self.finish(trace, error)
+
+    def ring_buffer(self) -> Optional[RingBufferExporter]:
+        return next((e for e in self.exporters if isinstance(e, RingBufferExporter)), None)
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Ukur satu tahap sebagai span anak dari span aktif. Di luar trace, span tetap
+    mengukur durasi (dipakai untuk kolom latency) tetapi tidak disimpan.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    if trace is None or trace.root.end_ns is not None:
+        current = Span(name, None, 0, attributes)
+    else:
+        current = trace.new_span(name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+
+def record_span(name: str, start_ns: int, **attributes: Any) -> None:
+    """
+    Catat span yang sudah selesai (mulai `start_ns`, berakhir sekarang) tanpa mengubah
+    span aktif; untuk bagian async generator yang melakukan `yield` di tengah pengukuran.
+    """
+    trace = _current_trace.get()
+    if trace is None or trace.root.end_ns is not None:
+        return
+    parent = _current_span.get()
+    recorded = trace.new_span(name, parent.span_id if parent else None, attributes)
+    recorded.start_ns = start_ns
+    recorded.end()
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+def _build_exporters() -> List[TraceExporter]:
+    exporters: List[TraceExporter] = []
+    for name in (e.strip().lower() for e in config.TRACING_EXPORTERS.split(",")):
+        if name == "memory":
+            exporters.append(RingBufferExporter())
+        elif name == "jsonl":
+            exporters.append(JsonLinesExporter())
+        elif name:
+            raise ValueError(f"Exporter trace tidak dikenal: {name}. Pilihan: memory, jsonl.")
+    return exporters
+
+@lru_cache(maxsize=1)
+def get_tracer() -> Tracer:
+    """Mengembalikan tracer SINGLETON dengan exporter dari TRACING_EXPORTERS."""
+    tracer = Tracer(_build_exporters())
+    logger.info("Tracer ready (exporters: %s)", config.TRACING_EXPORTERS)
+    return tracer
+
+def background_trace(name: str, **attributes: Any):
+    """Trace untuk satu unit kerja background (flush writer); no-op jika tracing mati."""
+    if not config.TRACING_ENABLED:
+        return nullcontext()
+    return get_tracer().trace(name, background=True, **attributes)
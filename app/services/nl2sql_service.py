@@ -1,5 +1,8 @@
-from ..core.security.sql_validator import sanitize_sql_output, is_safe_select_query
-from ..core.db_executor import execute_select_query
+import logging
+from ..core.security.sql_validator import validate_sql
+from ..core.schema_catalog import get_schema_catalog
+from ..core.db_executor import execute_select_query_stream, QueryResult
+from ..core.cost_guard import QueryCostExceededError, COST_GUARD_REJECT
 from ..core.retriever_provider import get_schema_retriever
 from ..core.promts.nl2sql import (
     QUESTION_CLASSIFICATION_PROMT,
@@ -10,15 +13,49 @@ from ..core.promts.nl2sql import (
     REASONING_CONVERSTATION_PROMPT,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any, cast
-from ..adapters.llm.llm_factory import get_llm_adapter
+from typing import Dict, Any, Optional, Callable, Awaitable, AsyncIterator, cast
+from ..adapters.llm.llm_factory import get_llm_adapter, get_llm_registry, get_provider_name
 from ..adapters.db import crud, schemas
+from ..adapters.db.unit_of_work import UnitOfWork
+from ..adapters.db.telemetry_writer import get_telemetry_writer
 from fastapi import BackgroundTasks
-from datetime import datetime
-from ..adapters.vector_store.qdrant_adapter import add_message_vector
-from ..core.embedding_provider import get_embedding_model
+import asyncio
+import time
+from ..adapters.vector_store.message_vector_writer import get_message_vector_writer
 from ..core.sql_chat_history import SQLChatMessageHistory 
+from ..core.answer_cache import (
+    ANSWER_SCOPE_DATA,
+    ANSWER_SCOPE_REASONING,
+    CacheKey,
+    CachedAnswer,
+    fingerprint_data,
+    get_answer_cache,
+)
+from ..core.result_summarizer import summarize_result
+from ..core.metrics import REQUESTS, observe_stage_latencies
+from ..core.tracing import elapsed_ms, record_span, span
+from ..core.token_counter import (
+    count_tokens,
+    current_token_ledger,
+    record_token_usage,
+    start_token_ledger,
+    usage_from_response,
+)
+from ..core.answer_templates import (
+    render_template_answer,
+    REASONING_PATH_LLM,
+    REASONING_PATH_TEMPLATE,
+    REASONING_PATH_CACHE,
+    REASONING_PATH_EMPTY,
+)
 from langchain_core.messages import HumanMessage, AIMessage
+from app import config
+
+logger = logging.getLogger(__name__)
+
+def _llm_model_name(llm) -> Optional[str]:
+    """Nama model client LangChain (ChatOpenAI: model_name, Gemini: model) untuk pemilihan tokenizer."""
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
 
 class NL2SQLService:
     """
@@ -26,83 +63,276 @@ class NL2SQLService:
     Menggunakan RAG on Schema untuk konteks dinamis dan memiliki penanganan error yang bersih.
     """
     def __init__(self):
-        print("Initializing NL2SQL Service (stateless)...")
+        logger.info("Initializing NL2SQL Service (stateless)...")
         self.schema_retriever = get_schema_retriever() # Ambil retriever untuk skema database dari provider terpusat.
-        print("✅ NL2SQL Service Initialized.")
+        self._answer_cache = get_answer_cache() if config.ANSWER_CACHE_ENABLED else None
+        logger.info("NL2SQL Service initialized")
     
-    async def _measure_time(self, func, *args, **kwargs):
-        """Helper untuk mengukur waktu eksekusi fungsi async."""
-        start = datetime.now()
-        result = await func(*args, **kwargs)
-        end = datetime.now()
-        latency_ms = int((end - start).total_seconds() * 1000)
-        return result, latency_ms
-
-    async def _generate_and_execute_sql(self, nl_query: str, llm) -> tuple[str, list[dict[str, Any]], str, dict]:
+    async def _measure_time(self, span_name: str, func, *args, **kwargs):
+        """Helper untuk mengukur waktu eksekusi fungsi async sebagai span (perf_counter_ns)."""
+        with span(span_name) as stage_span:
+            result = await func(*args, **kwargs)
+        return result, stage_span.duration_ms
+
+    def _record_metrics(
+        self,
+        endpoint_path: str,
+        model_name: str,
+        latencies: Dict[str, Any],
+        total_latency: int,
+        reasoning_path: Optional[str] = None,
+    ) -> None:
+        """Masukkan latency per tahap (label endpoint & model) ke histogram /metrics."""
+        if not config.METRICS_ENABLED:
+            return
+        observe_stage_latencies(endpoint_path, model_name, {**latencies, "total": total_latency})
+        REQUESTS.inc(endpoint_path, model_name, reasoning_path or "none")
+
+    def _enqueue_message_vectors(self, *messages) -> None:
+        """Antrikan pesan tersimpan ke writer vektor batch (tidak memblokir request)."""
+        vector_writer = get_message_vector_writer()
+        for message in messages:
+            if message is not None:
+                vector_writer.enqueue(schemas.ChatMessageRead.from_orm(message))
+
+    async def _invoke_llm(self, llm, prompt: str, stage: Optional[str] = None):
+        """Panggil LLM di dalam slot konkurensi provider-nya; usage token dicatat per `stage`."""
+        with span("llm.invoke", stage=stage, model=_llm_model_name(llm)) as llm_span:
+            async with get_llm_registry().slot(llm):
+                llm_span.set(slot_wait_ms=round((time.perf_counter_ns() - llm_span.start_ns) / 1e6, 3))
+                response = await llm.ainvoke(prompt)
+        if stage is not None:
+            record_token_usage(stage, usage_from_response(response, prompt, model_name=_llm_model_name(llm)))
+        return response
+
+    def _is_speculative(self, speculative: Optional[bool]) -> bool:
+        """Mode spekulatif per request; default mengikuti konfigurasi."""
+        return config.SPECULATIVE_CLASSIFICATION_ENABLED if speculative is None else speculative
+
+    async def _lookup_answer_cache(
+        self, nl_query: str, scope: str = ANSWER_SCOPE_REASONING
+    ) -> tuple[Optional[CacheKey], Optional[CachedAnswer]]:
+        """Cari jawaban di semantic answer cache untuk cakupan endpoint. Mengembalikan (kunci, entry atau None)."""
+        if self._answer_cache is None:
+            return None, None
+        cache_key = await self._answer_cache.build_key(nl_query, scope)
+        cached = self._answer_cache.get(cache_key)
+        logger.info("Answer cache %s", "HIT" if cached is not None else "MISS", extra={"sampled": True})
+        return cache_key, cached
+
+    async def _classify_and_generate(
+        self,
+        llm,
+        classification_prompt: str,
+        is_relevant: Callable[[str], bool],
+        generate_sql: Callable[[], Awaitable[tuple[str, str, dict]]],
+        speculative: bool,
+    ) -> tuple[str, Optional[tuple[str, str]], dict]:
+        """
+        Menjalankan klasifikasi lalu RAG + generasi SQL.
+        Pada mode spekulatif keduanya berjalan bersamaan; cabang generasi dibatalkan
+        jika klasifikasi menolak pertanyaan.
+        Mengembalikan (Hasil Klasifikasi, (SQL, Konteks RAG) atau None jika ditolak, Dictionary Latency).
+        """
+        section_start = time.perf_counter_ns()
+        generation_task = asyncio.create_task(generate_sql()) if speculative else None
+        classification_content, relevant, latencies = await self._classify(
+            llm, classification_prompt, is_relevant, generation_task
+        )
+        if not relevant:
+            return classification_content, None, latencies
+        generated = await self._complete_generation(generate_sql, generation_task, section_start, latencies)
+        return classification_content, generated, latencies
+
+    async def _classify(
+        self,
+        llm,
+        classification_prompt: str,
+        is_relevant: Callable[[str], bool],
+        generation_task: Optional[asyncio.Task] = None,
+    ) -> tuple[str, bool, dict]:
+        """
+        Panggil LLM klasifikasi. Jika ada cabang spekulatif yang sedang berjalan,
+        cabang itu dibatalkan saat klasifikasi gagal atau menolak pertanyaan.
+        Mengembalikan (Hasil Klasifikasi, Relevan?, Dictionary Latency).
+        """
+        latencies: dict = {}
+        try:
+            validation_response, latencies['classification'] = await self._measure_time("classification", self._invoke_llm, llm, classification_prompt, stage="classification")
+            relevant = is_relevant(validation_response.content)
+        except BaseException:
+            if generation_task is not None:
+                generation_task.cancel()
+                await asyncio.gather(generation_task, return_exceptions=True)
+            raise
+
+        if not relevant and generation_task is not None:
+            # Batalkan cabang spekulatif; error di cabang itu tidak relevan lagi
+            generation_task.cancel()
+            await asyncio.gather(generation_task, return_exceptions=True)
+            logger.info("Speculative branch cancelled (classification rejected)")
+        return validation_response.content, relevant, latencies
+
+    async def _complete_generation(
+        self,
+        generate_sql: Callable[[], Awaitable[tuple[str, str, dict]]],
+        generation_task: Optional[asyncio.Task],
+        section_start: int,
+        latencies: dict,
+    ) -> tuple[str, str]:
         """
-        Menjalankan RAG, generasi SQL, validasi, eksekusi, dan mengukur latency.
-        Mengembalikan (SQL, Data Mentah, Konteks RAG, Dictionary Latency).
+        Selesaikan RAG + generasi SQL setelah klasifikasi lolos.
+        Pada mode spekulatif, catat overlap ke latencies['overlap'].
+        Mengembalikan (SQL, Konteks RAG).
+        """
+        if generation_task is None:
+            sanitized_sql, dynamic_context, sql_latencies = await generate_sql()
+            latencies.update(sql_latencies)
+            return sanitized_sql, dynamic_context
+
+        sanitized_sql, dynamic_context, sql_latencies = await generation_task
+        latencies.update(sql_latencies)
+
+        # Overlap = total waktu tiap tahap dikurangi waktu dinding bagian paralel
+        section_latency = elapsed_ms(section_start)
+        stage_sum = latencies['classification'] + latencies.get('rag', 0) + latencies.get('sql_generation', 0)
+        latencies['overlap'] = max(0, stage_sum - section_latency)
+        logger.info("Speculative overlap: %d ms", latencies['overlap'], extra={"sampled": True})
+        return sanitized_sql, dynamic_context
+
+    async def _generate_sql(self, nl_query: str, llm) -> tuple[str, str, dict]:
+        """
+        Menjalankan RAG, generasi SQL, dan validasi (tanpa eksekusi).
+        Mengembalikan (SQL, Konteks RAG, Dictionary Latency).
         """
         latencies = {}
 
         # === LANGKAH 3 (DINAMIS): RAG ON SCHEMA ===
-        rag_result, rag_latency = await self._measure_time(self.schema_retriever.ainvoke, nl_query)
+        rag_result, rag_latency = await self._measure_time("rag", self.schema_retriever.ainvoke, nl_query)
         latencies['rag'] = rag_latency
         retrieved_schema_docs = rag_result
         dynamic_context = "\n".join([doc.page_content for doc in retrieved_schema_docs])
-        print(f"--- RAG Latency: {rag_latency} ms ---")
+        logger.info("RAG latency: %d ms", rag_latency, extra={"sampled": True})
 
         # === LANGKAH 4: GENERATE SQL QUERY ===
         sql_generation_prompt = SQL_PROMPT.format(
             context=dynamic_context,
             nl_query=nl_query
         )
-        sql_response, sql_gen_latency = await self._measure_time(llm.ainvoke, sql_generation_prompt)
+        sql_response, sql_gen_latency = await self._measure_time("sql_generation", self._invoke_llm, llm, sql_generation_prompt, stage="sql_generation")
         latencies['sql_generation'] = sql_gen_latency
-        print(f"--- SQL Gen Latency: {sql_gen_latency} ms ---")
+        logger.info("SQL generation latency: %d ms", sql_gen_latency, extra={"sampled": True})
 
         # === LANGKAH 5 & 6: SANITASI DAN VALIDASI ===
-        sanitized_sql = sanitize_sql_output(sql_response.content)
-        if not is_safe_select_query(sanitized_sql):
-            raise ValueError("Kueri yang dihasilkan tidak aman dan telah diblokir.")
+        sanitized_sql = self._validate_generated_sql(sql_response.content)
+
+        return sanitized_sql, dynamic_context, latencies
+
+    def _validate_generated_sql(self, raw_sql: str) -> str:
+        """
+        Validasi keamanan lalu cek tabel/kolom terhadap katalog skema, sebelum
+        koneksi DB diambil. Kolom yang salah ketik gagal cepat sebagai ValueError (400).
+        """
+        with span("sql.validate"):
+            validation = validate_sql(raw_sql)
+            if not validation.is_safe:
+                raise ValueError(f"Kueri yang dihasilkan tidak aman dan telah diblokir: {validation.reason}")
+            if not config.SCHEMA_CATALOG_ENABLED:
+                return validation.sql
+            return get_schema_catalog().check(validation)
+
+    def _run_context(self, user_msg_id: int, model_name: str, endpoint_path: str, dynamic_context: str) -> Dict[str, Any]:
+        """Field dasar llm_runs yang sudah diketahui sebelum eksekusi SQL."""
+        return dict(
+            user_message_id=user_msg_id,
+            endpoint_path=endpoint_path,
+            llm_model_used=model_name,
+            llm_provider_user=get_provider_name(model_name),
+            retrieved_context_knowledge=dynamic_context,
+            **(ledger.as_columns() if (ledger := current_token_ledger()) is not None else {}),
+        )
 
-        # === LANGKAH 7: EKSEKUSI KUERI ===
+    async def _log_cost_rejection(
+        self,
+        uow: UnitOfWork,
+        sanitized_sql: str,
+        run_context: Dict[str, Any],
+        error: QueryCostExceededError,
+    ) -> None:
+        """Catat kueri yang ditolak cost guard ke llm_runs lewat unit of work (ikut commit saat blok berakhir dengan error)."""
+        llm_run_schema = schemas.LLMRunCreate(
+            **run_context,
+            generated_sql=sanitized_sql,
+            is_success=False,
+            estimated_rows_examined=error.estimate.rows_examined,
+            cost_guard_action=COST_GUARD_REJECT,
+        )
+        try:
+            await uow.add_llm_run(llm_run_schema)
+        except Exception as log_e:
+            logger.error("Gagal mencatat penolakan cost guard: %s", log_e)
+
+    async def _execute_sql(
+        self,
+        sanitized_sql: str,
+        uow: Optional[UnitOfWork] = None,
+        run_context: Optional[Dict[str, Any]] = None,
+    ) -> tuple[QueryResult, int]:
+        """
+        Eksekusi SQL yang sudah tervalidasi (streaming, dibatasi baris/byte) dan ukur latency-nya.
+        Penolakan cost guard diteruskan sebagai ValueError (400) dan dicatat jika `run_context` diberikan.
+        """
         try:
             # Ukur waktu eksekusi query secara terpisah
-            sql_exec_start = datetime.now()
-            data_raw = await execute_select_query(sanitized_sql)
-            sql_exec_end = datetime.now()
-            latencies['sql_execution'] = int((sql_exec_end - sql_exec_start).total_seconds() * 1000)
-            print(f"--- SQL Exec Latency: {latencies['sql_execution']} ms ---")
-            
-            # Kembalikan semua hasil termasuk dictionary latencies
-            return sanitized_sql, data_raw, dynamic_context, latencies
+            with span("sql.execute") as exec_span:
+                query_result = await execute_select_query_stream(sanitized_sql)
+                exec_span.set(row_count=query_result.row_count, truncated=query_result.truncated)
+            sql_exec_latency = exec_span.duration_ms
+            logger.info("SQL exec latency: %d ms", sql_exec_latency, extra={"sampled": True})
+            return query_result, sql_exec_latency
+        except QueryCostExceededError as e:
+            if uow is not None and run_context is not None:
+                await self._log_cost_rejection(uow, sanitized_sql, run_context, e)
+            raise
         except Exception as e:
             raise RuntimeError(f"Gagal mengeksekusi SQL: {e}")
+
+    def _template_answer(self, query_result: QueryResult, sql: str) -> Optional[str]:
+        """Jawaban template untuk hasil sederhana (None = tetap pakai LLM reasoning)."""
+        if not config.ANSWER_TEMPLATES_ENABLED:
+            return None
+        return render_template_answer(query_result, sql=sql)
+
+    def _result_metadata(self, query_result: QueryResult) -> Dict[str, Any]:
+        """Metadata hasil kueri untuk respons API."""
+        return {
+            "columns": query_result.columns,
+            "truncated": query_result.truncated,
+            "row_count": query_result.row_count,
+            "row_count_exact": query_result.row_count_exact,
+        }
         
-    async def _generate_and_execute_sql_with_history(
+    async def _generate_sql_with_history(
         self,
         nl_query: str,
         llm,
-        conversation_history: str # Tambahkan parameter history
-    ) -> tuple[str, list[dict[str, Any]], str, dict]:
+        conversation_history: str
+    ) -> tuple[str, str, dict]:
         """
-        Versi helper yang menerima chat history.
-        Mengembalikan (SQL, Data Mentah, Konteks RAG, Dictionary Latency).
+        Versi _generate_sql yang menerima chat history.
+        Mengembalikan (SQL, Konteks RAG, Dictionary Latency).
         """
         latencies = {}
         
-        print(f"====yahoooo")
-        print(conversation_history)
+        logger.debug("Conversation history untuk generasi SQL:\n%s", conversation_history)
 
         # RAG (tetap sama)
-        rag_result, rag_latency = await self._measure_time(self.schema_retriever.ainvoke, nl_query)
+        rag_result, rag_latency = await self._measure_time("rag", self.schema_retriever.ainvoke, nl_query)
         latencies['rag'] = rag_latency
         dynamic_context = "\n".join([doc.page_content for doc in rag_result])
-        print(f"--- RAG Context Provided to LLM ---") # Log Awal
-        print(dynamic_context)                         # Cetak Konteksnya
-        print(f"------------------------------------") # Log Akhir
-        print(f"--- RAG Latency: {rag_latency} ms ---")
+        # Konteks RAG bisa puluhan KB, hanya ditulis di level DEBUG
+        logger.debug("RAG context provided to LLM:\n%s", dynamic_context)
+        logger.info("RAG latency: %d ms", rag_latency, extra={"sampled": True})
 
         # SQL Gen (gunakan history dan prompt conversation)
         sql_generation_prompt = SQL_CONVERSTATION_PROMPT.format(
@@ -110,25 +340,14 @@ class NL2SQLService:
             context=dynamic_context,
             nl_query=nl_query,
         )
-        sql_response, sql_gen_latency = await self._measure_time(llm.ainvoke, sql_generation_prompt)
+        sql_response, sql_gen_latency = await self._measure_time("sql_generation", self._invoke_llm, llm, sql_generation_prompt, stage="sql_generation")
         latencies['sql_generation'] = sql_gen_latency
-        print(f"--- SQL Gen Latency: {sql_gen_latency} ms ---")
+        logger.info("SQL generation latency: %d ms", sql_gen_latency, extra={"sampled": True})
 
         # Sanitasi & Validasi (tetap sama)
-        sanitized_sql = sanitize_sql_output(sql_response.content)
-        if not is_safe_select_query(sanitized_sql):
-            raise ValueError("Kueri yang dihasilkan tidak aman dan telah diblokir.")
+        sanitized_sql = self._validate_generated_sql(sql_response.content)
 
-        # Eksekusi (tetap sama)
-        try:
-            sql_exec_start = datetime.now()
-            data_raw = await execute_select_query(sanitized_sql)
-            sql_exec_end = datetime.now()
-            latencies['sql_execution'] = int((sql_exec_end - sql_exec_start).total_seconds() * 1000)
-            print(f"--- SQL Exec Latency: {latencies['sql_execution']} ms ---")
-            return sanitized_sql, data_raw, dynamic_context, latencies
-        except Exception as e:
-            raise RuntimeError(f"Gagal mengeksekusi SQL: {e}")
+        return sanitized_sql, dynamic_context, latencies
 
     async def execute_flow(
         self,
@@ -141,92 +360,134 @@ class NL2SQLService:
         endpoint_path: str,
         db_session: AsyncSession,
         background_tasks: BackgroundTasks,
+        speculative: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Generate Query, Get Data, Reasoning, dan log ke DB & Qdrant di background.
         """
-        start_flow_time = datetime.now()
+        start_flow_time = time.perf_counter_ns()
         overall_latencies = {}
+        token_ledger = start_token_ledger()
 
         llm = get_llm_adapter(model_name=model_name)
 
-        # === Simpan Pesan User (Foreground - dapatkan ID dan objek tersimpan) ===
-        user_message_schema = schemas.ChatMessageCreate(
-            room_id=room_id, sender='user', message_text=nl_query
-        )
-        saved_user_message = await crud.create_chat_message(db_session, user_message_schema)
-        user_msg_id = cast(int, saved_user_message.message_id)
-
-        # === LANGKAH 1 & 2: KLASIFIKASI & VALIDASI ===
-        validation_response, classification_latency = await self._measure_time(llm.ainvoke, QUESTION_CLASSIFICATION_PROMT.format(nl_query=nl_query))
-        overall_latencies['classification'] = classification_latency
-        if "data_perusahaan" not in validation_response.content.lower():
-            raise ValueError("Pertanyaan tidak relevan dengan data perusahaan.")
-
-        # === LANGKAH 3-7: RAG, SQL GEN, VALIDASI, EKSEKUSI ===
-        sanitized_sql, data_raw, dynamic_context, sql_latencies = await self._generate_and_execute_sql(nl_query, llm)
-        overall_latencies.update(sql_latencies)
-
-        # === LANGKAH 8: REASONING ===
-        reasoning = "Kueri berhasil dieksekusi tetapi tidak menghasilkan data."
-        reasoning_latency = 0
-        if data_raw:
-             # ✅ Gunakan PromptTemplate yang baru
-             reasoning_prompt_formatted = REASONING_PROMPT.format(
-                 nl_query=nl_query,
-                 data_raw=str(data_raw)[:2500] # Tetap potong data jika perlu
-             )
-             reasoning_response, reasoning_latency = await self._measure_time(llm.ainvoke, reasoning_prompt_formatted)
-             reasoning = reasoning_response.content
-        overall_latencies['reasoning'] = reasoning_latency
-
-        # === Simpan Jawaban AI (Foreground - agar dapat objek untuk Qdrant) ===
-        ai_message_schema = schemas.ChatMessageCreate(
-            room_id=room_id, sender='ai', message_text=reasoning, in_reply_to_message_id=user_msg_id
-        )
-        # Simpan ke MySQL dan dapatkan objek yang sudah disimpan
-        saved_ai_message = await crud.create_chat_message(db_session, ai_message_schema)
+        async with UnitOfWork(db_session) as uow:
+            # === Simpan Pesan User (Foreground - dapatkan ID dan objek tersimpan) ===
+            user_message_schema = schemas.ChatMessageCreate(
+                room_id=room_id, sender='user', message_text=nl_query, token_user=count_tokens(nl_query)
+            )
+            saved_user_message = await uow.add_user_message(user_message_schema)
+            user_msg_id = cast(int, saved_user_message.message_id)
+
+            # === LANGKAH 0: SEMANTIC ANSWER CACHE ===
+            cache_key, cached = await self._lookup_answer_cache(nl_query)
+
+            if cached is not None:
+                # Cache hit: lewati klasifikasi, RAG, dan generasi SQL
+                sanitized_sql, dynamic_context = cached.sql, cached.dynamic_context
+                overall_latencies.update(classification=0, rag=0, sql_generation=0)
+                if cached.data_raw is not None:
+                    query_result, overall_latencies['sql_execution'] = QueryResult.from_rows(cached.data_raw), 0
+                else:
+                    query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                        sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                    )
+            else:
+                # === LANGKAH 1-6: KLASIFIKASI, RAG, SQL GEN, VALIDASI (opsional spekulatif) ===
+                _, generated, stage_latencies = await self._classify_and_generate(
+                    llm,
+                    QUESTION_CLASSIFICATION_PROMT.format(nl_query=nl_query),
+                    is_relevant=lambda result: "data_perusahaan" in result.lower(),
+                    generate_sql=lambda: self._generate_sql(nl_query, llm),
+                    speculative=self._is_speculative(speculative),
+                )
+                overall_latencies.update(stage_latencies)
+                if generated is None:
+                    raise ValueError("Pertanyaan tidak relevan dengan data perusahaan.")
+                sanitized_sql, dynamic_context = generated
+
+                # === LANGKAH 7: EKSEKUSI KUERI ===
+                query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                    sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                )
+            data_raw = query_result.rows
 
-        # === PERSIAPAN LOG (Sekarang menyertakan latency per langkah) ===
-        end_flow_time = datetime.now()
-        total_latency = int((end_flow_time - start_flow_time).total_seconds() * 1000)
-        provider = "Gemini" if "Google/gemini-2.5-flash" in model_name.lower() else model_name
+            # === LANGKAH 8: REASONING ===
+            reasoning = "Kueri berhasil dieksekusi tetapi tidak menghasilkan data."
+            reasoning_latency = 0
+            reasoning_path = REASONING_PATH_EMPTY
+            reasoning_reused = cached is not None and cached.reasoning is not None and (
+                cached.data_raw is not None or cached.data_fingerprint == fingerprint_data(data_raw)
+            )
+            templated = None if reasoning_reused or not data_raw else self._template_answer(query_result, sanitized_sql)
+            if reasoning_reused:
+                # Data sama dengan saat reasoning disimpan, reasoning boleh dipakai ulang
+                reasoning = cast(str, cached.reasoning)
+                reasoning_path = REASONING_PATH_CACHE
+            elif templated is not None:
+                # Hasil sederhana (skalar/satu baris/peringkat kecil): tanpa panggilan LLM
+                reasoning, reasoning_path = templated, REASONING_PATH_TEMPLATE
+            elif data_raw:
+                 reasoning_path = REASONING_PATH_LLM
+                 # ✅ Gunakan PromptTemplate yang baru
+                 reasoning_prompt_formatted = REASONING_PROMPT.format(
+                     nl_query=nl_query,
+                     data_raw=summarize_result(query_result) # Profil ringkas hasil kueri, bukan potongan str()
+                 )
+                 reasoning_response, reasoning_latency = await self._measure_time("reasoning", self._invoke_llm, llm, reasoning_prompt_formatted, stage="reasoning")
+                 reasoning = reasoning_response.content
+            overall_latencies['reasoning'] = reasoning_latency
 
-        if user_msg_id:
-            llm_run_schema = schemas.LLMRunCreate(
-                user_message_id=user_msg_id,
-                generated_sql=sanitized_sql,
-                retrieved_context_knowledge=dynamic_context,
-                llm_model_used=model_name,
-                llm_provider_user=provider,
-                latency_total_ms=total_latency,
-                endpoint_path=endpoint_path,
-                latency_classification_ms=overall_latencies.get('classification'),
-                latency_rag_ms=overall_latencies.get('rag'),
-                latency_sql_generation_ms=overall_latencies.get('sql_generation'),
-                latency_sql_execution_ms=overall_latencies.get('sql_execution'),
-                latency_reasoning_ms=overall_latencies.get('reasoning'),
-                is_success=True
+            if cache_key is not None and not reasoning_reused:
+                self._answer_cache.put(cache_key, sanitized_sql, dynamic_context, data_raw, reasoning)
+
+            # === Simpan Jawaban AI (Foreground - agar dapat objek untuk Qdrant) ===
+            ai_message_schema = schemas.ChatMessageCreate(
+                room_id=room_id, sender='ai', message_text=reasoning, in_reply_to_message_id=user_msg_id
             )
+            # Simpan ke MySQL dan dapatkan objek yang sudah disimpan
+            saved_ai_message = await uow.add_chat_message(ai_message_schema)
 
-            # Task untuk menyimpan log LLM Run (MySQL)
-            background_tasks.add_task(crud.create_llm_run, db_session, llm_run_schema)
+            # === PERSIAPAN LOG (Sekarang menyertakan latency per langkah) ===
+            total_latency = elapsed_ms(start_flow_time)
+            self._record_metrics(endpoint_path, model_name, overall_latencies, total_latency, reasoning_path)
+            provider = get_provider_name(model_name)
 
-            # Dapatkan embedding model sekali untuk background tasks
-            shared_embeddings = get_embedding_model()
+            if user_msg_id:
+                llm_run_schema = schemas.LLMRunCreate(
+                    user_message_id=user_msg_id,
+                    generated_sql=sanitized_sql,
+                    retrieved_context_knowledge=dynamic_context,
+                    llm_model_used=model_name,
+                    llm_provider_user=provider,
+                    latency_total_ms=total_latency,
+                    endpoint_path=endpoint_path,
+                    latency_classification_ms=overall_latencies.get('classification'),
+                    latency_rag_ms=overall_latencies.get('rag'),
+                    latency_sql_generation_ms=overall_latencies.get('sql_generation'),
+                    latency_sql_execution_ms=overall_latencies.get('sql_execution'),
+                    latency_reasoning_ms=overall_latencies.get('reasoning'),
+                    latency_overlap_ms=overall_latencies.get('overlap'),
+                    is_cache_hit=cached is not None,
+                    reasoning_path=reasoning_path,
+                    estimated_rows_examined=query_result.estimated_rows_examined,
+                    cost_guard_action=query_result.cost_guard_action,
+                    **token_ledger.as_columns(),
+                    is_success=True
+                )
+
+                # Log LLM Run (MySQL): background task di mode per_write, satu transaksi di mode unit_of_work
+                await uow.add_llm_run(llm_run_schema, background_tasks)
 
-            if saved_user_message:
-                print(f"save question from user to qdrant")
-                user_msg_read_schema = schemas.ChatMessageRead.from_orm(saved_user_message)
-                background_tasks.add_task(add_message_vector, user_msg_read_schema, shared_embeddings)
-            if saved_ai_message:
-                print(f"save answer from ai to qdrant")
-                ai_msg_read_schema = schemas.ChatMessageRead.from_orm(saved_ai_message)
-                background_tasks.add_task(add_message_vector, ai_msg_read_schema, shared_embeddings)
-        else:
-            print("Warning: user_msg_id is None, skipping LLM run logging.")
+                # Antrikan vektor pesan ke writer batch Qdrant setelah data tersimpan
+                uow.after_commit(lambda: self._enqueue_message_vectors(saved_user_message, saved_ai_message))
+            else:
+                logger.warning("user_msg_id is None, skipping LLM run logging")
 
-        return {"query": sanitized_sql, "data_raw": data_raw, "reasoning": reasoning}
+            return {
+                "query": sanitized_sql, "data_raw": data_raw, "reasoning": reasoning,
+                **self._result_metadata(query_result), "token_usage": token_ledger.as_dict(),
+            }
     
     async def generate_sql_and_data(
         self,
@@ -239,61 +500,102 @@ class NL2SQLService:
         endpoint_path: str,
         db_session: AsyncSession,
         background_tasks: BackgroundTasks,
+        speculative: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Generate Query and Get Data Only
         """
 
-        start_flow_time = datetime.now()
+        start_flow_time = time.perf_counter_ns()
         overall_latencies = {} # Dictionary untuk menyimpan semua latency
+        token_ledger = start_token_ledger()
 
         llm = get_llm_adapter(model_name=model_name)
-        
-        user_message_schema = schemas.ChatMessageCreate(
-            room_id=room_id, sender='user', message_text=nl_query
-        )
-        saved_user_message = await crud.create_chat_message(db_session, user_message_schema)
-        user_msg_id = cast(int, saved_user_message.message_id)
-        
-        # Validasi prompt
-        validation_prompt = QUESTION_CLASSIFICATION_PROMT.format(nl_query=nl_query) # Pastikan nama prompt benar
-        validation_response, classification_latency = await self._measure_time(llm.ainvoke, validation_prompt)
-        overall_latencies['classification'] = classification_latency
-        print(f"--- Classification Latency: {classification_latency} ms ---")
-        if "data_perusahaan" not in validation_response.content.lower():
-            raise ValueError("Pertanyaan tidak relevan dengan data perusahaan.")
-        
-        sanitized_sql, data_raw, dynamic_context, sql_latencies = await self._generate_and_execute_sql(nl_query, llm)
-        overall_latencies.update(sql_latencies)
-        end_flow_time = datetime.now()
-        total_latency = int((end_flow_time - start_flow_time).total_seconds() * 1000)
-        provider = "Gemini" if "gemini" in model_name.lower() else "OpenRouter"
 
-        llm_run_schema = schemas.LLMRunCreate(
-            user_message_id=user_msg_id,
-            generated_sql=sanitized_sql,
-            retrieved_context_knowledge=dynamic_context,
-            llm_model_used=model_name,
-            llm_provider_user=provider,
-            is_success=True,
-            endpoint_path=endpoint_path,
-            latency_total_ms=total_latency,
-            latency_classification_ms=overall_latencies.get('classification'),
-            latency_rag_ms=overall_latencies.get('rag'),
-            latency_sql_generation_ms=overall_latencies.get('sql_generation'),
-            latency_sql_execution_ms=overall_latencies.get('sql_execution')
-        )
+        async with UnitOfWork(db_session) as uow:
+            user_message_schema = schemas.ChatMessageCreate(
+                room_id=room_id, sender='user', message_text=nl_query, token_user=count_tokens(nl_query)
+            )
+            saved_user_message = await uow.add_user_message(user_message_schema)
+            user_msg_id = cast(int, saved_user_message.message_id)
+
+            cache_key, cached = await self._lookup_answer_cache(nl_query, ANSWER_SCOPE_DATA)
+            if cached is not None:
+                # Cache hit: tidak ada panggilan LLM sama sekali
+                sanitized_sql, dynamic_context = cached.sql, cached.dynamic_context
+                overall_latencies.update(classification=0, rag=0, sql_generation=0)
+                if cached.data_raw is not None:
+                    query_result, overall_latencies['sql_execution'] = QueryResult.from_rows(cached.data_raw), 0
+                else:
+                    query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                        sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                    )
+            else:
+                # Validasi prompt
+                validation_prompt = QUESTION_CLASSIFICATION_PROMT.format(nl_query=nl_query) # Pastikan nama prompt benar
+                _, generated, stage_latencies = await self._classify_and_generate(
+                    llm,
+                    validation_prompt,
+                    is_relevant=lambda result: "data_perusahaan" in result.lower(),
+                    generate_sql=lambda: self._generate_sql(nl_query, llm),
+                    speculative=self._is_speculative(speculative),
+                )
+                overall_latencies.update(stage_latencies)
+                logger.info("Classification latency: %d ms", overall_latencies['classification'], extra={"sampled": True})
+                if generated is None:
+                    raise ValueError("Pertanyaan tidak relevan dengan data perusahaan.")
+                sanitized_sql, dynamic_context = generated
+
+                query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                    sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                )
+                if cache_key is not None:
+                    self._answer_cache.put(cache_key, sanitized_sql, dynamic_context, query_result.rows)
+            data_raw = query_result.rows
+            total_latency = elapsed_ms(start_flow_time)
+            self._record_metrics(endpoint_path, model_name, overall_latencies, total_latency)
+            provider = get_provider_name(model_name)
 
-        ai_message_schema = schemas.ChatMessageCreate(
-            room_id=room_id, sender='ai', message_text="Berikut adalah hasil data yang Anda minta.", in_reply_to_message_id=user_msg_id
-        )
+            llm_run_schema = schemas.LLMRunCreate(
+                user_message_id=user_msg_id,
+                generated_sql=sanitized_sql,
+                retrieved_context_knowledge=dynamic_context,
+                llm_model_used=model_name,
+                llm_provider_user=provider,
+                is_success=True,
+                endpoint_path=endpoint_path,
+                latency_total_ms=total_latency,
+                latency_classification_ms=overall_latencies.get('classification'),
+                latency_rag_ms=overall_latencies.get('rag'),
+                latency_sql_generation_ms=overall_latencies.get('sql_generation'),
+                latency_sql_execution_ms=overall_latencies.get('sql_execution'),
+                latency_overlap_ms=overall_latencies.get('overlap'),
+                is_cache_hit=cached is not None,
+                estimated_rows_examined=query_result.estimated_rows_examined,
+                cost_guard_action=query_result.cost_guard_action,
+                **token_ledger.as_columns(),
+            )
+
+            ai_message_schema = schemas.ChatMessageCreate(
+                room_id=room_id, sender='ai', message_text="Berikut adalah hasil data yang Anda minta.", in_reply_to_message_id=user_msg_id
+            )
 
-        # === BACKGROUND TASK ===
-        background_tasks.add_task(crud.create_llm_run, db_session, llm_run_schema)
-        background_tasks.add_task(crud.create_chat_message, db_session, ai_message_schema)
+            await uow.add_llm_run(llm_run_schema, background_tasks)
+            if config.TELEMETRY_WRITER_ENABLED:
+                # Pesan AI statis tidak perlu ID di request ini, tulis lewat telemetry writer
+                uow.after_commit(lambda: get_telemetry_writer().enqueue_chat_message(ai_message_schema))
+            elif uow.deferred:
+                # Ditunda bersama llm_runs, commit saat keluar dari unit of work
+                await uow.add_chat_message(ai_message_schema)
+            else:
+                # === BACKGROUND TASK ===
+                background_tasks.add_task(crud.create_chat_message, db_session, ai_message_schema)
 
-        # Kembalikan hanya query dan data mentah
-        return {"query": sanitized_sql, "data_raw": data_raw}
+            # Kembalikan hanya query dan data mentah
+            return {
+                "query": sanitized_sql, "data_raw": data_raw,
+                **self._result_metadata(query_result), "token_usage": token_ledger.as_dict(),
+            }
 
     async def execute_flow_conversation(
         self,
@@ -304,107 +606,354 @@ class NL2SQLService:
         db_session: AsyncSession,
         background_tasks: BackgroundTasks,
         chat_history_string: str,
-        message_history_backend: SQLChatMessageHistory
+        message_history_backend: SQLChatMessageHistory,
+        speculative: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Versi execute_flow yang menggunakan history string & backend MySQL.
         """
-        start_flow_time = datetime.now()
+        start_flow_time = time.perf_counter_ns()
         overall_latencies = {}
+        token_ledger = start_token_ledger()
 
         llm = get_llm_adapter(model_name=model_name)
 
-        # === Simpan Pesan User (Melalui Backend History Langsung) ===
-        user_message_obj = HumanMessage(content=nl_query)
-        saved_user_message = await message_history_backend.add_message(user_message_obj)
-        user_msg_id = saved_user_message.message_id if saved_user_message else None
-
-        try:
-            validation_prompt = QUESTION_CLASSIFICATION_CONVERSTATION_PROMT.format(
-                conversation_history=chat_history_string,
-                nl_query=nl_query
-            )
-            validation_response, classification_latency = await self._measure_time(llm.ainvoke, validation_prompt)
-            overall_latencies['classification'] = classification_latency
-
-            classification_result = validation_response.content.lower()
-            print(f"--- Classification Result: {classification_result} ---")
-
-            if "data_perusahaan" not in classification_result and "lanjutan" not in classification_result:
-                error_msg = f"Pertanyaan diklasifikasikan sebagai '{validation_response.content.strip()}' dan dianggap tidak relevan."
-                await message_history_backend.add_message(AIMessage(content=error_msg))
-                raise ValueError(error_msg)
-
-            # === RAG, SQL GEN (DENGAN HISTORY), VALIDASI, EKSEKUSI ===
-            sanitized_sql, data_raw, dynamic_context, sql_latencies = await self._generate_and_execute_sql_with_history(
-                nl_query, llm, chat_history_string
-            )
-            overall_latencies.update(sql_latencies)
-            print(f"Sanitized SQL: {sanitized_sql}")
+        async with UnitOfWork(db_session) as uow:
+            message_history_backend.use_unit_of_work(uow)
+            # === Simpan Pesan User (Melalui Backend History Langsung) ===
+            user_message_obj = HumanMessage(content=nl_query)
+            saved_user_message = await message_history_backend.add_message(user_message_obj)
+            user_msg_id = saved_user_message.message_id if saved_user_message else None
 
-            # === REASONING (DENGAN HISTORY) ===
-            reasoning = "Kueri berhasil dieksekusi tetapi tidak menghasilkan data."
-            reasoning_latency = 0
-            if data_raw:
-                # Gunakan history string yang diteruskan
-                reasoning_prompt_formatted = REASONING_CONVERSTATION_PROMPT.format(
+            try:
+                validation_prompt = QUESTION_CLASSIFICATION_CONVERSTATION_PROMT.format(
                     conversation_history=chat_history_string,
-                    nl_query=nl_query,
-                    data_raw=str(data_raw)[:2500]
+                    nl_query=nl_query
                 )
-                reasoning_response, reasoning_latency = await self._measure_time(llm.ainvoke, reasoning_prompt_formatted)
-                reasoning = reasoning_response.content
-            overall_latencies['reasoning'] = reasoning_latency
-
-            # === Simpan Jawaban AI (Melalui Backend History Langsung) ===
-            ai_message_obj = AIMessage(content=reasoning)
-            # Gunakan backend history yang diteruskan dan tangkap hasilnya
-            saved_ai_message = await message_history_backend.add_message(ai_message_obj)
-
-            # --- Persiapan & Jadwalkan Log Background Task ---
-            end_flow_time = datetime.now()
-            total_latency = int((end_flow_time - start_flow_time).total_seconds() * 1000)
-            provider = "Gemini" if "gemini" in model_name.lower() else ("Anthropic" if "claude" in model_name.lower() else "OpenRouter")
-
-            if user_msg_id:
-                llm_run_schema = schemas.LLMRunCreate(
-                    user_message_id=user_msg_id, endpoint_path=endpoint_path,
-                    generated_sql=sanitized_sql, retrieved_context_knowledge=dynamic_context,
-                    llm_model_used=model_name, llm_provider_user=provider,
-                    is_success=True, latency_total_ms=total_latency,
-                    latency_classification_ms=overall_latencies.get('classification'),
-                    latency_rag_ms=overall_latencies.get('rag'),
-                    latency_sql_generation_ms=overall_latencies.get('sql_generation'),
-                    latency_sql_execution_ms=overall_latencies.get('sql_execution'),
-                    latency_reasoning_ms=overall_latencies.get('reasoning')
+                # === KLASIFIKASI + RAG, SQL GEN (DENGAN HISTORY), VALIDASI (opsional spekulatif) ===
+                classification_content, generated, stage_latencies = await self._classify_and_generate(
+                    llm,
+                    validation_prompt,
+                    is_relevant=lambda result: "data_perusahaan" in result.lower() or "lanjutan" in result.lower(),
+                    generate_sql=lambda: self._generate_sql_with_history(nl_query, llm, chat_history_string),
+                    speculative=self._is_speculative(speculative),
                 )
+                overall_latencies.update(stage_latencies)
+                logger.info("Classification result: %s", classification_content.lower(), extra={"sampled": True})
+
+                if generated is None:
+                    error_msg = f"Pertanyaan diklasifikasikan sebagai '{classification_content.strip()}' dan dianggap tidak relevan."
+                    await message_history_backend.add_message(AIMessage(content=error_msg))
+                    raise ValueError(error_msg)
+                sanitized_sql, dynamic_context = generated
+
+                # === EKSEKUSI ===
+                query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                    sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                )
+                data_raw = query_result.rows
+                logger.debug("Sanitized SQL: %s", sanitized_sql)
+
+                # === REASONING (DENGAN HISTORY) ===
+                reasoning = "Kueri berhasil dieksekusi tetapi tidak menghasilkan data."
+                reasoning_latency = 0
+                reasoning_path = REASONING_PATH_EMPTY
+                templated = self._template_answer(query_result, sanitized_sql) if data_raw else None
+                if templated is not None:
+                    reasoning, reasoning_path = templated, REASONING_PATH_TEMPLATE
+                elif data_raw:
+                    reasoning_path = REASONING_PATH_LLM
+                    # Gunakan history string yang diteruskan
+                    reasoning_prompt_formatted = REASONING_CONVERSTATION_PROMPT.format(
+                        conversation_history=chat_history_string,
+                        nl_query=nl_query,
+                        data_raw=summarize_result(query_result)
+                    )
+                    reasoning_response, reasoning_latency = await self._measure_time("reasoning", self._invoke_llm, llm, reasoning_prompt_formatted, stage="reasoning")
+                    reasoning = reasoning_response.content
+                overall_latencies['reasoning'] = reasoning_latency
+
+                # === Simpan Jawaban AI (Melalui Backend History Langsung) ===
+                ai_message_obj = AIMessage(content=reasoning)
+                # Gunakan backend history yang diteruskan dan tangkap hasilnya
+                saved_ai_message = await message_history_backend.add_message(ai_message_obj)
+
+                # --- Persiapan & Jadwalkan Log Background Task ---
+                total_latency = elapsed_ms(start_flow_time)
+                self._record_metrics(endpoint_path, model_name, overall_latencies, total_latency, reasoning_path)
+                provider = get_provider_name(model_name)
+
+                if user_msg_id:
+                    llm_run_schema = schemas.LLMRunCreate(
+                        user_message_id=user_msg_id, endpoint_path=endpoint_path,
+                        generated_sql=sanitized_sql, retrieved_context_knowledge=dynamic_context,
+                        llm_model_used=model_name, llm_provider_user=provider,
+                        is_success=True, latency_total_ms=total_latency,
+                        latency_classification_ms=overall_latencies.get('classification'),
+                        latency_rag_ms=overall_latencies.get('rag'),
+                        latency_sql_generation_ms=overall_latencies.get('sql_generation'),
+                        latency_sql_execution_ms=overall_latencies.get('sql_execution'),
+                        latency_reasoning_ms=overall_latencies.get('reasoning'),
+                        latency_overlap_ms=overall_latencies.get('overlap'),
+                        reasoning_path=reasoning_path,
+                        estimated_rows_examined=query_result.estimated_rows_examined,
+                        cost_guard_action=query_result.cost_guard_action,
+                        **token_ledger.as_columns(),
+                    )
+
+                    await uow.add_llm_run(llm_run_schema, background_tasks)
+
+                    uow.after_commit(lambda: self._enqueue_message_vectors(saved_user_message, saved_ai_message))
+                else:
+                    logger.warning("Could not retrieve user message object or ID, skipping LLM run and vector logging")
+
+                # === KEMBALIKAN HASIL ===
+                return {
+                    "query": sanitized_sql, "data_raw": data_raw, "reasoning": reasoning,
+                    **self._result_metadata(query_result), "token_usage": token_ledger.as_dict(),
+                }
+
+            except Exception as e:
+                error_reasoning = f"Terjadi kesalahan saat memproses permintaan: {e}"
+                try:
+                    await message_history_backend.add_message(AIMessage(content=error_reasoning))
+                except Exception as log_e:
+                    logger.error("Failed to log AI error message to history: %s", log_e)
+                raise e
+        
+    async def _stream_reasoning(self, llm, reasoning_prompt: str) -> AsyncIterator[str]:
+        """Alirkan token reasoning dari LLM via `astream`."""
+        aggregated = None
+        async with get_llm_registry().slot(llm):
+            async for chunk in llm.astream(reasoning_prompt):
+                # Gabungan chunk membawa usage_metadata (biasanya di chunk terakhir)
+                aggregated = chunk if aggregated is None else aggregated + chunk
+                token = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+                if token:
+                    yield token
+        record_token_usage("reasoning", usage_from_response(aggregated, reasoning_prompt, model_name=_llm_model_name(llm)))
+
+    async def stream_flow(
+        self,
+        nl_query: str,
+        model_name: str,
+        room_id: int,
+        endpoint_path: str,
+        db_session: AsyncSession,
+        background_tasks: BackgroundTasks,
+        message_history_backend: SQLChatMessageHistory,
+        speculative: Optional[bool] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versi streaming dari execute_flow. Menghasilkan event per tahap:
+        classification, sql, data, reasoning (per token), lalu done.
+        Pesan akhir disimpan lewat SQLChatMessageHistory setelah stream reasoning selesai.
+        """
+        async for event in self._stream_pipeline(
+            nl_query=nl_query,
+            model_name=model_name,
+            endpoint_path=endpoint_path,
+            db_session=db_session,
+            background_tasks=background_tasks,
+            message_history_backend=message_history_backend,
+            speculative=speculative,
+            chat_history_string=None,
+        ):
+            yield event
+
+    async def stream_flow_conversation(
+        self,
+        nl_query: str,
+        model_name: str,
+        room_id: int,
+        endpoint_path: str,
+        db_session: AsyncSession,
+        background_tasks: BackgroundTasks,
+        chat_history_string: str,
+        message_history_backend: SQLChatMessageHistory,
+        speculative: Optional[bool] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Versi streaming dari execute_flow_conversation (menggunakan history string)."""
+        async for event in self._stream_pipeline(
+            nl_query=nl_query,
+            model_name=model_name,
+            endpoint_path=endpoint_path,
+            db_session=db_session,
+            background_tasks=background_tasks,
+            message_history_backend=message_history_backend,
+            speculative=speculative,
+            chat_history_string=chat_history_string,
+        ):
+            yield event
+
+    async def _stream_pipeline(
+        self,
+        nl_query: str,
+        model_name: str,
+        endpoint_path: str,
+        db_session: AsyncSession,
+        background_tasks: BackgroundTasks,
+        message_history_backend: SQLChatMessageHistory,
+        speculative: Optional[bool],
+        chat_history_string: Optional[str],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Pipeline bersama untuk kedua endpoint streaming.
+        `chat_history_string=None` berarti mode tanpa percakapan (prompt execute_flow).
+        """
+        start_flow_time = time.perf_counter_ns()
+        overall_latencies: dict = {}
+        token_ledger = start_token_ledger()
+        is_conversation = chat_history_string is not None
 
-                background_tasks.add_task(crud.create_llm_run, db_session, llm_run_schema)
-
-                shared_embeddings = get_embedding_model()
-
-                if saved_user_message:
-                    print(f"save question from user to qdrant")
-                    user_msg_read_schema = schemas.ChatMessageRead.from_orm(saved_user_message)
-                    background_tasks.add_task(add_message_vector, user_msg_read_schema, shared_embeddings)
-                if saved_ai_message:
-                    print(f"save answer from ai to qdrant")
-                    ai_msg_read_schema = schemas.ChatMessageRead.from_orm(saved_ai_message)
-                    background_tasks.add_task(add_message_vector, ai_msg_read_schema, shared_embeddings)
-            else:
-                print("WARNING: Could not retrieve user message object or ID, skipping LLM run and vector logging.")
+        llm = get_llm_adapter(model_name=model_name)
 
-            # === KEMBALIKAN HASIL ===
-            return {"query": sanitized_sql, "data_raw": data_raw, "reasoning": reasoning}
+        async with UnitOfWork(db_session) as uow:
+            message_history_backend.use_unit_of_work(uow)
+            saved_user_message = await message_history_backend.add_message(HumanMessage(content=nl_query))
+            user_msg_id = saved_user_message.message_id if saved_user_message else None
 
-        except Exception as e:
-            error_reasoning = f"Terjadi kesalahan saat memproses permintaan: {e}"
             try:
-                await message_history_backend.add_message(AIMessage(content=error_reasoning))
-            except Exception as log_e:
-                print(f"Failed to log AI error message to history: {log_e}")
-            raise e
-        
+                # Cache hanya dipakai untuk pertanyaan tanpa konteks percakapan
+                cache_key, cached = (None, None) if is_conversation else await self._lookup_answer_cache(nl_query)
+
+                if cached is not None:
+                    sanitized_sql, dynamic_context = cached.sql, cached.dynamic_context
+                    overall_latencies.update(classification=0, rag=0, sql_generation=0)
+                    yield {"event": "classification", "data": {"result": "data_perusahaan", "cached": True, "latency_ms": 0}}
+                else:
+                    if is_conversation:
+                        classification_prompt = QUESTION_CLASSIFICATION_CONVERSTATION_PROMT.format(
+                            conversation_history=chat_history_string, nl_query=nl_query
+                        )
+                        is_relevant = lambda result: "data_perusahaan" in result.lower() or "lanjutan" in result.lower()
+                        generate_sql = lambda: self._generate_sql_with_history(nl_query, llm, cast(str, chat_history_string))
+                    else:
+                        classification_prompt = QUESTION_CLASSIFICATION_PROMT.format(nl_query=nl_query)
+                        is_relevant = lambda result: "data_perusahaan" in result.lower()
+                        generate_sql = lambda: self._generate_sql(nl_query, llm)
+
+                    section_start = time.perf_counter_ns()
+                    generation_task = asyncio.create_task(generate_sql()) if self._is_speculative(speculative) else None
+                    classification_content, relevant, stage_latencies = await self._classify(
+                        llm, classification_prompt, is_relevant, generation_task
+                    )
+                    overall_latencies.update(stage_latencies)
+                    yield {"event": "classification", "data": {
+                        "result": classification_content.strip(), "cached": False,
+                        "latency_ms": overall_latencies['classification'],
+                    }}
+                    if not relevant:
+                        raise ValueError(
+                            f"Pertanyaan diklasifikasikan sebagai '{classification_content.strip()}' dan dianggap tidak relevan."
+                        )
+                    sanitized_sql, dynamic_context = await self._complete_generation(
+                        generate_sql, generation_task, section_start, overall_latencies
+                    )
+
+                yield {"event": "sql", "data": {"query": sanitized_sql}}
+
+                if cached is not None and cached.data_raw is not None:
+                    query_result, overall_latencies['sql_execution'] = QueryResult.from_rows(cached.data_raw), 0
+                else:
+                    query_result, overall_latencies['sql_execution'] = await self._execute_sql(
+                        sanitized_sql, uow, self._run_context(user_msg_id, model_name, endpoint_path, dynamic_context)
+                    )
+                data_raw = query_result.rows
+                yield {"event": "data", "data": {
+                    "data_raw": data_raw, **self._result_metadata(query_result),
+                    "latency_ms": overall_latencies['sql_execution'],
+                }}
+
+                # === REASONING (streaming token) ===
+                reasoning = "Kueri berhasil dieksekusi tetapi tidak menghasilkan data."
+                reasoning_latency = 0
+                reasoning_path = REASONING_PATH_EMPTY
+                reasoning_reused = cached is not None and cached.reasoning is not None and (
+                    cached.data_raw is not None or cached.data_fingerprint == fingerprint_data(data_raw)
+                )
+                templated = None if reasoning_reused or not data_raw else self._template_answer(query_result, sanitized_sql)
+                if reasoning_reused:
+                    reasoning, reasoning_path = cast(str, cached.reasoning), REASONING_PATH_CACHE
+                    yield {"event": "reasoning", "data": {"token": reasoning}}
+                elif templated is not None:
+                    reasoning, reasoning_path = templated, REASONING_PATH_TEMPLATE
+                    yield {"event": "reasoning", "data": {"token": reasoning}}
+                elif data_raw:
+                    reasoning_path = REASONING_PATH_LLM
+                    if is_conversation:
+                        reasoning_prompt_formatted = REASONING_CONVERSTATION_PROMPT.format(
+                            conversation_history=chat_history_string,
+                            nl_query=nl_query,
+                            data_raw=summarize_result(query_result)
+                        )
+                    else:
+                        reasoning_prompt_formatted = REASONING_PROMPT.format(
+                            nl_query=nl_query,
+                            data_raw=summarize_result(query_result)
+                        )
+                    reasoning_start = time.perf_counter_ns()
+                    tokens = []
+                    async for token in self._stream_reasoning(llm, reasoning_prompt_formatted):
+                        tokens.append(token)
+                        yield {"event": "reasoning", "data": {"token": token}}
+                    reasoning = "".join(tokens)
+                    reasoning_latency = elapsed_ms(reasoning_start)
+                    record_span("reasoning", reasoning_start, tokens=len(tokens), streamed=True)
+                else:
+                    yield {"event": "reasoning", "data": {"token": reasoning}}
+                overall_latencies['reasoning'] = reasoning_latency
+
+                if cache_key is not None and not reasoning_reused:
+                    self._answer_cache.put(cache_key, sanitized_sql, dynamic_context, data_raw, reasoning)
+
+                # === Simpan Jawaban AI setelah stream selesai ===
+                saved_ai_message = await message_history_backend.add_message(AIMessage(content=reasoning))
+
+                total_latency = elapsed_ms(start_flow_time)
+                self._record_metrics(endpoint_path, model_name, overall_latencies, total_latency, reasoning_path)
+                if user_msg_id:
+                    llm_run_schema = schemas.LLMRunCreate(
+                        user_message_id=user_msg_id, endpoint_path=endpoint_path,
+                        generated_sql=sanitized_sql, retrieved_context_knowledge=dynamic_context,
+                        llm_model_used=model_name,
+                        llm_provider_user=get_provider_name(model_name),
+                        is_success=True, latency_total_ms=total_latency,
+                        latency_classification_ms=overall_latencies.get('classification'),
+                        latency_rag_ms=overall_latencies.get('rag'),
+                        latency_sql_generation_ms=overall_latencies.get('sql_generation'),
+                        latency_sql_execution_ms=overall_latencies.get('sql_execution'),
+                        latency_reasoning_ms=overall_latencies.get('reasoning'),
+                        latency_overlap_ms=overall_latencies.get('overlap'),
+                        is_cache_hit=cached is not None,
+                        reasoning_path=reasoning_path,
+                        estimated_rows_examined=query_result.estimated_rows_examined,
+                        cost_guard_action=query_result.cost_guard_action,
+                        **token_ledger.as_columns(),
+                    )
+                    # Sesi DB milik stream ditutup setelah generator selesai, jadi tulis di sini
+                    await uow.add_llm_run(llm_run_schema)
+
+                    uow.after_commit(lambda: self._enqueue_message_vectors(saved_user_message, saved_ai_message))
+                # Commit sebelum event `done` agar klien hanya melihat jawaban yang sudah tersimpan
+                await uow.commit()
+
+                yield {"event": "done", "data": {
+                    "query": sanitized_sql,
+                    "reasoning": reasoning,
+                    "reasoning_path": reasoning_path,
+                    "latencies_ms": {**overall_latencies, "total": total_latency},
+                    "token_usage": token_ledger.as_dict(),
+                }}
+
+            except Exception as e:
+                error_reasoning = f"Terjadi kesalahan saat memproses permintaan: {e}"
+                try:
+                    await message_history_backend.add_message(AIMessage(content=error_reasoning))
+                except Exception as log_e:
+                    logger.error("Failed to log AI error message to history: %s", log_e)
+                raise e
+
 nl2sql_service_instance = NL2SQLService()
 
 def get_nl2sql_service() -> NL2SQLService:
@@ -1,12 +1,29 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.adapters.api import nl2sql_router
+# Pasang logging sebelum modul app diimpor agar log saat inisialisasi ikut lewat antrian
+from app.core.logging_setup import setup_logging, shutdown_logging
+setup_logging()
+
+from app import config
+from app.adapters.api import nl2sql_router, admin_router
 from app.adapters.api.dependencies import limiter
+from app.adapters.db.telemetry_writer import get_telemetry_writer
+from app.adapters.llm.llm_factory import get_llm_registry
+from app.adapters.vector_store.message_vector_writer import get_message_vector_writer
+from app.adapters.vector_store.qdrant_adapter import close_async_qdrant_client
+from app.core.metrics import HTTP_REQUEST_LATENCY, get_metrics_registry, register_runtime_gauges
+from app.core.result_cache import get_table_version_poller
+from app.core.tracing import get_tracer
+from app.core.schema_catalog import get_schema_catalog
+from app.core.token_counter import warm_tokenizer
 # from app.adapters.db import models
 # from app.adapters.db.database import engine
 
@@ -14,19 +31,87 @@ from app.adapters.api.dependencies import limiter
 # Sekarang aman karena 'config' yang dibutuhkan oleh 'engine' sudah di-load.
 # models.Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_message_vector_writer().start()
+    get_telemetry_writer().start()
+    # Muat katalog kolom sekali saat startup agar request pertama tidak membaca YAML
+    get_schema_catalog()
+    # Unduh/muat BPE tiktoken sekali; host offline langsung memakai perkiraan karakter
+    warm_tokenizer()
+    # Deteksi perubahan tabel (UPDATE_TIME) untuk invalidasi result cache
+    get_table_version_poller().start()
+    if config.METRICS_ENABLED:
+        register_runtime_gauges()
+    if config.TRACING_ENABLED:
+        get_tracer()
+    yield
+    await get_table_version_poller().stop()
+    # Flush vektor chat yang masih di antrian sebelum koneksi ditutup
+    await get_message_vector_writer().stop()
+    # Flush baris llm_runs/chat_messages yang masih di antrian sebelum pool DB ditutup
+    await get_telemetry_writer().stop()
+    await close_async_qdrant_client()
+    # Tutup pool koneksi HTTP bersama milik client LLM
+    await get_llm_registry().aclose()
+    # Flush log yang masih di antrian listener
+    shutdown_logging()
+
 app = FastAPI(
     title="Service ChatBot",
     description="Service ChatBot dengan pendekatan Retrieval-Augmented Generation (RAG)",
     version="1.0.0",
+    lifespan=lifespan,
     )
 
 # Handler untuk rate limit
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler) # type: ignore
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    if not config.METRICS_ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Template path (mis. /api/v1/rooms/{room_id}) agar label tidak meledak per ID
+        route = request.scope.get("route")
+        path = getattr(route, "path", "__unmatched__")
+        HTTP_REQUEST_LATENCY.observe((time.perf_counter() - start) * 1000, request.method, path, str(status_code))
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    if not config.TRACING_ENABLED:
+        return await call_next(request)
+    # X-Request-ID dari klien/proxy dipakai ulang agar trace bisa dikorelasikan lintas service
+    request_id = request.headers.get("X-Request-ID", "")[:128] or None
+    tracer = get_tracer()
+    trace = tracer.start_trace(f"{request.method} {request.url.path}", request_id=request_id)
+    try:
+        response = await call_next(request)
+    except BaseException as e:
+        tracer.finish(trace, e)
+        raise
+    trace.root.set(status=response.status_code)
+    response.headers["X-Request-ID"] = trace.request_id
+    # Trace selesai setelah body terkirim (penting untuk SSE)
+    response.body_iterator = tracer.wrap_body(trace, response.body_iterator)
+    return response
+
 # router
 app.include_router(nl2sql_router.router, prefix="/api/v1")
+app.include_router(admin_router.router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
-    return {"status": "ok", "message": "Welcome to the RAG Service!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the RAG Service!"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Scrape endpoint Prometheus: histogram latency per tahap, pool DB, antrian, dan hit ratio cache."""
+    return PlainTextResponse(get_metrics_registry().render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,128 @@
+"""
+Benchmark round-trip tulis per request: mode `per_write` (commit + refresh setiap
+INSERT) dibandingkan `unit_of_work` (pesan user di-commit segera karena ID-nya
+dibutuhkan sebagai FK, sisanya di-flush dan di-commit sekali di akhir request:
+2 commit per request).
+
+Setiap "request" menulis pesan user, pesan AI, dan satu baris llm_runs lewat
+UnitOfWork, sama seperti execute_flow. Statement dihitung lewat event `before_cursor_execute`
+dan commit lewat event `commit` engine.
+
+Jalankan: python scripts/bench_persistence_roundtrips.py [--requests 200] [--database-url URL]
+Default memakai SQLite file sementara (butuh aiosqlite); untuk MySQL uji, berikan
+URL `mysql+asyncmy://...` ke database kosong karena tabel akan dibuat.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Agar paket `app` bisa diimpor saat skrip dijalankan langsung
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def configure_environment(database_url: str) -> None:
+    """
+    Set DATABASE_URL sebelum modul `app` diimpor: `app.adapters.db.database`
+    membangun engine saat import (default asyncmy/MySQL).
+    """
+    os.environ["DATABASE_URL"] = database_url
+    from app import config
+
+    # Yang diukur adalah tulisan di sesi request, bukan antrian telemetry writer
+    config.TELEMETRY_WRITER_ENABLED = False
+
+class RoundTripCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+async def simulate_request(session_factory, mode: str, index: int):
+    from app.adapters.db import schemas
+    from app.adapters.db.unit_of_work import UnitOfWork
+
+    async with session_factory() as session:
+        async with UnitOfWork(session, mode=mode) as uow:
+            user_message = await uow.add_user_message(
+                schemas.ChatMessageCreate(room_id=1, sender="user", message_text=f"Berapa total pagu unit {index}?")
+            )
+            await uow.add_chat_message(
+                schemas.ChatMessageCreate(
+                    room_id=1, sender="ai", message_text="Total pagu tercatat sebesar Rp1.000.000.",
+                    in_reply_to_message_id=user_message.message_id,
+                )
+            )
+            await uow.add_llm_run(
+                schemas.LLMRunCreate(
+                    user_message_id=user_message.message_id,
+                    generated_sql="SELECT SUM(Jumlah) FROM drauk_unit LIMIT 1000",
+                    is_success=True,
+                )
+            )
+
+async def run_mode(database_url: str, mode: str, requests: int) -> dict:
+    from app.adapters.db import models
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.drop_all)
+        await connection.run_sync(models.Base.metadata.create_all)
+    counter = RoundTripCounter(engine)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    # Pemanasan (pool koneksi, cache statement) sebelum diukur
+    await simulate_request(session_factory, mode, -1)
+    counter.reset()
+
+    start = time.perf_counter()
+    for index in range(requests):
+        await simulate_request(session_factory, mode, index)
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {
+        "mode": mode,
+        "statements": counter.statements / requests,
+        "commits": counter.commits / requests,
+        "round_trips": (counter.statements + counter.commits) / requests,
+        "ms_per_request": elapsed / requests * 1000,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{Path(tmp_dir) / 'bench_persistence.db'}"
+        configure_environment(database_url)
+        from app.adapters.db.unit_of_work import PERSISTENCE_MODES
+
+        print(f"🔧 Database: {database_url.split('@')[-1]}")
+        print(f"{'mode':<14} {'statement':>10} {'commit':>8} {'round-trip':>11} {'ms/request':>11}")
+        for mode in PERSISTENCE_MODES:
+            result = await run_mode(database_url, mode, args.requests)
+            print(
+                f"{result['mode']:<14} {result['statements']:>10.1f} {result['commits']:>8.1f} "
+                f"{result['round_trips']:>11.1f} {result['ms_per_request']:>11.2f}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
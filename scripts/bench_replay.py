@@ -0,0 +1,262 @@
+"""
+Replay beban offline: kirim workload JSONL ke aplikasi FastAPI secara in-process
+(httpx ASGITransport) dengan konkurensi tertentu, tanpa OpenRouter/Gemini, MySQL,
+maupun Qdrant.
+
+Pengganti lokal yang dipakai:
+- Provider LLM lokal `local/fake` (app/adapters/llm/fake_adapter.py) dengan latency yang bisa
+  diatur; SQL dari workload dipakai sebagai jawaban skrip, sisanya berbasis aturan.
+- SQLite (aiosqlite) berisi tabel `drauk_unit*` sintetis yang dibangun dari kolom YAML skema.
+- Qdrant in-memory (QDRANT_LOCATION=":memory:") dan schema retriever backend "memory".
+  Model embedding tetap model lokal EMBEDDING_MODEL_NAME.
+
+Latency per tahap diambil dari breakdown yang sudah dicatat di `llm_runs`
+(latency_classification_ms, latency_rag_ms, ...), lalu dilaporkan p50/p95/p99.
+
+Format workload (satu JSON per baris):
+    {"prompt": "Berapa total pagu 2024?", "sql": "SELECT SUM(Jumlah) FROM drauk_unit WHERE Tahun_Anggaran = 2024;",
+     "endpoint": "/api/v1/nl-to-sql/sql-data-reasoning"}
+`sql` (opsional) adalah jawaban skrip LLM lokal untuk prompt tersebut; `endpoint`
+default ke /sql-data-reasoning. Field `nl_query`/`title` diterima sebagai pengganti `prompt`.
+
+Jalankan: python scripts/bench_replay.py [--workload scripts/bench_workload.jsonl]
+          [--concurrency 8] [--repeat 5] [--rows 5000] [--llm-latency-ms 400] [--seed 42]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_ENDPOINT = "/api/v1/nl-to-sql/sql-data-reasoning"
+FAKE_MODEL_NAME = "local/fake"
+STAGE_COLUMNS = {
+    "classification": "latency_classification_ms",
+    "rag": "latency_rag_ms",
+    "sql_generation": "latency_sql_generation_ms",
+    "sql_execution": "latency_sql_execution_ms",
+    "reasoning": "latency_reasoning_ms",
+    "total": "latency_total_ms",
+}
+
+def configure_environment(database_url: str) -> None:
+    """Config dibaca saat import, jadi env pengganti lokal harus di-set sebelum `app` diimpor."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["QDRANT_LOCATION"] = ":memory:"
+    os.environ["SCHEMA_RETRIEVER_BACKEND"] = "memory"
+    os.environ["LOCAL_LLM_ENABLED"] = "true"
+    # Poller result cache membaca information_schema MySQL; tidak relevan untuk SQLite
+    os.environ["RESULT_CACHE_POLL_INTERVAL_SECONDS"] = "0"
+    os.environ.setdefault("TRACING_EXPORTERS", "memory")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+def load_workload(path: Path) -> List[Dict[str, Any]]:
+    items = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        prompt = row.get("prompt") or row.get("nl_query") or row.get("title")
+        if prompt:
+            items.append({"prompt": prompt, "sql": row.get("sql"), "endpoint": row.get("endpoint") or DEFAULT_ENDPOINT})
+    if not items:
+        raise ValueError(f"Workload {path} tidak berisi prompt.")
+    return items
+
+def percentile(values: List[float], pct: float) -> float:
+    """Persentil nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def _sqlite_type(data_type: str) -> str:
+    data_type = data_type.lower()
+    if data_type.startswith(("int", "bigint", "smallint", "tinyint")):
+        return "INTEGER"
+    if data_type.startswith(("decimal", "double", "float")):
+        return "REAL"
+    return "TEXT"
+
+def _synthetic_value(column: str, sql_type: str, index: int, rng: random.Random) -> Any:
+    if column == "Tahun_Anggaran":
+        return 2022 + index % 4
+    if sql_type == "INTEGER":
+        return 100000 + index
+    if sql_type == "REAL":
+        return round(rng.uniform(1_000_000, 500_000_000), 2)
+    if column == "Nama_Unit":
+        return f"Universitas Terbuka Unit {index % 40}"
+    return f"{column.replace('_', ' ')} {index % 97}"
+
+async def seed_database(engine, rows: int) -> None:
+    """Buat tabel aplikasi + tabel drauk_unit* sintetis dari kolom YAML skema."""
+    from sqlalchemy import text
+
+    from app import config
+    from app.adapters.db import models
+    from app.core.schema_documents import SCHEMA_FILES, load_yaml
+
+    rng = random.Random(42)
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+        await connection.execute(text("INSERT INTO users (nip, kode_unit, display_name) VALUES ('bench', 'BENCH', 'Benchmark')"))
+        for file_name in SCHEMA_FILES:
+            spec = (load_yaml(config.SCHEMA_DATA_DIR / file_name) or {}).get("spec") or {}
+            for table, info in spec.items():
+                columns = [(c["name"], _sqlite_type(c["data_type"])) for c in info.get("columns", [])]
+                await connection.execute(text(
+                    f"CREATE TABLE {table} ({', '.join(f'{name} {sql_type}' for name, sql_type in columns)})"
+                ))
+                await connection.execute(text(f"CREATE INDEX ix_{table}_tahun ON {table} (Tahun_Anggaran)"))
+                insert = text(
+                    f"INSERT INTO {table} ({', '.join(name for name, _ in columns)}) "
+                    f"VALUES ({', '.join(':' + name for name, _ in columns)})"
+                )
+                await connection.execute(insert, [
+                    {name: _synthetic_value(name, sql_type, index, rng) for name, sql_type in columns}
+                    for index in range(rows)
+                ])
+
+async def create_rooms(engine, count: int) -> List[int]:
+    from sqlalchemy import text
+
+    async with engine.begin() as connection:
+        for index in range(count):
+            await connection.execute(text("INSERT INTO chat_rooms (user_id, title) VALUES (1, :title)"), {"title": f"bench-{index}"})
+        result = await connection.execute(text("SELECT room_id FROM chat_rooms ORDER BY room_id"))
+        return [row.room_id for row in result]
+
+async def create_history_collection() -> None:
+    from qdrant_client import models as qdrant_models
+
+    from app import config
+    from app.adapters.vector_store.qdrant_adapter import get_async_qdrant_client
+    from app.core.embedding_provider import get_embedding_model
+
+    size = len(get_embedding_model().embed_query("dimensi"))
+    await get_async_qdrant_client().create_collection(
+        config.CHAT_HISTORY_COLLECTION,
+        vectors_config=qdrant_models.VectorParams(size=size, distance=qdrant_models.Distance.COSINE),
+    )
+
+async def replay(args, workload: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import httpx
+
+    from app.adapters.db.database import engine
+    from app.adapters.llm.fake_adapter import get_fake_llm
+    from app.adapters.llm.llm_factory import get_llm_registry
+    from main import app
+
+    await seed_database(engine, args.rows)
+    room_ids = await create_rooms(engine, args.concurrency)
+
+    scripted_sql = {item["prompt"]: item["sql"] for item in workload if item.get("sql")}
+    # Ganti instance default registry dengan instance yang membawa SQL skrip workload
+    get_llm_registry().register(FAKE_MODEL_NAME, get_fake_llm(
+        FAKE_MODEL_NAME,
+        latency_ms=args.llm_latency_ms,
+        latency_jitter_ms=args.llm_jitter_ms,
+        scripted_sql=scripted_sql,
+        # Prompt percakapan/klasifikasi selalu relevan agar setiap request melewati pipeline penuh
+        scripted_responses=[(r"Kategori:\s*$", "data_perusahaan")],
+        seed=args.seed,
+    ))
+
+    jobs: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.repeat):
+        for item in workload:
+            jobs.put_nowait(item)
+    total_jobs = jobs.qsize()
+    latencies: List[float] = []
+    status_counts: Dict[int, int] = {}
+
+    async with app.router.lifespan_context(app):
+        await create_history_collection()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def worker(room_id: int) -> None:
+                while True:
+                    try:
+                        item = jobs.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    body = {
+                        "prompt": item["prompt"], "model": FAKE_MODEL_NAME, "nip": "bench",
+                        "kode_unit": "BENCH", "display_name": "Benchmark", "room_id": room_id,
+                    }
+                    start = time.perf_counter()
+                    response = await client.post(item["endpoint"], json=body)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(room_id) for room_id in room_ids))
+            elapsed = time.perf_counter() - start
+    # Keluar dari lifespan = telemetry writer sudah mem-flush baris llm_runs
+
+    stage_values = await read_stage_latencies(engine)
+    await engine.dispose()
+    return {
+        "requests": total_jobs,
+        "elapsed": elapsed,
+        "status": status_counts,
+        "client_ms": latencies,
+        "stages": stage_values,
+    }
+
+async def read_stage_latencies(engine) -> Dict[str, List[float]]:
+    from sqlalchemy import text
+
+    async with engine.connect() as connection:
+        result = await connection.execute(text(
+            f"SELECT {', '.join(STAGE_COLUMNS.values())}, is_cache_hit FROM llm_runs WHERE is_success = 1"
+        ))
+        rows = result.all()
+    stages = {stage: [float(getattr(row, column)) for row in rows if getattr(row, column) is not None] for stage, column in STAGE_COLUMNS.items()}
+    stages["_cache_hits"] = [float(sum(1 for row in rows if row.is_cache_hit)), float(len(rows))]
+    return stages
+
+def print_report(report: Dict[str, Any], concurrency: int) -> None:
+    print(f"🔧 Requests: {report['requests']}  concurrency: {concurrency}  status: {report['status']}")
+    print(f"⚡ Throughput: {report['requests'] / report['elapsed']:.1f} req/s ({report['elapsed']:.2f} s)")
+    cache_hits, runs = report["stages"].pop("_cache_hits")
+    print(f"📦 llm_runs tercatat: {int(runs)} (answer cache hit: {int(cache_hits)})")
+    print(f"{'tahap':<16} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("client", report["client_ms"])] + list(report["stages"].items())
+    for name, values in rows:
+        print(
+            f"{name:<16} {len(values):>6} {percentile(values, 50):>9.1f} "
+            f"{percentile(values, 95):>9.1f} {percentile(values, 99):>9.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", type=Path, default=Path(__file__).resolve().parent / "bench_workload.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=5000, help="Baris sintetis per tabel drauk_unit*")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=42, help="Seed latency LLM lokal agar run dapat diulang")
+    parser.add_argument("--database-url", default=None, help="Default: SQLite file sementara (butuh aiosqlite)")
+    args = parser.parse_args()
+
+    workload = load_workload(args.workload)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_environment(args.database_url or f"sqlite+aiosqlite:///{Path(tmp_dir) / 'bench_replay.db'}")
+        # Agar paket `app` dan `main` bisa diimpor saat skrip dijalankan langsung
+        sys.path.insert(0, str(ROOT))
+        report = asyncio.run(replay(args, workload))
+    print_report(report, args.concurrency)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark validator SQL: jalur lama berbasis sqlparse (sanitize_sql_output
++ is_safe_select_query) dibandingkan `validate_sql` single-pass, dingin (cache
+dikosongkan tiap panggilan) dan hangat (kena parse cache).
+
+Jalankan: python scripts/bench_sql_validator.py [--number 2000]
+"""
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+
+# Agar paket `app` bisa diimpor saat skrip dijalankan langsung
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.core.security.sql_validator import validate_sql
+
+QUERIES = {
+    "pendek": "```sql\nSELECT COUNT(*) AS jumlah_kegiatan FROM drauk_unit WHERE Tahun_Anggaran = 2024;\n```",
+    "agregasi": (
+        "SELECT Nama_Unit, SUM(Jumlah) AS total_anggaran, SUM(Realisasi) AS total_realisasi, "
+        "SUM(Jumlah) - SUM(Realisasi) AS sisa FROM drauk_unit WHERE Tahun_Anggaran = 2024 "
+        "AND Kegiatan_Unit LIKE '%rapat%' GROUP BY Nama_Unit HAVING SUM(Jumlah) > 1000000 "
+        "ORDER BY total_anggaran DESC"
+    ),
+    "panjang": (
+        "WITH realisasi AS (SELECT d.Nama_Unit, d.Tahun_Anggaran, SUM(d.Jumlah) AS pagu, SUM(d.Realisasi) AS realisasi "
+        "FROM drauk_unit d WHERE d.Tahun_Anggaran IN (2022, 2023, 2024) GROUP BY d.Nama_Unit, d.Tahun_Anggaran), "
+        "peringkat AS (SELECT r.Nama_Unit, r.Tahun_Anggaran, r.pagu, r.realisasi, "
+        "CASE WHEN r.pagu = 0 THEN 0 ELSE r.realisasi / r.pagu END AS serapan FROM realisasi r) "
+        "SELECT p.Nama_Unit, p.Tahun_Anggaran, p.pagu, p.realisasi, ROUND(p.serapan * 100, 2) AS persen_serapan "
+        "FROM peringkat p WHERE p.serapan < (SELECT AVG(serapan) FROM peringkat) "
+        "AND p.Nama_Unit NOT IN (SELECT Nama_Unit FROM drauk_unit WHERE Kegiatan_Unit LIKE '%hibah%') "
+        "ORDER BY p.Tahun_Anggaran DESC, persen_serapan ASC"
+    ),
+}
+
+# === Jalur lama (disalin dari validator sebelum refactor) ===
+BLACKLISTED_FUNCTIONS = {'SLEEP', 'BENCHMARK', 'LOAD_FILE', 'SYS_EVAL', 'SYS_EXEC', 'SYS_GET', 'EXECUTE'}
+BLACKLISTED_KEYWORDS = {
+    'INTO', 'FOR', 'DROP', 'DELETE', 'INSERT', 'UPDATE', 'ALTER', 'CREATE', 'REPLACE', 'TRUNCATE',
+    'GRANT', 'REVOKE', 'LOCK', 'UNLOCK', 'EXECUTE',
+}
+
+def legacy_sanitize_sql_output(sql_string: str) -> str:
+    match = re.search(r"```sql\n(.*?)\n```", sql_string, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    return sql_string.strip()
+
+def legacy_is_safe_select_query(query: str) -> bool:
+    import sqlparse
+    from sqlparse.sql import Identifier
+    from sqlparse.tokens import Keyword
+
+    parsed = sqlparse.parse(query)
+    if not parsed or len(parsed) > 1:
+        return False
+    statement = parsed[0]
+    if statement.get_type() != 'SELECT':
+        return False
+    for token in statement.flatten():
+        if token.ttype is Keyword and token.normalized in BLACKLISTED_KEYWORDS:
+            return False
+        if isinstance(token, Identifier):
+            if any(isinstance(sub_token, sqlparse.sql.Parenthesis) for sub_token in token.tokens):
+                function_name = token.get_name()
+                if function_name and function_name.upper() in BLACKLISTED_FUNCTIONS:
+                    return False
+    return True
+
+def legacy_validate(raw_sql: str) -> bool:
+    return legacy_is_safe_select_query(legacy_sanitize_sql_output(raw_sql))
+
+def validate_cold(raw_sql: str):
+    validate_sql.cache_clear()
+    return validate_sql(raw_sql)
+
+def _per_call_us(func, raw_sql: str, number: int) -> float:
+    return min(timeit.repeat(lambda: func(raw_sql), number=number, repeat=3)) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="Jumlah panggilan per pengulangan")
+    args = parser.parse_args()
+
+    try:
+        import sqlparse  # noqa: F401
+        has_sqlparse = True
+    except ImportError:
+        has_sqlparse = False
+        print("⚠️ sqlparse tidak terpasang, jalur lama dilewati.")
+
+    print(f"{'kueri':<10} {'sqlparse (µs)':>14} {'dingin (µs)':>12} {'hangat (µs)':>12} {'speedup':>9}")
+    for name, raw_sql in QUERIES.items():
+        result = validate_sql(raw_sql)
+        assert result.is_safe, f"{name}: {result.reason}"
+
+        cold = _per_call_us(validate_cold, raw_sql, args.number)
+        validate_sql(raw_sql)
+        warm = _per_call_us(validate_sql, raw_sql, args.number)
+        if has_sqlparse:
+            legacy = _per_call_us(legacy_validate, raw_sql, max(1, args.number // 10))
+            print(f"{name:<10} {legacy:>14.1f} {cold:>12.1f} {warm:>12.2f} {legacy / cold:>8.1f}x")
+        else:
+            print(f"{name:<10} {'-':>14} {cold:>12.1f} {warm:>12.2f} {'-':>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+
+# Config dibaca saat import modul `app`; arahkan ke pengganti lokal sebelum test mengimpor apa pun
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("QDRANT_LOCATION", ":memory:")
+os.environ.setdefault("TRACING_EXPORTERS", "memory")
+os.environ.setdefault("RESULT_CACHE_POLL_INTERVAL_SECONDS", "0")
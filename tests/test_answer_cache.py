@@ -0,0 +1,67 @@
+import asyncio
+
+import numpy as np
+
+from app.core import answer_cache
+from app.core.answer_cache import (
+    ANSWER_SCOPE_DATA,
+    ANSWER_SCOPE_REASONING,
+    CacheKey,
+    SemanticAnswerCache,
+    extract_entities,
+    normalize_question,
+)
+
+def _key(question: str, scope: str = ANSWER_SCOPE_REASONING) -> CacheKey:
+    # Semua pertanyaan uji memakai vektor yang sama: hanya syarat kunci yang membedakan
+    normalized = normalize_question(question)
+    return CacheKey(
+        normalized=normalized,
+        numbers=(),
+        vector=np.array([1.0, 0.0], dtype=np.float32),
+        entities=extract_entities(question),
+        scope=scope,
+    )
+
+def test_entity_names_prevent_semantic_match():
+    cache = SemanticAnswerCache(schema_check_seconds=3600)
+    cache.put(_key("Berapa pagu Biro Umum?"), "SELECT 1", "", [])
+    assert cache.get(_key("Berapa pagu Biro Hukum?")) is None
+    assert cache.get(_key("berapa pagu Biro Umum")) is not None
+
+def test_lowercase_entity_names_prevent_semantic_match():
+    cache = SemanticAnswerCache(schema_check_seconds=3600)
+    cache.put(_key("total pagu dinas pendidikan"), "SELECT 1", "", [])
+    assert cache.get(_key("berapa total pagu dinas kesehatan?")) is None
+    assert cache.get(_key("Tolong, berapa total pagu dinas pendidikan")) is not None
+
+def test_build_key_embeds_the_same_text_as_the_retriever(monkeypatch):
+    class _Embeddings:
+        def __init__(self):
+            self.texts = []
+
+        async def aembed_query(self, text):
+            self.texts.append(text)
+            return [3.0, 4.0]
+
+    embeddings = _Embeddings()
+    monkeypatch.setattr(answer_cache, "get_embedding_model", lambda: embeddings)
+    key = asyncio.run(SemanticAnswerCache(schema_check_seconds=3600).build_key("Berapa pagu Biro Umum?"))
+    assert embeddings.texts == ["Berapa pagu Biro Umum?"]
+    assert key.normalized == "berapa pagu biro umum"
+    assert np.allclose(key.vector, [0.6, 0.8])
+
+def test_data_endpoint_does_not_overwrite_reasoning_entry():
+    cache = SemanticAnswerCache(schema_check_seconds=3600)
+    cache.put(_key("total pagu"), "SELECT 1", "", [{"a": 1}], reasoning="Total pagu 1.")
+    cache.put(_key("total pagu", ANSWER_SCOPE_DATA), "SELECT 1", "", [{"a": 1}])
+    assert cache.get(_key("total pagu")).reasoning == "Total pagu 1."
+    assert cache.get(_key("total pagu", ANSWER_SCOPE_DATA)).reasoning is None
+
+def test_schema_fingerprint_is_not_recomputed_on_every_lookup(monkeypatch):
+    cache = SemanticAnswerCache(schema_check_seconds=3600)
+    calls = []
+    monkeypatch.setattr(answer_cache, "schema_fingerprint", lambda: calls.append(1) or "x")
+    for _ in range(3):
+        cache.get(_key("total pagu"))
+    assert calls == []
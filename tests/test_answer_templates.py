@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.core.answer_templates import format_number, format_rupiah, money_result_columns, render_template_answer
+from app.core.db_executor import QueryResult
+
+def _answer(rows, sql=None):
+    return render_template_answer(QueryResult.from_rows(rows), sql=sql)
+
+def test_formatting_helpers():
+    assert format_rupiah(Decimal("1234567.5")) == "Rp1.234.567,50"
+    assert format_rupiah(1000) == "Rp1.000"
+    assert format_number(Decimal("1234.50")) == "1.234,5"
+
+def test_schema_money_column_is_rupiah():
+    answer = _answer([{"Jumlah": Decimal("2500000.00")}], "SELECT SUM(Jumlah) AS Jumlah FROM drauk_unit LIMIT 1001")
+    assert "Rp2.500.000" in answer
+
+def test_aggregate_alias_of_money_column_is_rupiah():
+    sql = "SELECT SUM(Realisasi) AS `Total Realisasi` FROM drauk_unit LIMIT 1001"
+    assert money_result_columns(sql) == {"total realisasi"}
+    assert "Rp" in _answer([{"Total Realisasi": Decimal("10.00")}], sql)
+
+def test_unaliased_aggregate_uses_expression_name():
+    sql = "SELECT SUM(Jumlah) FROM drauk_unit LIMIT 1001"
+    answer = _answer([{"SUM(Jumlah)": Decimal("10.00")}], sql)
+    assert answer == "Berdasarkan data yang tersedia, total jumlah tercatat sebesar Rp10."
+
+@pytest.mark.parametrize("column, label", [
+    ("COUNT(*)", "jumlah data"),
+    ("count(DISTINCT Nama_Unit)", "jumlah nama unit unik"),
+    ("AVG(t.Volume_1)", "rata-rata volume 1"),
+    ("MAX(`Realisasi`)", "nilai maksimum realisasi"),
+])
+def test_unaliased_aggregates_get_readable_labels(column, label):
+    answer = _answer([{column: 12}])
+    assert f"{label} tercatat sebanyak 12" in answer
+    assert "(" not in answer
+
+def test_unaliased_expression_falls_back_to_llm():
+    assert _answer([{"SUM(Realisasi) * 100 / SUM(Jumlah)": Decimal("50.00")}]) is None
+    assert _answer([{"Nama_Unit": "UT Jakarta", "ROUND(SUM(Jumlah), 0)": Decimal("1")}]) is None
+
+@pytest.mark.parametrize("column, sql", [
+    ("total_kegiatan", "SELECT SUM(FTE) AS total_kegiatan FROM drauk_unit LIMIT 1001"),
+    ("rata_volume", "SELECT AVG(Volume_1) AS rata_volume FROM drauk_unit LIMIT 1001"),
+    ("persentase_realisasi", "SELECT SUM(Realisasi) * 100 / SUM(Jumlah) AS persentase_realisasi FROM drauk_unit LIMIT 1001"),
+    ("nilai", "SELECT COUNT(*) / 3 AS nilai FROM drauk_unit LIMIT 1001"),
+])
+def test_non_money_decimals_use_plain_numbers(column, sql):
+    answer = _answer([{column: Decimal("1234.50")}], sql)
+    assert "Rp" not in answer
+    assert "1.234,5" in answer
+
+def test_ranked_answer_formats_metric_and_total():
+    sql = "SELECT Nama_Unit, SUM(Jumlah) AS total_pagu FROM drauk_unit GROUP BY Nama_Unit ORDER BY total_pagu DESC LIMIT 2"
+    rows = [{"Nama_Unit": "UT Jakarta", "total_pagu": Decimal("300")}, {"Nama_Unit": "UT Bandung", "total_pagu": Decimal("100")}]
+    answer = _answer(rows, sql)
+    assert "UT Jakarta memiliki total pagu tertinggi sebesar Rp300" in answer
+    assert "Rp400" in answer
+
+def test_truncated_or_complex_results_fall_back_to_llm():
+    result = QueryResult.from_rows([{"a": 1}, {"a": 2}])
+    result.truncated = True
+    assert render_template_answer(result) is None
+    assert _answer([{"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 2, "c": 3}]) is None
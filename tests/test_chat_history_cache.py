@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import config
+from app.adapters.db import crud, models, schemas
+from app.core import sql_chat_history
+from app.core.chat_history_cache import ChatHistoryCache
+from app.core.sql_chat_history import SQLChatMessageHistory
+
+def _message(message_id: int, text: str = "pesan") -> HumanMessage:
+    return HumanMessage(content=text, additional_kwargs={"message_id": message_id})
+
+def test_stale_room_is_dropped_when_latest_id_differs():
+    cache = ChatHistoryCache(max_rooms=4, max_messages=10)
+    cache.put(1, [_message(1), _message(2)], complete=True)
+    assert len(cache.get(1, 4, latest_message_id=2)) == 2
+    assert cache.get(1, 4, latest_message_id=3) is None
+    assert cache.stats()["stale"] == 1
+
+def test_append_skips_messages_already_loaded_from_db():
+    cache = ChatHistoryCache(max_rooms=4, max_messages=10)
+    cache.put(1, [_message(1), _message(2)], complete=True)
+    cache.append(1, _message(2))
+    cache.append(1, AIMessage(content="jawaban", additional_kwargs={"message_id": 3}))
+    messages = cache.get(1, 10, latest_message_id=3)
+    assert [m.additional_kwargs["message_id"] for m in messages] == [1, 2, 3]
+
+def test_write_from_another_worker_is_visible(tmp_path, monkeypatch):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'history.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+            await connection.execute(models.User.__table__.insert(), {"nip": "t", "kode_unit": "T"})
+            await connection.execute(models.ChatRoom.__table__.insert(), {"user_id": 1, "title": "t"})
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        # Cache milik worker ini; worker lain menulis langsung ke DB
+        cache = ChatHistoryCache()
+        monkeypatch.setattr(sql_chat_history, "get_chat_history_cache", lambda: cache)
+        monkeypatch.setattr(config, "CHAT_HISTORY_CACHE_ENABLED", True)
+        monkeypatch.setattr(config, "CHAT_HISTORY_CACHE_VALIDATE", True)
+
+        async with session_factory() as session:
+            history = SQLChatMessageHistory(session, room_id=1)
+            await history.add_message(HumanMessage(content="pertanyaan pertama"))
+            assert [m.content for m in await history.get_recent_messages(4)] == ["pertanyaan pertama"]
+
+            async with session_factory() as other_worker:
+                await crud.create_chat_message(
+                    other_worker, schemas.ChatMessageCreate(room_id=1, sender="ai", message_text="jawaban worker lain")
+                )
+
+            contents = [m.content for m in await history.get_recent_messages(4)]
+            assert contents == ["pertanyaan pertama", "jawaban worker lain"]
+        await engine.dispose()
+
+    asyncio.run(scenario())
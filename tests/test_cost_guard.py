@@ -0,0 +1,50 @@
+import asyncio
+
+from app.core.cost_guard import (
+    COST_GUARD_REWRITE,
+    QueryCostEstimate,
+    QueryCostGuard,
+    add_max_execution_time,
+    clamp_limit,
+)
+
+class _StubExplain:
+    def __init__(self, rows_examined: int):
+        self.estimate = QueryCostEstimate(rows_examined=rows_examined, uses_index=False)
+
+    async def explain(self, connection, sql):
+        return self.estimate
+
+class _StubConnection:
+    class dialect:
+        name = "mysql"
+
+def test_clamp_limit_tightens_injected_limit():
+    assert clamp_limit("SELECT a FROM t LIMIT 1001", 101) == ("SELECT a FROM t LIMIT 101", 101)
+
+def test_clamp_limit_keeps_smaller_limit():
+    assert clamp_limit("SELECT a FROM t LIMIT 10", 101) == ("SELECT a FROM t LIMIT 10", None)
+
+def test_clamp_limit_keeps_offset():
+    assert clamp_limit("SELECT a FROM t LIMIT 20, 5000", 101) == ("SELECT a FROM t LIMIT 20, 101", 101)
+    assert clamp_limit("SELECT a FROM t LIMIT 5000 OFFSET 20", 101) == ("SELECT a FROM t LIMIT 101 OFFSET 20", 101)
+
+def test_max_execution_time_hint_on_cte():
+    sql = "WITH x AS (SELECT a FROM t) SELECT a FROM x"
+    assert add_max_execution_time(sql, 500) == (
+        "WITH x AS (SELECT a FROM t) SELECT /*+ MAX_EXECUTION_TIME(500) */ a FROM x"
+    )
+
+def test_max_execution_time_hint_ignores_string_literal():
+    sql = "SELECT 'SELECT' AS a FROM t"
+    assert add_max_execution_time(sql, 500) == "SELECT /*+ MAX_EXECUTION_TIME(500) */ 'SELECT' AS a FROM t"
+
+def test_rewrite_reports_clamped_limit():
+    guard = QueryCostGuard(
+        mode="rewrite", max_rows_examined=10, max_unindexed_rows=10,
+        rewrite_limit=101, max_execution_ms=500, explain_source=_StubExplain(1_000_000),
+    )
+    decision = asyncio.run(guard.check(_StubConnection(), "WITH x AS (SELECT a FROM t) SELECT a FROM x LIMIT 1001"))
+    assert decision.action == COST_GUARD_REWRITE
+    assert decision.limit == 101
+    assert decision.sql == "WITH x AS (SELECT a FROM t) SELECT /*+ MAX_EXECUTION_TIME(500) */ a FROM x LIMIT 101"
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.cost_guard import QueryCostGuard
+from app.core.db_executor import execute_select_query_stream
+from app.core.security.sql_validator import validate_sql
+
+async def _run_query(tmp_path, rows: int, raw_sql: str, max_rows: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'exec.db'}")
+    async with engine.begin() as connection:
+        await connection.execute(text("CREATE TABLE drauk_unit (Nama_Unit TEXT, Jumlah REAL)"))
+        await connection.execute(
+            text("INSERT INTO drauk_unit VALUES (:n, :j)"), [{"n": f"Unit {i}", "j": i} for i in range(rows)]
+        )
+    try:
+        return await execute_select_query_stream(
+            validate_sql(raw_sql).sql,
+            max_rows=max_rows,
+            db_engine=engine,
+            use_cache=False,
+            cost_guard=QueryCostGuard(mode="off"),
+        )
+    finally:
+        await engine.dispose()
+
+def test_result_larger_than_cap_is_reported_truncated(tmp_path):
+    result = asyncio.run(_run_query(tmp_path, 5000, "SELECT Nama_Unit FROM drauk_unit", max_rows=1000))
+    assert len(result.rows) == 1000
+    assert result.truncated
+    assert not result.row_count_exact
+
+def test_result_within_cap_is_complete(tmp_path):
+    result = asyncio.run(_run_query(tmp_path, 20, "SELECT Nama_Unit FROM drauk_unit", max_rows=1000))
+    assert result.row_count == 20
+    assert not result.truncated
+    assert result.row_count_exact
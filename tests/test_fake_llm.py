@@ -0,0 +1,28 @@
+import pytest
+
+from app import config
+from app.adapters.llm.fake_adapter import get_fake_llm
+from app.adapters.llm.llm_factory import LLMClientRegistry
+
+def test_local_models_are_rejected_unless_enabled(monkeypatch):
+    monkeypatch.setattr(config, "LOCAL_LLM_ENABLED", False)
+    with pytest.raises(ValueError, match="LOCAL_LLM_ENABLED"):
+        LLMClientRegistry().get("local/fake")
+
+def test_model_name_parameters_are_clamped():
+    llm = get_fake_llm("local/fake?latency_ms=99999999&failure_rate=5&stream_token_ms=100000")
+    assert llm.latency_ms == config.FAKE_LLM_MAX_LATENCY_MS
+    assert llm.stream_token_ms == config.FAKE_LLM_MAX_STREAM_TOKEN_MS
+    assert llm.failure_rate == 1.0
+    with pytest.raises(ValueError):
+        get_fake_llm("local/fake?latency_ms=nan")
+
+def test_local_clients_do_not_evict_provider_clients(monkeypatch):
+    monkeypatch.setattr(config, "LOCAL_LLM_ENABLED", True)
+    registry = LLMClientRegistry(max_clients=2, max_local_clients=2)
+    real = get_fake_llm("local/fake")
+    registry.register("openrouter/model", real)
+    for latency in range(10):
+        registry.get(f"local/fake?latency_ms={latency}")
+    assert registry.get("openrouter/model") is real
+    assert registry.stats()["local_clients"] == 2
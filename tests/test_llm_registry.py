@@ -0,0 +1,50 @@
+import asyncio
+import gc
+
+from app.adapters.llm.llm_factory import PROVIDER_OPENROUTER, LLMClientRegistry
+
+class _Transport:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+class _Client:
+    def __init__(self):
+        self.root_async_client = _Transport()
+
+def test_evicted_client_keeps_its_slot_until_released():
+    async def scenario():
+        registry = LLMClientRegistry(max_clients=2)
+        first, second, third = _Client(), _Client(), _Client()
+        transport = first.root_async_client
+        registry.register("openrouter/a", first)
+        registry.register("openrouter/b", second)
+
+        # Tergusur di antara dua tahap request yang masih memegang client-nya
+        registry.register("openrouter/c", third)
+        assert registry.stats()["clients_evicted"] == 1
+        async with registry.slot(first):
+            assert registry.stats()["providers"][PROVIDER_OPENROUTER]["in_flight"] == 1
+        await asyncio.sleep(0)
+        assert not transport.closed
+
+        del first
+        gc.collect()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert transport.closed
+        assert not second.root_async_client.closed
+
+        await registry.aclose()
+        assert second.root_async_client.closed and third.root_async_client.closed
+
+    asyncio.run(scenario())
+
+def test_provider_mapping_is_dropped_with_the_client():
+    registry = LLMClientRegistry(max_clients=1)
+    registry.register("openrouter/a", _Client())
+    registry.register("openrouter/b", _Client())
+    gc.collect()
+    assert len(registry._client_providers) == 1
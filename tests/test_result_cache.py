@@ -0,0 +1,93 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.core.result_cache import ResultSetCache, TableVersionPoller, is_deterministic
+
+SQL = "SELECT Nama_Unit FROM drauk_unit"
+ROWS = [{"Nama_Unit": "Unit A"}]
+
+class _VersionEngine:
+    """Engine tiruan yang menjawab probe information_schema dengan versi yang ditentukan tes."""
+    def __init__(self, versions, dialect=None):
+        self.versions = versions
+        self.dialect = dialect
+        self.statements = []
+
+    @asynccontextmanager
+    async def connect(self):
+        engine = self
+
+        class _Connection:
+            dialect = engine.dialect
+
+            async def execute(self, query, params=None):
+                engine.statements.append(str(query))
+                if params is None:
+                    return None
+                return [SimpleNamespace(TABLE_NAME=t, UPDATE_TIME=engine.versions[t]) for t in params["tables"]]
+
+        yield _Connection()
+
+def test_entry_cached_before_first_probe_is_dropped_when_version_is_unknown():
+    cache = ResultSetCache()
+    cache.put(SQL, ROWS)
+    assert cache.apply_versions({"drauk_unit": "2026-01-01 10:00"}) == ["drauk_unit"]
+    assert cache.get(SQL) is None
+
+def test_entry_survives_while_version_matches_and_drops_after_change():
+    cache = ResultSetCache()
+    poller = TableVersionPoller(cache, _VersionEngine({"drauk_unit": "v1"}), interval_seconds=0)
+    cache.put(SQL, ROWS)
+    assert asyncio.run(poller.poll_once()) == ["drauk_unit"]
+
+    cache.put(SQL, ROWS, versions=cache.table_versions(SQL))
+    assert asyncio.run(poller.poll_once()) == []
+    assert cache.get(SQL) == ROWS
+
+    poller.db_engine.versions["drauk_unit"] = "v2"
+    assert asyncio.run(poller.poll_once()) == ["drauk_unit"]
+    assert cache.get(SQL) is None
+
+def test_versions_taken_before_execution_catch_concurrent_write():
+    cache = ResultSetCache()
+    cache.apply_versions({"drauk_unit": "v1"})
+    versions = cache.table_versions(SQL)
+    # Tabel berubah dan sudah diprobe sebelum hasil kueri lama disimpan
+    cache.apply_versions({"drauk_unit": "v2"})
+    cache.put(SQL, ROWS, versions=versions)
+    assert cache.apply_versions({"drauk_unit": "v2"}) == ["drauk_unit"]
+    assert cache.get(SQL) is None
+
+def test_nondeterministic_sql_is_not_cached():
+    cache = ResultSetCache()
+    for sql in (
+        "SELECT Nama_Unit FROM drauk_unit WHERE tgl = CURDATE()",
+        "SELECT NOW() AS waktu FROM drauk_unit",
+        "SELECT Nama_Unit FROM drauk_unit ORDER BY RAND()",
+    ):
+        assert not cache.put(sql, ROWS)
+        assert cache.get(sql) is None
+    assert cache.stats()["nondeterministic"] == 3
+    assert is_deterministic("select nama_unit from drauk_unit where catatan = 'now()'")
+
+def test_null_update_time_disables_caching_for_the_table():
+    cache = ResultSetCache()
+    cache.apply_versions({"drauk_unit": "v1"})
+    cache.put(SQL, ROWS, versions=cache.table_versions(SQL))
+
+    assert cache.apply_versions({"drauk_unit": None}) == ["drauk_unit"]
+    assert not cache.put(SQL, ROWS, versions=cache.table_versions(SQL))
+    assert cache.get(SQL) is None
+    assert cache.stats()["unversioned"] == 1
+
+def test_probe_disables_information_schema_stats_cache_on_mysql():
+    cache = ResultSetCache()
+    cache.apply_versions({"drauk_unit": "v1"})
+    mysql = _VersionEngine({"drauk_unit": "v1"}, dialect=SimpleNamespace(name="mysql", is_mariadb=False))
+    asyncio.run(TableVersionPoller(cache, mysql, interval_seconds=0).poll_once())
+    assert mysql.statements[0] == "SET SESSION information_schema_stats_expiry = 0"
+
+    mariadb = _VersionEngine({"drauk_unit": "v1"}, dialect=SimpleNamespace(name="mysql", is_mariadb=True))
+    asyncio.run(TableVersionPoller(cache, mariadb, interval_seconds=0).poll_once())
+    assert not any("stats_expiry" in statement for statement in mariadb.statements)
@@ -0,0 +1,41 @@
+import pytest
+
+from app.core.schema_catalog import SchemaCatalog, SchemaCatalogError
+from app.core.security.sql_validator import validate_sql
+
+@pytest.fixture
+def catalog():
+    catalog = SchemaCatalog()
+    catalog.add_table("drauk_unit", ["Kode_Unit", "Nama_Unit", "tgl", "Jumlah"], money_columns=["Jumlah"])
+    return catalog
+
+def _check(catalog, sql):
+    validation = validate_sql(sql)
+    assert validation.is_safe, validation.reason
+    return catalog.check(validation)
+
+def test_extract_from_is_not_a_table(catalog):
+    sql = _check(catalog, "SELECT EXTRACT(YEAR FROM tgl) AS tahun, SUM(Jumlah) FROM drauk_unit GROUP BY tahun")
+    assert "EXTRACT(YEAR FROM tgl)" in sql
+
+def test_trim_from_is_not_a_table(catalog):
+    _check(catalog, "SELECT TRIM(LEADING '0' FROM kode_unit) FROM drauk_unit")
+
+def test_string_literal_alias_can_be_referenced_with_backticks(catalog):
+    _check(
+        catalog,
+        "SELECT Nama_Unit, SUM(Jumlah) AS 'Total Pagu' FROM drauk_unit GROUP BY Nama_Unit ORDER BY `Total Pagu` DESC",
+    )
+
+def test_convert_using_charset_is_not_a_column(catalog):
+    _check(catalog, "SELECT CONVERT(Nama_Unit USING utf8mb4) FROM drauk_unit")
+
+def test_case_insensitive_names_are_rewritten(catalog):
+    sql = _check(catalog, "SELECT nama_unit FROM DRAUK_UNIT")
+    assert sql.startswith("SELECT Nama_Unit FROM drauk_unit")
+
+def test_unknown_column_and_table_are_rejected(catalog):
+    with pytest.raises(SchemaCatalogError, match="Kolom 'Nama'"):
+        _check(catalog, "SELECT Nama FROM drauk_unit")
+    with pytest.raises(SchemaCatalogError, match="Tabel 'tgl'"):
+        _check(catalog, "SELECT Nama_Unit FROM tgl")
@@ -0,0 +1,42 @@
+import os
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.adapters.vector_store.in_memory_schema_index import InMemorySchemaIndex
+
+class _CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+def _index(tmp_path, embeddings, text="drauk_unit"):
+    return InMemorySchemaIndex([Document(page_content=text)], embeddings, tmp_path, "model-uji")
+
+def test_index_is_built_once_and_reused(tmp_path):
+    embeddings = _CountingEmbeddings()
+    first = _index(tmp_path, embeddings)
+    second = _index(tmp_path, embeddings)
+    assert embeddings.calls == 1
+    assert first.path == second.path
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_only_older_indexes_are_removed(tmp_path):
+    embeddings = _CountingEmbeddings()
+    old = _index(tmp_path, embeddings, "skema lama")
+    os.utime(old.path, (0, 0))
+    # Index milik worker dengan dokumen yang lebih baru
+    newer = tmp_path / "schema_ffffffffffffffff.npy"
+    newer.write_bytes(b"")
+    os.utime(newer, (2 ** 31, 2 ** 31))
+
+    current = _index(tmp_path, embeddings, "skema baru")
+    assert current.path.exists()
+    assert not old.path.exists()
+    assert newer.exists()
@@ -0,0 +1,48 @@
+from app import config
+from app.core.security.sql_validator import injected_limit, validate_sql
+
+def test_select_without_limit_gets_limit_above_result_cap():
+    result = validate_sql("SELECT Nama_Unit FROM drauk_unit")
+    assert result.is_safe
+    assert result.limit_injected
+    assert config.SQL_DEFAULT_LIMIT > config.SQL_RESULT_MAX_ROWS
+    assert result.sql.endswith(f" LIMIT {config.SQL_DEFAULT_LIMIT}")
+    assert injected_limit(result.sql) == config.SQL_DEFAULT_LIMIT
+
+def test_existing_outer_limit_is_kept():
+    result = validate_sql("SELECT Nama_Unit FROM drauk_unit ORDER BY Jumlah DESC LIMIT 5;")
+    assert result.is_safe
+    assert not result.limit_injected
+    assert result.sql.endswith("LIMIT 5")
+    assert injected_limit(result.sql) is None
+
+def test_subquery_limit_does_not_count_as_outer_limit():
+    result = validate_sql("SELECT * FROM (SELECT Nama_Unit FROM drauk_unit LIMIT 3) t")
+    assert result.limit_injected
+
+def test_rejects_non_select_and_multiple_statements():
+    assert not validate_sql("DELETE FROM drauk_unit").is_safe
+    assert not validate_sql("SELECT 1; DROP TABLE drauk_unit").is_safe
+    assert not validate_sql("SELECT SLEEP(5) FROM drauk_unit").is_safe
+    assert not validate_sql("SELECT /*! 1 */ FROM drauk_unit").is_safe
+
+def test_rejects_blacklisted_functions_behind_quoted_identifiers():
+    for sql in (
+        "SELECT `SLEEP`(5) FROM drauk_unit",
+        "SELECT `sleep` (5) FROM drauk_unit",
+        "SELECT Nama_Unit FROM drauk_unit WHERE `BENCHMARK`(1000000, MD5('a')) = 0",
+    ):
+        result = validate_sql(sql)
+        assert not result.is_safe and "fungsi berbahaya" in result.reason
+    assert validate_sql("SELECT `sleep` FROM drauk_unit").is_safe
+
+def test_double_dash_without_whitespace_is_not_a_comment():
+    result = validate_sql("SELECT 1--1\nFROM drauk_unit")
+    assert result.is_safe
+    assert "drauk_unit" in result.tables
+    assert result.sql == f"SELECT 1- -1 FROM drauk_unit LIMIT {config.SQL_DEFAULT_LIMIT}"
+
+def test_double_dash_with_whitespace_is_a_comment():
+    result = validate_sql("SELECT Nama_Unit -- komentar\nFROM drauk_unit")
+    assert result.is_safe
+    assert result.sql == f"SELECT Nama_Unit FROM drauk_unit LIMIT {config.SQL_DEFAULT_LIMIT}"
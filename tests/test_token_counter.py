@@ -0,0 +1,20 @@
+import tiktoken
+
+from app.core import token_counter
+
+def test_tokenizer_failure_is_cached(monkeypatch):
+    calls = []
+
+    def offline(name):
+        calls.append(name)
+        raise OSError("tidak ada akses internet")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    token_counter._encoding_for.cache_clear()
+    try:
+        assert token_counter.count_tokens("abcdefgh") == 2
+        assert token_counter.count_tokens("abcdefgh") == 2
+        assert not token_counter.warm_tokenizer()
+        assert len(calls) == 1
+    finally:
+        token_counter._encoding_for.cache_clear()
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import config
+from app.adapters.db import models, schemas
+from app.adapters.db.unit_of_work import UnitOfWork, PERSISTENCE_UNIT_OF_WORK
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def _setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uow.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+        await connection.execute(models.User.__table__.insert(), {"nip": "t", "kode_unit": "T"})
+        await connection.execute(models.ChatRoom.__table__.insert(), {"user_id": 1, "title": "t"})
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+async def _count(session_factory, model) -> int:
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+def _message(sender: str, reply_to=None) -> schemas.ChatMessageCreate:
+    return schemas.ChatMessageCreate(room_id=1, sender=sender, message_text=f"pesan {sender}", in_reply_to_message_id=reply_to)
+
+@pytest.fixture(autouse=True)
+def _no_telemetry_writer(monkeypatch):
+    monkeypatch.setattr(config, "TELEMETRY_WRITER_ENABLED", False)
+
+def test_user_message_committed_immediately_without_open_transaction(tmp_path):
+    async def scenario():
+        engine, session_factory = await _setup(tmp_path)
+        async with session_factory() as session:
+            uow = UnitOfWork(session, mode=PERSISTENCE_UNIT_OF_WORK)
+            saved = await uow.add_user_message(_message("user"))
+            assert saved.message_id is not None
+            # Tidak ada koneksi pool yang tertahan selama tahap LLM
+            assert engine.sync_engine.pool.checkedout() == 0
+            assert await _count(session_factory, models.ChatMessage) == 1
+        await engine.dispose()
+    run(scenario())
+
+def test_tail_writes_are_buffered_until_commit(tmp_path):
+    async def scenario():
+        engine, session_factory = await _setup(tmp_path)
+        committed_ids = []
+        async with session_factory() as session:
+            async with UnitOfWork(session, mode=PERSISTENCE_UNIT_OF_WORK) as uow:
+                user = await uow.add_user_message(_message("user"))
+                ai = await uow.add_chat_message(_message("ai", user.message_id))
+                await uow.add_llm_run(schemas.LLMRunCreate(user_message_id=user.message_id, is_success=True))
+                uow.after_commit(lambda: committed_ids.append(ai.message_id))
+                assert engine.sync_engine.pool.checkedout() == 0
+                assert committed_ids == []
+            assert committed_ids and committed_ids[0] is not None
+        assert await _count(session_factory, models.ChatMessage) == 2
+        assert await _count(session_factory, models.LLMRun) == 1
+        await engine.dispose()
+    run(scenario())
+
+def test_failed_commit_runs_rollback_callbacks_and_keeps_user_message(tmp_path):
+    async def scenario():
+        engine, session_factory = await _setup(tmp_path)
+        events = []
+        async with session_factory() as session:
+            with pytest.raises(RuntimeError):
+                async with UnitOfWork(session, mode=PERSISTENCE_UNIT_OF_WORK) as uow:
+                    user = await uow.add_user_message(_message("user"))
+                    # Dua llm_runs untuk pesan yang sama melanggar UNIQUE saat commit
+                    await uow.add_llm_run(schemas.LLMRunCreate(user_message_id=user.message_id))
+                    await uow.add_llm_run(schemas.LLMRunCreate(user_message_id=user.message_id))
+                    uow.after_commit(lambda: events.append("commit"))
+                    uow.on_rollback(lambda: events.append("rollback"))
+        assert events == ["rollback"]
+        assert await _count(session_factory, models.ChatMessage) == 1
+        assert await _count(session_factory, models.LLMRun) == 0
+        await engine.dispose()
+    run(scenario())
+
+def test_per_write_mode_commits_each_insert(tmp_path):
+    async def scenario():
+        engine, session_factory = await _setup(tmp_path)
+        async with session_factory() as session:
+            uow = UnitOfWork(session, mode="per_write")
+            user = await uow.add_user_message(_message("user"))
+            await uow.add_chat_message(_message("ai", user.message_id))
+            assert await _count(session_factory, models.ChatMessage) == 2
+        await engine.dispose()
+    run(scenario())